@@ -0,0 +1,179 @@
+"""デコード済み音声 (16kHzモノラルfloat32) のディスクキャッシュ
+
+同じ音声をモデルサイズや言語を変えて処理し直す場合、ffmpegによるデコードは毎回同じ結果になる。
+デコード結果を音声内容のSHA-256をキーとする .npy ファイルとして保存し、次回からはメモリマップで
+読み込む (ページキャッシュを共有するため、複数のワーカーが同じ音声を読んでもコピーされない)。
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+
+from result_cache import file_digest
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_AUDIO_CACHE_DIR = os.path.join("cache", "audio")
+DEFAULT_AUDIO_CACHE_MAX_MB = 4096
+SAMPLE_RATE = 16000
+AUDIO_CACHE_FORMAT_VERSION = 1
+
+
+def decode_audio(file_path, sample_rate=SAMPLE_RATE):
+    """ffmpegで音声を16kHzモノラルのfloat32配列にデコード (whisper.load_audio と同じ変換)"""
+    import numpy as np
+
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", file_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+    try:
+        output = subprocess.run(cmd, capture_output=True, check=True).stdout
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"音声のデコードに失敗しました: {e.stderr.decode(errors='replace')}") from e
+    return np.frombuffer(output, np.int16).astype(np.float32) / 32768.0
+
+
+class AudioCache:
+    """サイズ上限付きのデコード済み音声キャッシュ (古く使われていないものから破棄)"""
+
+    def __init__(self, cache_dir=DEFAULT_AUDIO_CACHE_DIR, max_mb=DEFAULT_AUDIO_CACHE_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.decode_seconds = 0.0  # ミス時にデコードにかかった時間
+        self.saved_seconds = 0.0  # ヒット時に省略できたデコード時間 (保存時のデコード時間 - 読み込み時間)
+
+    @property
+    def config(self):
+        """ワーカープロセスで同じキャッシュを開くための設定"""
+        return (self.cache_dir, self.max_bytes / (1024 * 1024))
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npy")
+
+    def key_for(self, file_path):
+        return f"{file_digest(file_path)}-{SAMPLE_RATE}-v{AUDIO_CACHE_FORMAT_VERSION}"
+
+    def lookup(self, file_path):
+        """デコード済みの音声をメモリマップで返す (キャッシュになければNone)"""
+        import numpy as np
+
+        path = self._entry_path(self.key_for(file_path))
+        start = time.perf_counter()
+        try:
+            # 書き込み時コピーのマップにすると、torchに渡しても読み取り専用の警告が出ない
+            audio = np.load(path, mmap_mode='c')
+            with open(f"{path}.json", 'r', encoding='utf-8') as f:
+                decode_seconds = json.load(f)["decode_seconds"]
+            # 最近使われたものとして更新時刻を進める (LRU)
+            os.utime(path)
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.saved_seconds += max(0.0, decode_seconds - (time.perf_counter() - start))
+        return audio
+
+    def decode(self, file_path):
+        """音声をデコードしてキャッシュに保存し、配列を返す"""
+        start = time.perf_counter()
+        audio = decode_audio(file_path)
+        decode_seconds = time.perf_counter() - start
+        with self._lock:
+            self.decode_seconds += decode_seconds
+        try:
+            self._put(self._entry_path(self.key_for(file_path)), audio, decode_seconds)
+        except OSError as e:
+            logger.warning(f"デコード済み音声の保存に失敗しました: {str(e)}")
+        return audio
+
+    def load(self, file_path):
+        """デコード済みの音声を返す。キャッシュになければデコードして保存する"""
+        audio = self.lookup(file_path)
+        return audio if audio is not None else self.decode(file_path)
+
+    def _put(self, path, audio, decode_seconds):
+        """一時ファイルに書いてから置き換える (メタデータを先に置き、音声の存在をエントリの完成とみなす)"""
+        import numpy as np
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.json", 'w', encoding='utf-8') as f:
+            json.dump({"decode_seconds": decode_seconds, "samples": len(audio)}, f)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, audio)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """(パス, サイズ, 更新時刻) の一覧を返す"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".npy"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """上限の9割に収まるまで古いエントリから削除 (ロック取得済みで呼ぶこと)
+
+        メモリマップ中のファイルを削除しても、マップしているプロセスは最後まで読める。
+        """
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                os.remove(f"{path}.json")
+            except OSError:
+                pass
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+        logger.debug(f"デコード済み音声キャッシュを整理しました: {total / (1024 * 1024):.1f} MB")
+
+    def reset_stats(self):
+        """バッチごとの統計をリセット"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.decode_seconds = 0.0
+            self.saved_seconds = 0.0
+
+    def format_stats(self):
+        """キャッシュ統計をログ出力用の文字列に整形"""
+        with self._lock:
+            return (f"音声キャッシュ: ヒット {self.hits}件 / ミス {self.misses}件 (破棄 {self.evictions}件), "
+                    f"デコード {self.decode_seconds:.1f}秒, 省略したデコード時間 {self.saved_seconds:.1f}秒")
@@ -0,0 +1,180 @@
+"""長時間音声を一定長のウィンドウごとにデコードして逐次文字起こしするストリーミング処理
+
+音声全体をメモリに展開せず、ffmpegの出力を30秒ずつ読み込んで推論するため、
+ファイルの長さに関係なくメモリ使用量が一定になる。
+"""
+import logging
+import subprocess
+
+import numpy as np
+
+from metrics import stage_timer
+from progress import probe_duration, whisper_progress
+from vad import transcribe_speech
+
+logger = logging.getLogger("MP3Transcriber")
+
+SAMPLE_RATE = 16000  # Whisperの入力サンプリングレート
+WINDOW_SECONDS = 30  # Whisperのエンコーダ入力長
+# ウィンドウ末尾でこの秒数以内に終わるセグメントは途中で切れている可能性があるため次のウィンドウに回す
+CARRY_MARGIN_SECONDS = 1.0
+# 次のウィンドウに渡すプロンプト (直前のテキスト) の最大文字数
+PROMPT_CHARS = 200
+
+
+def iter_audio_windows(file_path, window_seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+    """ffmpegでデコードした16kHzモノラル音声を、window_seconds秒ずつfloat32配列で返す"""
+    cmd = [
+        "ffmpeg", "-nostdin", "-threads", "0", "-i", file_path,
+        "-f", "s16le", "-ac", "1", "-acodec", "pcm_s16le", "-ar", str(sample_rate), "-",
+    ]
+    window_bytes = int(window_seconds * sample_rate) * 2  # int16
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    try:
+        while True:
+            data = process.stdout.read(window_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data, np.int16).astype(np.float32) / 32768.0
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpegによる音声のデコードに失敗しました: {file_path}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+
+def iter_array_windows(audio, window_seconds=WINDOW_SECONDS, sample_rate=SAMPLE_RATE):
+    """デコード済みの音声 (メモリマップ可) を window_seconds 秒ずつ返す"""
+    window_samples = int(window_seconds * sample_rate)
+    for start in range(0, len(audio), window_samples):
+        yield audio[start:start + window_samples]
+
+
+class _WindowReader:
+    """前のウィンドウの持ち越し分と合わせて、最大30秒の入力を組み立てる"""
+
+    def __init__(self, file_path, audio=None):
+        if audio is not None:
+            self._chunks = iter_array_windows(audio, window_seconds=1)
+        else:
+            self._chunks = iter_audio_windows(file_path, window_seconds=1)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self.exhausted = False
+
+    def read(self, carry):
+        """持ち越し音声carryの後ろに新しい音声を足して30秒分を返す"""
+        window_samples = WINDOW_SECONDS * SAMPLE_RATE
+        parts = [carry]
+        filled = len(carry)
+        while filled < window_samples:
+            if len(self._pending) == 0:
+                try:
+                    self._pending = next(self._chunks)
+                except StopIteration:
+                    self.exhausted = True
+                    break
+            take = self._pending[:window_samples - filled]
+            self._pending = self._pending[len(take):]
+            parts.append(take)
+            filled += len(take)
+        return np.concatenate(parts)
+
+    def close(self):
+        """デコードを打ち切る (ffmpegのプロセスを終了させる)"""
+        self._chunks.close()
+
+
+def transcribe_streaming(model, file_path, options, on_segment=None, vad=False, on_progress=None,
+                         cancel_token=None, audio=None):
+    """音声を30秒ずつデコードしながら文字起こしし、Whisperのtranscribeと同じ形式の結果を返す
+
+    on_segment(start, end, text) は確定したセグメントごとに呼ばれる。
+    vad=Trueの場合はウィンドウごとに発話区間だけを推論する。
+    on_progress(割合) には処理済みの音声の割合 (0.0〜1.0) を通知する (音声の長さが取得できた場合のみ)。
+    cancel_token はウィンドウごとに確認し、キャンセルされていれば TranscriptionCancelled を送出する。
+    audio (デコード済み音声キャッシュのメモリマップ) を指定するとffmpegでのデコードを省略する。
+    """
+    options = dict(options)
+    if audio is not None:
+        duration = len(audio) / SAMPLE_RATE
+    else:
+        duration = probe_duration(file_path) if on_progress is not None else None
+
+    def report_window(fraction):
+        # ウィンドウ内の進捗を音声全体に対する割合に変換
+        if duration:
+            on_progress(min(1.0, (offset + fraction * window_end) / duration))
+
+    reader = _WindowReader(file_path, audio)
+    carry = np.zeros(0, dtype=np.float32)
+    offset = 0.0  # 現在のウィンドウ先頭の元音声上の位置 (秒)
+    segments = []
+    texts = []
+    language = options.get("language")
+    total_seconds = 0.0
+    speech_seconds = 0.0
+
+    try:
+        while not reader.exhausted:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            with stage_timer("audio_decode"):
+                audio = reader.read(carry)
+            if len(audio) == 0:
+                break
+            window_end = len(audio) / SAMPLE_RATE
+            if texts:
+                options["initial_prompt"] = "".join(texts[-20:])[-PROMPT_CHARS:]
+            with whisper_progress(report_window):
+                if vad:
+                    # 持ち越した音声の発話は前のウィンドウで数えたため、新しく読んだ部分だけを数える
+                    result = transcribe_speech(model, audio, options, carried_seconds=len(carry) / SAMPLE_RATE)
+                    speech_seconds += result["vad"]["speech_seconds"]
+                else:
+                    result = model.transcribe(audio, **options)
+
+            # 自動検出の場合は最初のウィンドウで検出した言語を以降も使う
+            if language is None:
+                language = result.get("language")
+                options["language"] = language
+
+            window_segments = result.get("segments", [])
+            carry_from = 0
+            if (not reader.exhausted and len(window_segments) > 1
+                    and window_segments[-1]["end"] > window_end - CARRY_MARGIN_SECONDS):
+                # 最後のセグメントは途中で切れている可能性があるため、次のウィンドウで認識し直す
+                carry_from = int(window_segments[-1]["start"] * SAMPLE_RATE)
+                if carry_from > 0:
+                    window_segments = window_segments[:-1]
+
+            for segment in window_segments:
+                start = offset + segment["start"]
+                end = offset + segment["end"]
+                text = segment["text"]
+                segments.append({"id": len(segments), "start": start, "end": end, "text": text,
+                                 "avg_logprob": segment.get("avg_logprob", float("nan"))})
+                texts.append(text)
+                if on_segment is not None:
+                    on_segment(start, end, text)
+
+            if carry_from:
+                carry = audio[carry_from:]
+                offset += carry_from / SAMPLE_RATE
+            else:
+                carry = np.zeros(0, dtype=np.float32)
+                offset += window_end
+            total_seconds = offset + len(carry) / SAMPLE_RATE
+            logger.debug(f"ストリーミング処理: {offset:.1f}秒まで完了")
+    finally:
+        # 中断した場合もffmpegのプロセスを終了させる
+        reader.close()
+
+    result = {"text": "".join(texts), "segments": segments, "language": language}
+    if vad:
+        result["vad"] = {
+            "total_seconds": total_seconds,
+            "speech_seconds": speech_seconds,
+            "skipped_seconds": total_seconds - speech_seconds,
+        }
+    return result
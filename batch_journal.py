@@ -0,0 +1,123 @@
+"""バッチ処理の進行状況を記録する追記専用ジャーナル
+
+ファイルごとの状態 (queued / running / done / failed) と出力先を1行1レコードのJSONで追記する。
+処理が中断されても、同じファイル一覧・設定で再開すれば完了済みのファイルを飛ばして続きから処理できる。
+"""
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_JOURNAL_DIR = "journals"
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def batch_id_for(file_paths, settings):
+    """ファイル一覧と処理設定からバッチIDを作成 (同じ内容であれば同じIDになる)"""
+    payload = json.dumps({
+        "files": sorted(os.path.abspath(path) for path in file_paths),
+        "settings": settings,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+def batch_id_for_folder(folder_path, settings):
+    """走査したフォルダと処理設定からバッチIDを作成
+
+    走査中に開始したバッチはファイル一覧が決まらないため、フォルダで1つのジャーナルにまとめる。
+    """
+    payload = json.dumps({
+        "folder": os.path.abspath(folder_path),
+        "settings": settings,
+    }, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class BatchJournal:
+    """1バッチ分のジャーナル。既存のジャーナルがあれば読み込んで状態を復元する"""
+
+    def __init__(self, batch_id, journal_dir=DEFAULT_JOURNAL_DIR):
+        self.batch_id = batch_id
+        self.path = os.path.join(journal_dir, f"batch_{batch_id}.jsonl")
+        self._lock = threading.Lock()
+        self._states = {}  # 絶対パス: 最新のレコード
+        os.makedirs(journal_dir, exist_ok=True)
+        self._replay()
+
+    @classmethod
+    def open_for(cls, file_paths, settings, journal_dir=DEFAULT_JOURNAL_DIR):
+        """ファイル一覧と設定に対応するジャーナルを開く"""
+        return cls(batch_id_for(file_paths, settings), journal_dir)
+
+    @classmethod
+    def open_for_folder(cls, folder_path, settings, journal_dir=DEFAULT_JOURNAL_DIR):
+        """走査したフォルダと設定に対応するジャーナルを開く"""
+        return cls(batch_id_for_folder(folder_path, settings), journal_dir)
+
+    def _replay(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # 書き込み途中で停止した最終行は無視する
+                    logger.warning(f"ジャーナルの{line_number}行目を読み飛ばしました: {self.path}")
+                    continue
+                self._states[record["file"]] = record
+        logger.info(f"ジャーナルを読み込みました: {self.path} ({len(self._states)}ファイル)")
+
+    def record(self, file_path, state, output=None, error=None):
+        """ファイルの状態を追記 (fsyncしてから戻る)"""
+        record = {
+            "time": datetime.now().isoformat(timespec='seconds'),
+            "file": os.path.abspath(file_path),
+            "state": state,
+        }
+        if output is not None:
+            record["output"] = os.path.abspath(output)
+        if error is not None:
+            record["error"] = error
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+            self._states[record["file"]] = record
+
+    def is_done(self, file_path):
+        """完了済みで、出力ファイルが残っている場合にTrue"""
+        record = self._states.get(os.path.abspath(file_path))
+        if record is None or record["state"] != DONE:
+            return False
+        output = record.get("output")
+        return output is None or os.path.exists(output)
+
+    def pending_files(self, file_paths):
+        """未完了 (未処理・処理中断・失敗) のファイルだけを元の順序で返す"""
+        return [path for path in file_paths if not self.is_done(path)]
+
+    def reset(self):
+        """ジャーナルを破棄して最初からやり直す"""
+        with self._lock:
+            self._states = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+    def summary(self):
+        """状態ごとのファイル数を返す"""
+        counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+        with self._lock:
+            for record in self._states.values():
+                counts[record["state"]] = counts.get(record["state"], 0) + 1
+        return counts
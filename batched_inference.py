@@ -0,0 +1,283 @@
+"""複数ファイルの30秒ウィンドウをまとめてモデルに通すバッチ推論
+
+Whisperのtranscribeは1ファイルずつ処理するため、エンコーダには常にバッチサイズ1の入力しか渡らない。
+ここでは複数ファイル (または1ファイルの複数ウィンドウ) のメルスペクトログラムを集めて
+(バッチサイズ, メル数, 3000) のテンソルにまとめ、エンコーダとデコーダを一度に実行する。
+ウィンドウは30秒ごとに固定で区切るため、ウィンドウ境界をまたぐ発話は分割される。
+"""
+import os
+import time
+import functools
+import logging
+from collections import deque
+
+from cancellation import TranscriptionCancelled, cancellation_scope
+from metrics import StageTimings, timing_scope
+from prefetch import DEFAULT_PREFETCH_DEPTH, AudioPrefetcher
+from model_cache import get_model_cache, resolve_device
+from transcriber import TranscriptionError, build_transcribe_options
+from transcription_result import TranscriptionResult
+
+logger = logging.getLogger("MP3Transcriber")
+
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+SECONDS_PER_TIMESTAMP = 0.02  # タイムスタンプトークン1つあたりの秒数
+
+
+class _FileJob:
+    """1ファイル分のウィンドウの処理状況"""
+
+    def __init__(self, file_path, duration, window_count, timings=None):
+        self.file_path = file_path
+        self.duration = duration
+        self.window_count = window_count
+        self.pending = window_count
+        self.windows = {}  # ウィンドウ番号: (セグメント, 言語)
+        self.timings = timings if timings is not None else StageTimings()
+        self.timings.audio_seconds = duration
+        self.started = time.perf_counter()
+
+    def result(self):
+        """ウィンドウごとの結果を連結してWhisperのtranscribeと同じ形式で返す"""
+        segments = []
+        languages = []
+        for index in range(self.window_count):
+            window_segments, language = self.windows[index]
+            languages.append(language)
+            for start, end, text in window_segments:
+                segments.append({"id": len(segments), "start": start, "end": end, "text": text})
+        # 最も多くのウィンドウで検出された言語をファイルの言語とする
+        language = max(set(languages), key=languages.count) if languages else None
+        return {"text": "".join(seg["text"] for seg in segments), "segments": segments, "language": language}
+
+
+class BatchedInferenceEngine:
+    """30秒ウィンドウを溜め、batch_size個ずつメルスペクトログラムを計算してまとめて推論する"""
+
+    def __init__(self, model, batch_size=8, language=None):
+        import whisper
+        from whisper.tokenizer import get_tokenizer
+
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.options = whisper.DecodingOptions(
+            task="transcribe", language=language, fp16=model.device.type == "cuda"
+        )
+        self.tokenizer = get_tokenizer(
+            model.is_multilingual, num_languages=model.num_languages, task="transcribe"
+        )
+        self._queue = deque()  # ファイルごとの (ジョブ, ウィンドウ番号, メルスペクトログラム) のジェネレータ
+        self._queued_windows = 0
+        self.stats = {}  # 実際のバッチサイズ: {"batches", "windows", "audio_seconds", "seconds"}
+
+    def add(self, file_path, audio, timings=None):
+        """音声を30秒ウィンドウに分割してキューに追加し、ジョブを返す
+
+        メルスペクトログラムはウィンドウをバッチに入れる時に計算するため、長いファイルでも
+        保持するのはバッチ1つ分だけになる。
+        timings (StageTimings) を指定すると、メル計算とこのファイルのウィンドウを含むバッチの推論時間を記録する。
+        """
+        window_samples = WINDOW_SECONDS * SAMPLE_RATE
+        window_count = (len(audio) + window_samples - 1) // window_samples
+        job = _FileJob(file_path, len(audio) / SAMPLE_RATE, window_count, timings)
+        if window_count:
+            self._queue.append(self._windows(job, audio))
+            self._queued_windows += window_count
+        return job
+
+    def _windows(self, job, audio):
+        """ジョブの (ジョブ, ウィンドウ番号, メルスペクトログラム) を1つずつ作るジェネレータ"""
+        import whisper
+
+        window_samples = WINDOW_SECONDS * SAMPLE_RATE
+        for index in range(job.window_count):
+            window = whisper.pad_or_trim(audio[index * window_samples:(index + 1) * window_samples])
+            with job.timings.measure("mel"):
+                mel = whisper.log_mel_spectrogram(window, n_mels=self.model.dims.n_mels)
+            yield job, index, mel
+
+    @property
+    def queued_windows(self):
+        return self._queued_windows
+
+    def run_batch(self):
+        """キューの先頭から最大batch_size個のウィンドウを推論し、全ウィンドウが揃ったジョブを返す"""
+        import torch
+
+        items = []
+        while self._queue and len(items) < self.batch_size:
+            item = next(self._queue[0], None)
+            if item is None:
+                # このファイルのウィンドウはすべてバッチに入れた
+                self._queue.popleft()
+                continue
+            items.append(item)
+        self._queued_windows -= len(items)
+        if not items:
+            return []
+        mel = torch.stack([mel for _, _, mel in items]).to(self.model.device)
+
+        batch_timings = StageTimings()
+        start = time.perf_counter()
+        with timing_scope(batch_timings, self.model):
+            results = self.model.decode(mel, self.options)
+        elapsed = time.perf_counter() - start
+        batch_timings.add("inference", elapsed)
+
+        audio_seconds = 0.0
+        completed = []
+        for (job, index, _), result in zip(items, results):
+            offset = index * WINDOW_SECONDS
+            window_seconds = min(WINDOW_SECONDS, job.duration - offset)
+            audio_seconds += window_seconds
+            segments = self._parse_segments(result.tokens, offset, window_seconds)
+            job.windows[index] = (segments, result.language)
+            # バッチ全体の時間をウィンドウ数で等分して各ファイルに割り当てる
+            for stage in ("encoder", "token_decode", "inference"):
+                job.timings.add(stage, batch_timings.total(stage) / len(items))
+            job.pending -= 1
+            if job.pending == 0:
+                completed.append(job)
+
+        stats = self.stats.setdefault(len(items), {"batches": 0, "windows": 0, "audio_seconds": 0.0, "seconds": 0.0})
+        stats["batches"] += 1
+        stats["windows"] += len(items)
+        stats["audio_seconds"] += audio_seconds
+        stats["seconds"] += elapsed
+        logger.debug(f"バッチ推論: {len(items)}ウィンドウ, {elapsed:.2f}秒")
+        return completed
+
+    def _parse_segments(self, tokens, offset, window_seconds):
+        """タイムスタンプトークンで区切られたトークン列を (開始秒, 終了秒, テキスト) のリストに変換"""
+        timestamp_begin = self.tokenizer.timestamp_begin
+        segments = []
+        start = None
+        text_tokens = []
+        for token in tokens:
+            if token < timestamp_begin:
+                text_tokens.append(token)
+                continue
+            time_position = (token - timestamp_begin) * SECONDS_PER_TIMESTAMP
+            if start is not None and text_tokens:
+                segments.append((offset + start, offset + min(time_position, window_seconds),
+                                 self.tokenizer.decode(text_tokens)))
+                text_tokens = []
+                start = None
+            else:
+                start = time_position
+        if text_tokens:
+            segments.append((offset + (start or 0.0), offset + window_seconds, self.tokenizer.decode(text_tokens)))
+        return segments
+
+    def format_stats(self):
+        """バッチサイズごとのスループットを整形"""
+        lines = ["バッチ推論スループット:"]
+        for batch_size in sorted(self.stats):
+            stats = self.stats[batch_size]
+            speed = stats["audio_seconds"] / stats["seconds"] if stats["seconds"] else 0.0
+            window_rate = stats["windows"] / stats["seconds"] if stats["seconds"] else 0.0
+            lines.append(
+                f"  バッチサイズ {batch_size}: {stats['batches']}回, {window_rate:.2f}ウィンドウ/秒, "
+                f"音声 {speed:.1f}秒/秒"
+            )
+        return "\n".join(lines)
+
+
+class BatchedTranscriber:
+    """複数ファイルをバッチ推論で文字起こしする"""
+
+    def __init__(self, language='ja', model_size='base', batch_size=8, model_cache=None, result_cache=None,
+                 precision="fp32", cancel_token=None, audio_cache=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH):
+        self.language = language
+        self.model_size = model_size
+        self.batch_size = batch_size
+        self.precision = precision
+        self.model_cache = model_cache or get_model_cache()
+        self.result_cache = result_cache
+        self.cancel_token = cancel_token
+        self.audio_cache = audio_cache
+        self.prefetch_depth = prefetch_depth
+        self.prefetcher = None
+        self.engine = None
+        self._cache_keys = {}
+
+    def transcribe(self, file_paths, cache_keys=None):
+        """完了したファイルから (パス, TranscriptionResult, エラー) を返すジェネレータ
+
+        音声のデコードは1ファイルずつ行い、キューにbatch_size個のウィンドウが溜まるたびに推論する。
+        prefetch_depth が1以上の場合、推論中に後続のファイルを別スレッドで先にデコードする。
+        cache_keys ({パス: キャッシュキー}) を指定すると、結果を結果キャッシュに保存する。
+        cancel_token がキャンセルされると、モデルを返却して TranscriptionCancelled を送出する。
+        """
+        self._cache_keys = cache_keys or {}
+        language_code = build_transcribe_options(self.language)["language"]
+        with self.model_cache.acquire(self.model_size, device=resolve_device(self.precision),
+                                      precision=self.precision) as lease:
+            self.engine = BatchedInferenceEngine(lease.model, self.batch_size, language_code)
+            with cancellation_scope(lease.model, self.cancel_token):
+                yield from self._transcribe_files(file_paths)
+
+    def _transcribe_files(self, file_paths):
+        import whisper
+
+        if self.audio_cache is not None:
+            decoder = self.audio_cache.load
+        else:
+            decoder = whisper.load_audio
+        if self.prefetch_depth > 0:
+            self.prefetcher = AudioPrefetcher(file_paths, decoder, self.prefetch_depth)
+            decoder = functools.partial(self.prefetcher.take, cancel_token=self.cancel_token)
+        try:
+            yield from self._transcribe_decoded(file_paths, decoder)
+        finally:
+            if self.prefetcher is not None:
+                self.prefetcher.close()
+
+    def _transcribe_decoded(self, file_paths, decoder):
+        for file_path in file_paths:
+            if self.cancel_token is not None:
+                self.cancel_token.raise_if_cancelled()
+            timings = StageTimings()
+            try:
+                with timings.measure("audio_decode"):
+                    audio = decoder(file_path)
+            except TranscriptionCancelled:
+                # プリフェッチの待ち中の中止はデコードの失敗ではない
+                raise
+            except Exception as e:
+                error_msg = f"音声のデコードに失敗しました: {os.path.basename(file_path)} - {str(e)}"
+                logger.error(error_msg)
+                yield file_path, None, TranscriptionError("音声認識エラー", error_msg)
+                continue
+            job = self.engine.add(file_path, audio, timings)
+            if job.window_count == 0:
+                yield from self._finish([job])
+            while self.engine.queued_windows >= self.engine.batch_size:
+                yield from self._finish(self.engine.run_batch())
+
+        while self.engine.queued_windows:
+            yield from self._finish(self.engine.run_batch())
+
+    def _finish(self, jobs):
+        for job in jobs:
+            result = TranscriptionResult.from_whisper(os.path.basename(job.file_path), self.model_size, job.result())
+            # ジョブはデコードの後に作られるため、デコードの時間を足して経過時間とする
+            job.timings.wall_seconds = time.perf_counter() - job.started + job.timings.total("audio_decode")
+            result.timings = job.timings
+            cache_key = self._cache_keys.get(job.file_path)
+            if self.result_cache is not None and cache_key is not None:
+                try:
+                    self.result_cache.put(cache_key, result.to_cache_entry())
+                except OSError as e:
+                    logger.warning(f"結果キャッシュへの保存に失敗しました: {str(e)}")
+            yield job.file_path, result, None
+
+    def format_stats(self):
+        """バッチサイズごとのスループットとプリフェッチの待ち時間を整形"""
+        lines = []
+        if self.engine is not None:
+            lines.append(self.engine.format_stats())
+        if self.prefetcher is not None:
+            lines.append(self.prefetcher.format_stats())
+        return "\n".join(lines)
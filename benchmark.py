@@ -0,0 +1,379 @@
+"""文字起こしのスループットを計測するベンチマーク
+
+合成音声 (WAV) をローカルで生成し、音声デコード・モデルロード・ファイルごとの推論・出力の書き出しの時間と、
+バッチ全体の実時間係数 (RTF = 処理時間 / 音声の長さ) および1時間あたりの処理ファイル数を計測する。
+--backend stub を指定するとモデルの重みなしで決定的なスタブモデルを使い、
+ワーカープールや書き出しステージなどのオーケストレーションのオーバーヘッドだけを計測できる。
+
+使用例:
+    python -m benchmark --backend stub --models tiny base --workers 1 2 --lengths 30 300 --output bench.json
+    python -m benchmark --backend stub --baseline bench.json  # 前回より遅くなっていれば終了コード1
+    python -m benchmark --models small --precisions fp32 int8 --reference-dir samples/  # 量子化の速度と精度
+"""
+import os
+import re
+import sys
+import json
+import time
+import wave
+import logging
+import argparse
+import platform
+import tempfile
+import statistics
+from datetime import datetime
+
+from log_config import setup_logging
+from model_cache import BACKEND_ENV, BACKENDS, SUPPORTED_PRECISIONS, ModelCache
+from output_writer import OUTPUT_FORMATS, save_transcription
+from transcriber import MODEL_SIZES, transcribe_file
+from worker_pool import available_cpus
+
+logger = logging.getLogger("MP3Transcriber")
+
+SAMPLE_RATE = 16000
+DEFAULT_AUDIO_DIR = os.path.join("benchmarks", "audio")
+DEFAULT_TOLERANCE = 0.15  # ベースラインよりこの割合以上遅ければ性能低下とみなす
+
+# 単語をスペースで区切らない言語 (ひらがな・カタカナ・漢字・ハングル)
+_UNSEGMENTED_SCRIPT = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def generate_synthetic_wav(path, seconds, seed=0, sample_rate=SAMPLE_RATE):
+    """発話と無音が交互に続く合成音声を16bitモノラルWAVで作成 (同じseedなら同じ内容)"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    total = int(seconds * sample_rate)
+    audio = np.zeros(total, dtype=np.float32)
+    position = 0
+    while position < total:
+        # 1〜3秒の有声区間 (基本周波数と倍音 + 振幅の揺らぎ) の後に0.3〜1.5秒の無音
+        length = min(total - position, int(rng.uniform(1.0, 3.0) * sample_rate))
+        t = np.arange(length, dtype=np.float32) / sample_rate
+        pitch = rng.uniform(100.0, 250.0)
+        voiced = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 5))
+        envelope = np.sin(np.pi * t * sample_rate / length)
+        envelope *= 0.6 + 0.4 * np.sin(2 * np.pi * rng.uniform(2.0, 6.0) * t)
+        audio[position:position + length] = 0.2 * voiced * envelope
+        position += length + int(rng.uniform(0.3, 1.5) * sample_rate)
+    audio += rng.normal(0.0, 0.003, total).astype(np.float32)
+
+    samples = (np.clip(audio, -1.0, 1.0) * 32767).astype('<i2')
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        f.writeframes(samples.tobytes())
+    return path
+
+
+def prepare_audio(audio_dir, lengths, files_per_length):
+    """長さごとの合成音声を用意し、{長さ: [パス]} を返す (既存のファイルは再利用)"""
+    audio = {}
+    for seconds in lengths:
+        paths = []
+        for index in range(files_per_length):
+            path = os.path.join(audio_dir, f"synthetic_{seconds}s_{index}.wav")
+            if not os.path.exists(path):
+                generate_synthetic_wav(path, seconds, seed=seconds * 1000 + index)
+            paths.append(path)
+        audio[seconds] = paths
+    return audio
+
+
+def collect_reference_files(reference_dir):
+    """精度比較に使う音声ファイル (.mp3 / .wav) の一覧"""
+    return [
+        os.path.join(reference_dir, name) for name in sorted(os.listdir(reference_dir))
+        if name.lower().endswith(('.mp3', '.wav'))
+    ]
+
+
+def _tokens(text):
+    # 日本語・中国語・韓国語は文字単位、それ以外はスペース区切りの単語単位で比較する
+    if _UNSEGMENTED_SCRIPT.search(text):
+        return [char for char in text if not char.isspace()]
+    return text.lower().split()
+
+
+def word_error_rate(reference, hypothesis):
+    """単語誤り率 (置換・挿入・削除の数 / 参照の単語数)"""
+    ref = _tokens(reference)
+    hyp = _tokens(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_token in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_token in enumerate(hyp, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1,
+                             previous[j - 1] + (ref_token != hyp_token))
+        previous = current
+    return previous[-1] / len(ref)
+
+
+def _summary(values):
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values) if values else 0.0,
+        "min": min(values) if values else 0.0,
+        "max": max(values) if values else 0.0,
+    }
+
+
+def bench_decode(paths, backend):
+    """音声デコードの時間 (秒) を計測"""
+    if backend == "stub":
+        from stub_backend import read_wav_duration as decode
+    else:
+        from whisper import load_audio as decode
+    timings = []
+    for path in paths:
+        start = time.perf_counter()
+        decode(path)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def bench_model_load(model_size, backend):
+    """空のキャッシュからモデルをロードする時間 (秒) を計測"""
+    cache = ModelCache(backend=backend)
+    with cache.acquire(model_size) as lease:
+        return lease.load_seconds
+
+
+def bench_inference(paths, model_size, backend, language, precision="fp32"):
+    """ロード済みのモデルでファイルごとの文字起こし時間を計測し、(時間の一覧, 結果の一覧) を返す"""
+    cache = ModelCache(backend=backend)
+    cache.acquire(model_size, precision=precision).release()  # ロード時間を含めない
+    timings = []
+    results = []
+    for path in paths:
+        start = time.perf_counter()
+        results.append(transcribe_file(path, language, model_size, model_cache=cache, precision=precision))
+        timings.append(time.perf_counter() - start)
+    return timings, results
+
+
+def bench_precision(paths, model_size, backend, language, precisions):
+    """精度ごとの推論時間と、fp32の結果に対する単語誤り率を計測"""
+    if "fp32" not in precisions:
+        precisions = ["fp32"] + list(precisions)
+    measured = {precision: bench_inference(paths, model_size, backend, language, precision)
+                for precision in precisions}
+    reference_mean = statistics.fmean(measured["fp32"][0])
+    reference_texts = [result.text for result in measured["fp32"][1]]
+    entries = []
+    for precision, (timings, results) in measured.items():
+        mean = statistics.fmean(timings)
+        entries.append({
+            "model": model_size,
+            "precision": precision,
+            "files": len(paths),
+            "seconds": _summary(timings),
+            "speedup": reference_mean / mean if mean else 0.0,
+            "wer_vs_fp32": statistics.fmean(
+                word_error_rate(reference, result.text) for reference, result in zip(reference_texts, results)
+            ),
+        })
+    return entries
+
+
+def bench_write(result, output_dir, repeat=3):
+    """出力形式ごとの保存時間 (秒) を計測"""
+    timings = {}
+    for output_format in OUTPUT_FORMATS:
+        values = []
+        for index in range(repeat):
+            output_path = os.path.join(output_dir, f"write_{index}{output_format}")
+            start = time.perf_counter()
+            save_transcription(output_path, result, output_format)
+            values.append(time.perf_counter() - start)
+        timings[output_format] = _summary(values)
+    return timings
+
+
+def bench_end_to_end(paths, model_size, workers, language, output_dir):
+    """CLIと同じ処理 (モデルロード・推論・保存) でバッチ全体の実時間を計測"""
+    from model_cache import get_model_cache
+    from transcribe_cli import run_batch
+
+    get_model_cache().clear()  # シナリオごとにモデルロードから計測する
+    start = time.perf_counter()
+    succeeded, failed = run_batch(paths, language, model_size, ".txt", output_dir, workers=workers)
+    elapsed = time.perf_counter() - start
+    if failed:
+        raise RuntimeError(f"{len(failed)}個のファイルの処理に失敗しました")
+    return elapsed
+
+
+def run_benchmarks(models, workers_list, lengths, files_per_length, backend, audio_dir, language="ja",
+                   precisions=("fp32",), reference_files=None):
+    """すべての組み合わせを計測し、レポート (辞書) を返す
+
+    precisionsにfp32以外が含まれる場合は、reference_files (既定は最短の合成音声) で
+    fp32に対する速度比と単語誤り率を計測する。
+    """
+    audio = prepare_audio(audio_dir, lengths, files_per_length)
+    report = {
+        "time": datetime.now().isoformat(timespec='seconds'),
+        "backend": backend,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": available_cpus(),
+        "decode": {},
+        "model_load": {},
+        "inference": [],
+        "write": {},
+        "precision": [],
+        "scenarios": [],
+    }
+
+    for seconds, paths in audio.items():
+        report["decode"][str(seconds)] = _summary(bench_decode(paths, backend))
+
+    with tempfile.TemporaryDirectory(prefix="mp3_transcriber_bench_") as output_dir:
+        for model_size in models:
+            report["model_load"][model_size] = bench_model_load(model_size, backend)
+            result = None
+            for seconds, paths in audio.items():
+                timings, results = bench_inference(paths, model_size, backend, language)
+                result = results[-1]
+                report["inference"].append({
+                    "model": model_size,
+                    "length_seconds": seconds,
+                    "seconds": _summary(timings),
+                    "rtf": statistics.fmean(timings) / seconds,
+                })
+            if result is not None and model_size == models[0]:
+                report["write"] = bench_write(result, output_dir)
+            if any(precision != "fp32" for precision in precisions):
+                paths = reference_files or audio[min(audio)]
+                report["precision"].extend(bench_precision(paths, model_size, backend, language, precisions))
+
+            for workers in workers_list:
+                for seconds, paths in audio.items():
+                    elapsed = bench_end_to_end(paths, model_size, workers, language, output_dir)
+                    audio_seconds = seconds * len(paths)
+                    report["scenarios"].append({
+                        "model": model_size,
+                        "workers": workers,
+                        "length_seconds": seconds,
+                        "files": len(paths),
+                        "wall_seconds": elapsed,
+                        "rtf": elapsed / audio_seconds,
+                        "files_per_hour": len(paths) / elapsed * 3600,
+                    })
+    return report
+
+
+def _scenario_key(scenario):
+    return (scenario["model"], scenario["workers"], scenario["length_seconds"])
+
+
+def compare_with_baseline(report, baseline, tolerance=DEFAULT_TOLERANCE):
+    """ベースラインよりスループットが tolerance 以上低下したシナリオの一覧を返す"""
+    previous = {_scenario_key(scenario): scenario for scenario in baseline.get("scenarios", [])}
+    regressions = []
+    for scenario in report["scenarios"]:
+        base = previous.get(_scenario_key(scenario))
+        if base is None:
+            continue
+        ratio = scenario["files_per_hour"] / base["files_per_hour"]
+        if ratio < 1.0 - tolerance:
+            regressions.append((scenario, base, ratio))
+    return regressions
+
+
+def format_report(report):
+    """レポートを表形式の文字列に整形"""
+    lines = [f"ベンチマーク結果 ({report['backend']}, CPU {report['cpus']}コア)", "", "音声デコード:"]
+    for seconds, stats in report["decode"].items():
+        lines.append(f"  {seconds}秒: 平均 {stats['mean'] * 1000:.1f}ms")
+    lines.append("モデルロード:")
+    for model_size, seconds in report["model_load"].items():
+        lines.append(f"  {model_size}: {seconds:.2f}秒")
+    lines.append("推論 (1ファイル):")
+    for entry in report["inference"]:
+        lines.append(f"  {entry['model']} / {entry['length_seconds']}秒: 平均 {entry['seconds']['mean']:.2f}秒 "
+                     f"(RTF {entry['rtf']:.3f})")
+    lines.append("書き出し:")
+    for output_format, stats in report["write"].items():
+        lines.append(f"  {output_format}: 平均 {stats['mean'] * 1000:.1f}ms")
+    if report.get("precision"):
+        lines.append("精度比較 (fp32に対する速度比と単語誤り率):")
+        for entry in report["precision"]:
+            lines.append(f"  {entry['model']} / {entry['precision']}: 平均 {entry['seconds']['mean']:.2f}秒, "
+                         f"速度 {entry['speedup']:.2f}倍, WER {entry['wer_vs_fp32']:.1%}")
+    lines.append("バッチ全体:")
+    lines.append(f"  {'モデル':<8}{'ワーカー':>6}{'長さ[秒]':>10}{'ファイル':>8}{'実時間[秒]':>12}{'RTF':>8}{'ファイル/時':>12}")
+    for scenario in report["scenarios"]:
+        lines.append(
+            f"  {scenario['model']:<8}{scenario['workers']:>6}{scenario['length_seconds']:>10}"
+            f"{scenario['files']:>8}{scenario['wall_seconds']:>12.2f}{scenario['rtf']:>8.3f}"
+            f"{scenario['files_per_hour']:>12.0f}"
+        )
+    return "\n".join(lines)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark",
+        description="合成音声で文字起こしのスループットを計測します",
+    )
+    parser.add_argument("--backend", choices=BACKENDS, default="whisper",
+                        help="stubを指定するとモデルの重みを使わずに計測します (既定: whisper)")
+    parser.add_argument("--models", nargs="+", choices=MODEL_SIZES, default=["tiny", "base"],
+                        help="計測するモデルサイズ (既定: tiny base)")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2], help="計測するワーカー数 (既定: 1 2)")
+    parser.add_argument("--lengths", nargs="+", type=int, default=[30, 300],
+                        help="合成音声の長さ (秒, 既定: 30 300)")
+    parser.add_argument("--precisions", nargs="+", choices=SUPPORTED_PRECISIONS, default=["fp32"],
+                        help="比較する推論精度 (fp32以外を指定するとfp32との速度比と単語誤り率を計測、既定: fp32)")
+    parser.add_argument("--reference-dir",
+                        help="精度比較に使う音声 (.mp3 / .wav) のフォルダ (既定: 最短の合成音声)")
+    parser.add_argument("--files", type=int, default=4, help="長さごとのファイル数 (既定: 4)")
+    parser.add_argument("-l", "--language", default="ja", help="言語コード (既定: ja)")
+    parser.add_argument("--audio-dir", default=DEFAULT_AUDIO_DIR,
+                        help=f"合成音声の保存先 (既定: {DEFAULT_AUDIO_DIR})")
+    parser.add_argument("--output", help="結果をJSONで保存するパス")
+    parser.add_argument("--baseline", help="比較するベースラインのJSON (性能低下があれば終了コード1)")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help=f"性能低下とみなすスループットの低下率 (既定: {DEFAULT_TOLERANCE})")
+    parser.add_argument("--log-dir", default="logs", help="ログファイルの保存先 (既定: logs)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    # ワーカープロセスにも同じバックエンドを使わせる (モデルキャッシュの作成前に設定する)
+    os.environ[BACKEND_ENV] = args.backend
+    setup_logging(args.log_dir, console_level=logging.WARNING)
+
+    reference_files = collect_reference_files(args.reference_dir) if args.reference_dir else None
+    report = run_benchmarks(args.models, args.workers, args.lengths, args.files, args.backend, args.audio_dir,
+                            args.language, args.precisions, reference_files)
+    print(format_report(report))
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n結果を保存しました: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(report, baseline, args.tolerance)
+        for scenario, base, ratio in regressions:
+            print(f"性能低下: {scenario['model']} / ワーカー{scenario['workers']} / {scenario['length_seconds']}秒 - "
+                  f"{base['files_per_hour']:.0f} → {scenario['files_per_hour']:.0f} ファイル/時 ({ratio:.0%})")
+        if regressions:
+            return 1
+        print("ベースラインからの性能低下はありません")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
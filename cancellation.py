@@ -0,0 +1,79 @@
+"""文字起こしの協調的なキャンセル (PyQt5に依存しない)
+
+スレッドを強制終了するとtorchの演算の途中で止まり、借りたモデルが返却されず書きかけのファイルも残るため、
+処理側がウィンドウの区切りとモデルの各forwardの前にトークンを確認し、例外で自ら中断する。
+デコーダはトークンごとにforwardされるため、推論中でも1ステップ分の待ちで中断できる。
+"""
+import threading
+import weakref
+
+
+class TranscriptionCancelled(Exception):
+    """キャンセル要求により文字起こしを中断した"""
+
+
+class CancellationToken:
+    """キャンセル要求を伝えるトークン
+
+    ワーカープロセスと共有する場合は multiprocessing の Event を渡す。
+    """
+
+    def __init__(self, event=None):
+        self._event = event if event is not None else threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise TranscriptionCancelled("処理がキャンセルされました")
+
+
+_local = threading.local()
+_hooks_lock = threading.Lock()
+_hooked_models = weakref.WeakSet()
+
+
+def _check_token(module, inputs):
+    token = getattr(_local, "token", None)
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def _install_hooks(model):
+    """エンコーダ・デコーダのforward前にこのスレッドのトークンを確認するフックを付ける (モデルごとに一度だけ)
+
+    モデルはキャッシュで複数スレッドに共有されるため、フックは呼び出したスレッドのトークンだけを見る。
+    """
+    with _hooks_lock:
+        if model in _hooked_models:
+            return
+        for name in ("encoder", "decoder"):
+            module = getattr(model, name, None)
+            if hasattr(module, "register_forward_pre_hook"):
+                module.register_forward_pre_hook(_check_token)
+        _hooked_models.add(model)
+
+
+class cancellation_scope:
+    """このスレッドでの model の推論中に token のキャンセル要求を確認するコンテキスト"""
+
+    def __init__(self, model, token):
+        self.model = model
+        self.token = token
+        self._previous = None
+
+    def __enter__(self):
+        if self.token is not None:
+            self.token.raise_if_cancelled()
+            _install_hooks(self.model)
+        self._previous = getattr(_local, "token", None)
+        _local.token = self.token
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.token = self._previous
@@ -0,0 +1,225 @@
+"""長時間の音声を無音の位置で分割し、チャンクごとに並列に文字起こしする処理 (PyQt5に依存しない)
+
+ファイル単位の並列処理では、3時間の録音が1つあるとその間1つのワーカーしか動かない。
+音声をデコードして発話区間の間の無音で区切り、各チャンクを別々のワーカーで推論してから
+タイムスタンプをずらして1つの結果に繋ぎ合わせる。
+近くに無音がない場合は少し重ねて切り、重なり部分で二重に認識された語を繋ぎ目で取り除く。
+"""
+import os
+import string
+import logging
+import tempfile
+import traceback
+
+from audio_cache import decode_audio
+from cancellation import TranscriptionCancelled, cancellation_scope
+from metrics import StageTimings, timing_scope
+from model_cache import get_model_cache, resolve_device
+from progress import probe_duration
+from transcriber import TranscriptionError, TranscriptionListener, build_transcribe_options
+from vad import detect_speech
+
+logger = logging.getLogger("MP3Transcriber")
+
+SAMPLE_RATE = 16000
+SPLIT_MIN_SECONDS = 20 * 60  # これ以上の長さのファイルを分割する
+MIN_CHUNK_SECONDS = 5 * 60  # チャンクの最短の長さ (短すぎると前後の文脈が失われる)
+CHUNKS_PER_WORKER = 2  # 終わる時刻がそろうよう、ワーカー数より多めに分割する
+SEARCH_SECONDS = 60.0  # 目標の切れ目の前後この秒数の範囲で無音を探す
+OVERLAP_SECONDS = 4.0  # 無音が見つからない場合にチャンクを重ねる長さ
+MAX_SEAM_TOKENS = 30  # 繋ぎ目で重複を探す最大の語数 (空白のない言語では文字数)
+MIN_SEAM_CHARS = 4  # これより短い一致は偶然の繰り返しとみなして残す
+
+_PUNCTUATION = string.punctuation + "、。，．！？「」『』・…　"
+
+
+def should_split(file_path, min_seconds=SPLIT_MIN_SECONDS):
+    """分割して並列に処理するだけの長さがあるか (長さが取得できない場合はFalse)"""
+    duration = probe_duration(file_path)
+    return duration is not None and duration >= min_seconds
+
+
+def choose_chunk_seconds(duration, workers):
+    """音声の長さとワーカー数からチャンクの長さを決める"""
+    return max(MIN_CHUNK_SECONDS, duration / (max(1, workers) * CHUNKS_PER_WORKER))
+
+
+def plan_chunks(audio, chunk_seconds, sample_rate=SAMPLE_RATE, search_seconds=SEARCH_SECONDS,
+                overlap_seconds=OVERLAP_SECONDS):
+    """音声を約 chunk_seconds 秒ごとに区切った (開始秒, 終了秒) のリストを返す
+
+    切れ目は目標の位置の前後 search_seconds 秒にある最も長い無音の中央に置く。
+    無音がない場合は目標の位置で overlap_seconds 秒重ねて切る。
+    """
+    duration = len(audio) / sample_rate
+    regions = detect_speech(audio, sample_rate)
+    # 発話区間の間の無音の (開始秒, 終了秒)
+    gaps = [(regions[i][1], regions[i + 1][0]) for i in range(len(regions) - 1)]
+    chunks = []
+    start = 0.0
+    # 最後のチャンクが短くなりすぎないよう、残りが1.5チャンク分を切ったら分割をやめる
+    while duration - start > chunk_seconds * 1.5:
+        target = start + chunk_seconds
+        candidates = [gap for gap in gaps if abs((gap[0] + gap[1]) / 2 - target) <= search_seconds]
+        if candidates:
+            # 長さがほぼ同じ無音なら目標に近い方を選ぶ
+            gap_start, gap_end = max(candidates, key=lambda gap: (round(gap[1] - gap[0], 1),
+                                                                   -abs((gap[0] + gap[1]) / 2 - target)))
+            cut = (gap_start + gap_end) / 2
+            chunks.append((start, cut))
+            start = cut
+        else:
+            chunks.append((start, target + overlap_seconds / 2))
+            start = target - overlap_seconds / 2
+    chunks.append((start, duration))
+    return chunks
+
+
+def prepare_split(file_path, workers, audio_cache=None, cancel_token=None, temp_dir=None, timings=None):
+    """音声をデコードしてチャンクに区切り、(一時ファイルのパス, チャンクのリスト) を返す
+
+    デコードした音声は一時 .npy ファイルに保存し、各ワーカーはメモリマップで自分のチャンクだけを読む。
+    一時ファイルは呼び出し元が全チャンクの処理後に削除する。
+    timings (StageTimings) を指定するとデコードの所要時間と音声の長さを記録する。
+    """
+    import numpy as np
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    timings = timings if timings is not None else StageTimings()
+    try:
+        with timings.measure("audio_decode"):
+            audio = audio_cache.load(file_path) if audio_cache is not None else decode_audio(file_path)
+    except Exception as e:
+        raise TranscriptionError("デコードエラー", f"音声のデコードに失敗しました: {str(e)}") from e
+    duration = timings.audio_seconds = len(audio) / SAMPLE_RATE
+    chunks = plan_chunks(audio, choose_chunk_seconds(duration, workers))
+    fd, audio_path = tempfile.mkstemp(dir=temp_dir, prefix="split-", suffix=".npy")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.save(f, np.asarray(audio, dtype=np.float32))
+    except Exception:
+        os.remove(audio_path)
+        raise
+    cuts = sum(1 for (_, end), (start, _) in zip(chunks, chunks[1:]) if start >= end)
+    logger.info(f"{os.path.basename(file_path)} ({duration / 60:.1f}分) を{len(chunks)}チャンクに分割しました "
+                f"(無音で分割 {cuts}箇所 / 重ねて分割 {len(chunks) - 1 - cuts}箇所)")
+    return audio_path, chunks
+
+
+def transcribe_chunk(audio_path, start, end, language='ja', model_size='base', vad=False, precision="fp32",
+                     listener=None, cancel_token=None, model_cache=None):
+    """一時ファイルの start〜end 秒を文字起こしし、チャンクの先頭を0秒とするWhisper形式の結果を返す
+
+    結果の "timings" にはチャンクの処理の段階ごとの所要時間 (StageTimings) を入れる。
+    """
+    import numpy as np
+
+    listener = listener or TranscriptionListener()
+    model_cache = model_cache or get_model_cache()
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+
+    timings = StageTimings()
+    audio = np.load(audio_path, mmap_mode='r')
+    # 書き込み可能な配列にしてからモデルに渡す (torchの読み取り専用の警告を避ける)
+    clip = np.array(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])
+    del audio
+
+    try:
+        with timings.measure("model_load"):
+            lease = model_cache.acquire(model_size, device=resolve_device(precision), precision=precision)
+    except Exception as e:
+        error_msg = f"モデルのロードに失敗しました: {str(e)}"
+        logger.error(traceback.format_exc())
+        listener.log(error_msg)
+        raise TranscriptionError("モデルロードエラー", error_msg, traceback.format_exc())
+
+    options = build_transcribe_options(language)
+    with lease:
+        try:
+            with timing_scope(timings, lease.model), timings.measure("inference"), \
+                    cancellation_scope(lease.model, cancel_token):
+                if vad:
+                    from vad import transcribe_speech
+                    result = transcribe_speech(lease.model, clip, options)
+                else:
+                    result = lease.model.transcribe(clip, **options)
+        except TranscriptionCancelled:
+            raise
+        except Exception as e:
+            error_msg = f"音声認識処理でエラーが発生しました ({start:.0f}〜{end:.0f}秒): {str(e)}"
+            logger.error(traceback.format_exc())
+            listener.log(error_msg)
+            raise TranscriptionError("音声認識エラー", error_msg, traceback.format_exc())
+
+    # 親プロセスに送るのは繋ぎ合わせに必要な項目だけにする
+    return {
+        "language": result.get("language"),
+        "segments": [
+            {"start": segment["start"], "end": segment["end"], "text": segment["text"],
+             "avg_logprob": segment.get("avg_logprob", float("nan"))}
+            for segment in result.get("segments", [])
+        ],
+        "timings": timings,
+    }
+
+
+def _tokens(text):
+    """重複の比較に使う単位 (空白で区切る言語は単語、それ以外は文字)"""
+    text = text.strip()
+    return text.split() if " " in text else list(text)
+
+
+def _normalize(token):
+    return token.strip(_PUNCTUATION).lower()
+
+
+def _drop_seam_overlap(previous_text, text):
+    """previous_text の末尾と重なる text の先頭部分を取り除いて返す"""
+    previous = [_normalize(token) for token in _tokens(previous_text)]
+    tokens = _tokens(text)
+    normalized = [_normalize(token) for token in tokens]
+    spaced = " " in text.strip()
+    for size in range(min(len(previous), len(tokens), MAX_SEAM_TOKENS), 0, -1):
+        if previous[-size:] != normalized[:size] or len("".join(normalized[:size])) < MIN_SEAM_CHARS:
+            continue
+        rest = tokens[size:]
+        return " " + " ".join(rest) if spaced and rest else "".join(rest)
+    return text
+
+
+def stitch_chunks(chunks, results):
+    """チャンクごとの結果のタイムスタンプを元の時間軸に戻し、1つのWhisper形式の結果に繋ぎ合わせる
+
+    重ねて切った繋ぎ目では、中心が重なりの中央より後にある前のチャンクのセグメントと、中央より前にある
+    次のチャンクのセグメントを捨て、それでも残った語の重複を取り除く。
+    """
+    segments = []
+    language = None
+    previous_end = 0.0
+    for (start, end), result in zip(chunks, results):
+        language = language or result.get("language")
+        overlapped = start < previous_end
+        seam = (start + previous_end) / 2
+        if overlapped:
+            while segments and (segments[-1]["start"] + segments[-1]["end"]) / 2 >= seam:
+                segments.pop()
+        first = True
+        for segment in result.get("segments", []):
+            segment_start = start + segment["start"]
+            segment_end = min(end, start + segment["end"])
+            if overlapped and (segment_start + segment_end) / 2 < seam:
+                continue
+            text = segment["text"]
+            if overlapped and first and segments:
+                # 前のセグメントと時刻が重ならないようにする
+                segment_start = max(segment_start, segments[-1]["end"])
+                text = _drop_seam_overlap(segments[-1]["text"], text)
+                if not text.strip():
+                    continue
+            first = False
+            segments.append({"id": len(segments), "start": segment_start, "end": segment_end, "text": text,
+                             "avg_logprob": segment.get("avg_logprob", float("nan"))})
+        previous_end = end
+    return {"text": "".join(segment["text"] for segment in segments), "segments": segments, "language": language}
@@ -0,0 +1,229 @@
+"""マシンに合わせてワーカー数とワーカーあたりのtorchスレッド数を決める実行計画 (PyQt5に依存しない)
+
+同じコア数でも、ワーカーを増やしてスレッドを減らすか、その逆かで処理速度が変わり、
+最適な分け方はモデルサイズと精度によって異なる。メモリに収まる組み合わせを合成音声で短時間ずつ計測し、
+最も速かったものを cache/plans.json に保存して次回から使う。
+"""
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from cancellation import TranscriptionCancelled
+from model_cache import default_backend, estimate_memory_mb
+from worker_pool import TranscriptionPool, available_cpus
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_PLAN_PATH = os.path.join("cache", "plans.json")
+CALIBRATION_SECONDS = 20  # 計測に使う合成音声1ファイルの長さ
+CALIBRATION_FILES_PER_WORKER = 2  # ワーカーごとに計測するファイル数
+WORKER_OVERHEAD_MB = 400  # モデル以外にワーカー1つが使うメモリの目安 (torch本体とデコードした音声)
+MEMORY_HEADROOM = 0.8  # 空きメモリのうちワーカーに割り当てる割合
+
+
+def available_memory_mb():
+    """空きメモリ (MB)。取得できない場合はNone"""
+    try:
+        with open("/proc/meminfo", 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def candidate_splits(model_size, precision="fp32", cpus=None, memory_mb=None):
+    """計測する (ワーカー数, ワーカーあたりのスレッド数) の候補
+
+    ワーカー数は1から倍々に増やし、コア数またはメモリに収まる最大のワーカー数までとする。
+    """
+    cpus = cpus or available_cpus()
+    max_workers = cpus
+    if memory_mb is not None:
+        per_worker_mb = estimate_memory_mb(model_size, precision) + WORKER_OVERHEAD_MB
+        max_workers = min(max_workers, max(1, int(memory_mb * MEMORY_HEADROOM // per_worker_mb)))
+    workers_list = []
+    workers = 1
+    while workers < max_workers:
+        workers_list.append(workers)
+        workers *= 2
+    workers_list.append(max_workers)
+    return [(workers, max(1, cpus // workers)) for workers in workers_list]
+
+
+def set_torch_threads(threads):
+    """このプロセスのtorchのスレッド数を設定 (torchがなければ何もしない)"""
+    try:
+        import torch
+    except ImportError:
+        return
+    torch.set_num_threads(max(1, threads))
+
+
+class ExecutionPlan:
+    """計測で選んだワーカー数とスレッド数"""
+
+    def __init__(self, model_size, precision, workers, threads_per_worker, cpus, backend="whisper",
+                 audio_seconds_per_second=0.0, measurements=None, created=None):
+        self.model_size = model_size
+        self.precision = precision
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.cpus = cpus
+        self.backend = backend
+        self.audio_seconds_per_second = audio_seconds_per_second  # 1秒あたりに処理できる音声の秒数
+        self.measurements = measurements or []
+        self.created = created or datetime.now().isoformat(timespec='seconds')
+
+    @property
+    def key(self):
+        return plan_key(self.model_size, self.precision, self.cpus, self.backend)
+
+    def to_dict(self):
+        return {
+            "model_size": self.model_size,
+            "precision": self.precision,
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "cpus": self.cpus,
+            "backend": self.backend,
+            "audio_seconds_per_second": self.audio_seconds_per_second,
+            "measurements": self.measurements,
+            "created": self.created,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["model_size"], data["precision"], data["workers"], data["threads_per_worker"],
+                   data["cpus"], data.get("backend", "whisper"), data.get("audio_seconds_per_second", 0.0),
+                   data.get("measurements"), data.get("created"))
+
+    def describe(self):
+        """ログ出力用の説明"""
+        return (f"{self.model_size} ({self.precision}): {self.workers}ワーカー × {self.threads_per_worker}スレッド "
+                f"(音声 {self.audio_seconds_per_second:.1f}秒/秒, {self.created} 計測)")
+
+
+def plan_key(model_size, precision, cpus, backend):
+    # コア数が変わった (別のマシンやコンテナで動かした) 場合は計測し直す
+    return f"{model_size}-{precision}-{cpus}cpu-{backend}"
+
+
+class PlanStore:
+    """モデルサイズ・精度・コア数ごとの実行計画をJSONファイルに保存する"""
+
+    def __init__(self, path=DEFAULT_PLAN_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"実行計画を読み込めませんでした: {str(e)}")
+            return {}
+
+    def load(self, model_size, precision="fp32", cpus=None, backend=None):
+        """保存済みの実行計画を返す (なければNone)"""
+        key = plan_key(model_size, precision, cpus or available_cpus(), backend or default_backend())
+        with self._lock:
+            data = self._read().get(key)
+        if data is None:
+            return None
+        try:
+            return ExecutionPlan.from_dict(data)
+        except (KeyError, TypeError):
+            return None
+
+    def save(self, plan):
+        """実行計画を保存 (一時ファイルに書いてから置き換える)"""
+        with self._lock:
+            plans = self._read()
+            plans[plan.key] = plan.to_dict()
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(plans, f, ensure_ascii=False, indent=2)
+                os.replace(tmp_path, self.path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        logger.info(f"実行計画を保存しました: {plan.describe()}")
+
+
+def _run_files(pool, files, language, model_size, precision, cancel_token):
+    futures = [pool.submit(path, language, model_size, precision=precision) for path in files]
+    pending = set(futures)
+    while pending:
+        if cancel_token is not None and cancel_token.cancelled:
+            pool.cancel()
+            pool.shutdown(cancel_pending=True)
+            raise TranscriptionCancelled()
+        done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+        # ワーカーからの進捗通知は使わないので捨てる
+        pool.drain_events()
+        for future in done:
+            future.result()
+
+
+def measure_split(files, workers, threads_per_worker, model_size, precision="fp32", language="ja",
+                  cancel_token=None):
+    """workers × threads_per_worker で files を処理し、1秒あたりに処理できた音声の秒数を返す
+
+    モデルのロードを計測に含めないよう、先にワーカー数分のファイルを処理してから計測する。
+    """
+    with TranscriptionPool(workers, threads_per_worker) as pool:
+        _run_files(pool, files[:workers], language, model_size, precision, cancel_token)
+        start = time.perf_counter()
+        _run_files(pool, files, language, model_size, precision, cancel_token)
+        elapsed = time.perf_counter() - start
+    return len(files) * CALIBRATION_SECONDS / elapsed
+
+
+def calibrate(model_size, precision="fp32", language="ja", candidates=None, on_progress=None, cancel_token=None):
+    """候補の組み合わせを合成音声で計測し、最も速かった ExecutionPlan を返す
+
+    on_progress(計測済みの数, 候補の数, 説明) は候補を1つ計測するたびに呼ばれる。
+    cancel_token がキャンセルされると TranscriptionCancelled を送出する。
+    """
+    from benchmark import generate_synthetic_wav
+
+    cpus = available_cpus()
+    candidates = candidates or candidate_splits(model_size, precision, cpus, available_memory_mb())
+    logger.info(f"実行計画の計測を開始します: {model_size} ({precision}), 候補 {len(candidates)}通り")
+    measurements = []
+    with tempfile.TemporaryDirectory(prefix="mp3_transcriber_calibration_") as audio_dir:
+        file_count = max(workers for workers, _ in candidates) * CALIBRATION_FILES_PER_WORKER
+        files = [
+            generate_synthetic_wav(os.path.join(audio_dir, f"calibration_{index}.wav"), CALIBRATION_SECONDS,
+                                   seed=index)
+            for index in range(file_count)
+        ]
+        for index, (workers, threads) in enumerate(candidates):
+            throughput = measure_split(files[:workers * CALIBRATION_FILES_PER_WORKER], workers, threads,
+                                       model_size, precision, language, cancel_token)
+            measurements.append({"workers": workers, "threads_per_worker": threads,
+                                 "audio_seconds_per_second": throughput})
+            description = f"{workers}ワーカー × {threads}スレッド: 音声 {throughput:.1f}秒/秒"
+            logger.info(f"実行計画の計測: {description}")
+            if on_progress is not None:
+                on_progress(index + 1, len(candidates), description)
+
+    best = max(measurements, key=lambda measurement: measurement["audio_seconds_per_second"])
+    return ExecutionPlan(model_size, precision, best["workers"], best["threads_per_worker"], cpus,
+                         default_backend(), best["audio_seconds_per_second"], measurements)
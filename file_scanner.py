@@ -0,0 +1,61 @@
+"""フォルダ内の音声ファイルの逐次走査 (PyQt5に依存しない)
+
+os.walk はディレクトリごとに全エントリを stat するため、ネットワーク共有上の大きなフォルダでは
+最初の結果が返るまでに時間がかかる。ここでは os.scandir のエントリ種別をそのまま使い、
+見つけたファイルから順に返す。
+"""
+import os
+import time
+import logging
+
+logger = logging.getLogger("MP3Transcriber")
+
+AUDIO_EXTENSIONS = (".mp3",)
+
+# 見つけたファイルをこの件数、またはこの秒数ごとにまとめて通知する
+SCAN_BATCH_SIZE = 500
+SCAN_BATCH_SECONDS = 0.2
+
+
+def iter_audio_files(root, extensions=AUDIO_EXTENSIONS, cancel_token=None):
+    """root以下の音声ファイルのパスを見つけた順に返す
+
+    シンボリックリンクのフォルダは辿らない。読めないフォルダは警告を出して飛ばす。
+    cancel_token (CancellationToken) がキャンセルされると途中で終了する。
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        subdirectories = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if cancel_token is not None and cancel_token.cancelled:
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirectories.append(entry.path)
+                        elif entry.name.lower().endswith(extensions) and entry.is_file():
+                            yield entry.path
+                    except OSError:
+                        continue
+        except OSError as e:
+            logger.warning(f"フォルダを読み込めませんでした: {directory} ({str(e)})")
+        # 名前順に辿るため逆順に積む
+        stack.extend(sorted(subdirectories, reverse=True))
+
+
+def iter_scan_batches(root, extensions=AUDIO_EXTENSIONS, cancel_token=None,
+                      batch_size=SCAN_BATCH_SIZE, batch_seconds=SCAN_BATCH_SECONDS):
+    """見つけたファイルを batch_size 件ごと、または batch_seconds 秒ごとのリストにまとめて返す"""
+    batch = []
+    last = time.monotonic()
+    for path in iter_audio_files(root, extensions, cancel_token):
+        batch.append(path)
+        now = time.monotonic()
+        if len(batch) >= batch_size or now - last >= batch_seconds:
+            yield batch
+            batch = []
+            last = now
+    if batch:
+        yield batch
@@ -0,0 +1,90 @@
+"""ロガー "MP3Transcriber" の設定"""
+import os
+import sys
+import logging
+import threading
+from collections import deque
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+LOGGER_NAME = "MP3Transcriber"
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# ログファイルはこのサイズでローテーションし、古いものから指定数だけ残す
+LOG_FILE_MAX_BYTES = 10 * 1024 * 1024
+LOG_FILE_BACKUP_COUNT = 5
+
+# 画面のログ表示に残す最大行数。環境変数で上書き可能
+DEFAULT_LOG_VIEW_LINES = int(os.environ.get("MP3_TRANSCRIBER_LOG_VIEW_LINES", "2000"))
+
+
+def setup_logging(log_directory="logs", console_level=logging.INFO, install_excepthook=True,
+                  max_bytes=LOG_FILE_MAX_BYTES, backup_count=LOG_FILE_BACKUP_COUNT):
+    """ファイルとコンソールへのログ出力を設定し、ログファイルのパスを返す
+
+    画面のログ表示は行数に上限があるため、全履歴はローテーションするログファイルに残す。
+    """
+    if not os.path.exists(log_directory):
+        os.makedirs(log_directory)
+
+    log_filename = os.path.join(log_directory, f"transcriber_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+
+    # ロガーの設定
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.DEBUG)
+
+    # ファイルハンドラ
+    file_handler = RotatingFileHandler(log_filename, maxBytes=max_bytes, backupCount=backup_count,
+                                       encoding='utf-8')
+    file_handler.setLevel(logging.DEBUG)
+
+    # コンソールハンドラ
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level)
+
+    # フォーマッタ
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+
+    # ハンドラの追加
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+
+    if install_excepthook:
+        sys.excepthook = exception_hook
+
+    return log_filename
+
+
+class LogRingBuffer:
+    """画面に未反映のログ行を溜めるリングバッファ (PyQt5に依存しない)
+
+    表示側が定期的に drain() で取り出す。上限を超えた分は古い行から捨て、捨てた行数を数える。
+    """
+
+    def __init__(self, max_lines=DEFAULT_LOG_VIEW_LINES):
+        self._lines = deque(maxlen=max_lines)
+        self._lock = threading.Lock()
+        self._dropped = 0
+
+    def append(self, message):
+        with self._lock:
+            if len(self._lines) == self._lines.maxlen:
+                self._dropped += 1
+            self._lines.append(message)
+
+    def drain(self):
+        """溜まった行と、その間に捨てた行数を返す"""
+        with self._lock:
+            lines = list(self._lines)
+            dropped = self._dropped
+            self._lines.clear()
+            self._dropped = 0
+        return lines, dropped
+
+
+# グローバルな例外ハンドラ
+def exception_hook(exc_type, exc_value, exc_traceback):
+    logging.getLogger(LOGGER_NAME).critical("Uncaught exception", exc_info=(exc_type, exc_value, exc_traceback))
+    sys.__excepthook__(exc_type, exc_value, exc_traceback)
@@ -1,191 +1,702 @@
+import time
+
+# 起動時間の計測はモジュールのインポートから始める
+_STARTUP_BEGIN = time.perf_counter()
+
 import sys
 import os
 import logging
+import threading
 import traceback
-from datetime import datetime
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QPushButton, QVBoxLayout, QHBoxLayout, 
-                             QWidget, QFileDialog, QListWidget, QProgressBar, QLabel, 
-                             QTextEdit, QComboBox, QGroupBox, QGridLayout, QCheckBox, QMessageBox)
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-
-# ロギングの設定
-log_directory = "logs"
-if not os.path.exists(log_directory):
-    os.makedirs(log_directory)
+                             QWidget, QFileDialog, QListView, QProgressBar, QLabel, 
+                             QPlainTextEdit, QComboBox, QGroupBox, QGridLayout, QCheckBox, QMessageBox,
+                             QSpinBox, QAbstractItemView)
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QObject, QThread, QTimer, pyqtSignal
+from concurrent.futures import FIRST_COMPLETED, wait
 
-log_filename = os.path.join(log_directory, f"transcriber_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log")
+from audio_cache import AudioCache
+from batched_inference import BatchedTranscriber
+from batch_journal import DONE, FAILED, QUEUED, RUNNING, BatchJournal
+from cancellation import CancellationToken, TranscriptionCancelled
+from chunked_inference import SPLIT_MIN_SECONDS, should_split
+from execution_planner import PlanStore, calibrate, set_torch_threads
+from file_scanner import iter_scan_batches
+from log_config import DEFAULT_LOG_VIEW_LINES, LogRingBuffer, setup_logging
+from metrics import MetricsRecorder
+from model_cache import get_model_cache
+from output_writer import FORMAT_MAP, AsyncOutputWriter
+from prefetch import AudioPrefetcher
+from profiling import ProfileSelector, batch_profile_for, default_profile_dir, profile_for
+from progress import BatchProgress
+from result_cache import ResultCache
+from scheduler import SCHEDULE_MAP, format_schedule, schedule_files
+from transcriber import (LANGUAGE_MAP, PRECISION_MAP, TranscriptionError, TranscriptionListener,
+                         cached_result_skipper, format_timestamp, lookup_cached_transcription,
+                         transcribe_file)
+from transcription_daemon import DaemonError, connect_daemon
+from worker_pool import TranscriptionPool, available_cpus, default_threads_per_worker
 
-# ロガーの設定
 logger = logging.getLogger("MP3Transcriber")
-logger.setLevel(logging.DEBUG)
 
-# ファイルハンドラ
-file_handler = logging.FileHandler(log_filename, encoding='utf-8')
-file_handler.setLevel(logging.DEBUG)
 
-# コンソールハンドラ
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
+def _connect_daemon():
+    """常駐プロセスに接続する (起動していなければ起動する)。接続できなければ警告を出してNoneを返す"""
+    try:
+        return connect_daemon()
+    except DaemonError as e:
+        logger.warning(f"常駐プロセスに接続できないため、このウィンドウで処理します: {str(e)}")
+        return None
+
+
+class StartupTimer:
+    """起動の各段階までの経過時間を記録する (ログ設定前の段階もまとめて後から出力する)"""
+
+    def __init__(self, begin):
+        self.begin = begin
+        self.marks = []  # (段階, 経過秒)
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter() - self.begin))
+
+    def report(self):
+        previous = 0.0
+        for name, elapsed in self.marks:
+            logger.info(f"起動時間: {name} {elapsed - previous:.3f}秒 (累計 {elapsed:.3f}秒)")
+            previous = elapsed
+
+
+class OutputWriterStage(QObject):
+    """結果の保存を書き出しスレッドで行い、完了をGUIスレッドにシグナルで通知する
+
+    submit は文字起こしスレッドから呼ばれ、書き出しが追いつかない場合はそのスレッドをブロックする。
+    """
+    saved_signal = pyqtSignal(str, str)  # 音声ファイルパス、保存先
+    failed_signal = pyqtSignal(str, str)  # 音声ファイルパス、エラーメッセージ
+    _done_signal = pyqtSignal(str, str, str)  # 音声ファイルパス、保存先、エラーメッセージ
+
+    def __init__(self, output_dir, output_format, metrics=None):
+        super().__init__()
+        self.writer = AsyncOutputWriter(output_dir, output_format, metrics=metrics)
+        self._lock = threading.Lock()
+        self._outstanding = 0  # 投入済みでGUIスレッドに完了が届いていない書き出し数
+        # 書き出しスレッドからのシグナルはGUIスレッドのキューを経由して届く
+        self._done_signal.connect(self._acknowledge)
+
+    @property
+    def idle(self):
+        with self._lock:
+            return self._outstanding == 0
+
+    def submit(self, file_path, result):
+        with self._lock:
+            self._outstanding += 1
+        self.writer.submit(
+            file_path, result,
+            on_saved=lambda path, saved_path: self._done_signal.emit(path, saved_path, ""),
+            on_failed=lambda path, error: self._done_signal.emit(path, "", str(error) or repr(error)),
+        )
+
+    def _acknowledge(self, file_path, saved_path, error):
+        with self._lock:
+            self._outstanding -= 1
+        if error:
+            self.failed_signal.emit(file_path, error)
+        else:
+            self.saved_signal.emit(file_path, saved_path)
+
+    def shutdown(self):
+        """投入済みの書き出しは完了させ、スレッドを終了する"""
+        self.writer.shutdown(wait=False)
+
+
+class LogView(QPlainTextEdit):
+    """行数に上限のあるログ表示
+
+    append() はバッファに溜めるだけで、タイマーで1秒に数回まとめて画面に反映する。
+    上限を超えた古い行は画面から消える (全履歴はログファイルに残る)。
+    """
+    FLUSHES_PER_SECOND = 5
+
+    def __init__(self, max_lines=DEFAULT_LOG_VIEW_LINES, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setMaximumBlockCount(max_lines)
+        self._buffer = LogRingBuffer(max_lines)
+        self._timer = QTimer(self)
+        self._timer.setInterval(1000 // self.FLUSHES_PER_SECOND)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def append(self, message):
+        self._buffer.append(message)
+
+    def flush(self):
+        """溜まったログを一度に追加し、末尾を表示していた場合だけ自動スクロールする"""
+        lines, dropped = self._buffer.drain()
+        if not lines:
+            return
+        if dropped:
+            lines.insert(0, f"... ({dropped}行を省略しました。全体はログファイルを参照してください)")
+        scroll_bar = self.verticalScrollBar()
+        at_bottom = scroll_bar.value() >= scroll_bar.maximum() - 4
+        self.appendPlainText("\n".join(lines))
+        if at_bottom:
+            scroll_bar.setValue(scroll_bar.maximum())
+
+
+class FileListModel(QAbstractListModel):
+    """選択されたファイルの一覧 (QListView は表示中の行だけを描画する)"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.paths = []
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.paths)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return os.path.basename(self.paths[index.row()])
+        if role == Qt.ToolTipRole:
+            return self.paths[index.row()]
+        return None
+
+    def set_paths(self, paths):
+        self.beginResetModel()
+        self.paths = list(paths)
+        self.endResetModel()
+
+    def append_paths(self, paths):
+        if not paths:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.paths), len(self.paths) + len(paths) - 1)
+        self.paths.extend(paths)
+        self.endInsertRows()
 
-# フォーマッタ
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
 
-# ハンドラの追加
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+class FolderScanThread(QThread):
+    """フォルダ内のMP3ファイルを走査し、見つけたファイルをまとめて通知するスレッド"""
+    files_found_signal = pyqtSignal(object)  # 見つけたファイルパスのリスト
+    scan_finished_signal = pyqtSignal(int, bool, float)  # 見つけたファイル数、中止したか、所要秒数
+    error_signal = pyqtSignal(str)
 
-# グローバルな例外ハンドラ
-def exception_hook(exc_type, exc_value, exc_traceback):
-    logger.critical("Uncaught exception", exc_info=(exc_type, exc_value, exc_traceback))
-    sys.__excepthook__(exc_type, exc_value, exc_traceback)
+    def __init__(self, folder_path):
+        super().__init__()
+        self.folder_path = folder_path
+        self.cancel_token = CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        start = time.perf_counter()
+        count = 0
+        try:
+            for batch in iter_scan_batches(self.folder_path, cancel_token=self.cancel_token):
+                count += len(batch)
+                self.files_found_signal.emit(batch)
+        except Exception as e:
+            logger.error(f"フォルダ走査中にエラーが発生しました: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.error_signal.emit(str(e))
+        self.scan_finished_signal.emit(count, self.cancel_token.cancelled, time.perf_counter() - start)
 
-sys.excepthook = exception_hook
 
 # Whisperモデルを使用した音声文字起こしスレッド
 class WhisperTranscriptionThread(QThread):
     """Whisperモデルを使用した音声文字起こし処理を行うスレッド"""
     progress_signal = pyqtSignal(int)
     log_signal = pyqtSignal(str)
-    finished_signal = pyqtSignal(str, str)  # ファイル名、テキスト内容
+    finished_signal = pyqtSignal(str, object)  # ファイル名、TranscriptionResult
     error_signal = pyqtSignal(str, str)  # エラーメッセージ、詳細
+    segment_signal = pyqtSignal(str, float, float, str)  # ファイル名、開始秒、終了秒、テキスト
+    daemon_failed_signal = pyqtSignal()  # 常駐プロセスに接続できず、このウィンドウで処理した
 
-    def __init__(self, file_path, language='ja', model_size='base'):
+    def __init__(self, file_path, language='ja', model_size='base', streaming=False, result_cache=None, vad=False,
+                 output_stage=None, precision="fp32", audio_cache=None, prefetcher=None, torch_threads=None,
+                 profiler=None, use_daemon=False):
         super().__init__()
         self.file_path = file_path
         self.language = language
         self.model_size = model_size
-        self.model = None
+        self.streaming = streaming
+        self.result_cache = result_cache
+        self.vad = vad
+        self.output_stage = output_stage
+        self.precision = precision
+        self.audio_cache = audio_cache
+        self.prefetcher = prefetcher
+        self.torch_threads = torch_threads
+        self.profiler = profiler
+        self.use_daemon = use_daemon  # 常駐プロセスのロード済みのモデルで処理する (保存はこのウィンドウで行う)
+        self.cancel_token = CancellationToken()
+        
+    def cancel(self):
+        """処理中の推論をデコーダの次のステップで中断させる (モデルはキャッシュに返却される)"""
+        self.cancel_token.cancel()
         
     def run(self):
         file_name = os.path.basename(self.file_path)
-        logger.info(f"処理開始: {file_name}")
-        self.log_signal.emit(f"処理開始: {file_name}")
-        
+        profile = profile_for(self.profiler, self.file_path)
         try:
-            # モデルが初期化されていない場合は初期化
-            if self.model is None:
-                logger.info(f"Whisperモデル '{self.model_size}' をロード中...")
-                self.log_signal.emit(f"Whisperモデル '{self.model_size}' をロード中...")
-                self.progress_signal.emit(10)
-                # Whisperモジュールのインポート
-                try:
-                    logger.debug("Whisperモジュールをインポート中...")
-                    import whisper
-                    import torch
-                    logger.debug("Whisperモジュールのインポート成功")
-                except ImportError as e:
-                    error_msg = f"必要なライブラリがインストールされていません: {str(e)}"
-                    logger.error(error_msg)
-                    self.log_signal.emit(error_msg)
-                    self.log_signal.emit("以下のコマンドを実行してください: uv pip install openai-whisper torch")
-                    self.error_signal.emit("ライブラリエラー", error_msg)
-                    return
-                
-                # GPUが利用可能であれば使用
-                device = "cuda" if torch.cuda.is_available() else "cpu"
-                logger.info(f"使用デバイス: {device}")
-                self.log_signal.emit(f"使用デバイス: {device}")
-                
-                try:
-                    # モデルのロード
-                    logger.debug(f"モデル {self.model_size} をロード中...")
-                    self.model = whisper.load_model(self.model_size, device=device)
-                    logger.info("モデルロード完了")
-                    self.log_signal.emit("モデルロード完了")
-                    self.progress_signal.emit(30)
-                except Exception as e:
-                    error_msg = f"モデルのロードに失敗しました: {str(e)}"
-                    logger.error(error_msg)
-                    logger.error(traceback.format_exc())
-                    self.log_signal.emit(error_msg)
-                    self.error_signal.emit("モデルロードエラー", traceback.format_exc())
-                    return
-            
-            # 言語設定
-            language_code = self.language if self.language != 'auto' else None
-            logger.debug(f"言語設定: {language_code}")
-            
-            # 音声認識のオプション
-            options = {
-                "language": language_code,  # 言語を指定（Noneの場合は自動検出）
-                "task": "transcribe",       # 文字起こしタスク
-                "verbose": False            # 詳細ログは無効
-            }
-            
-            logger.info(f"音声認識処理中: {file_name}...")
-            self.log_signal.emit(f"音声認識処理中: {file_name}...")
-            self.progress_signal.emit(40)
+            client = _connect_daemon() if self.use_daemon else None
+            if self.use_daemon and client is None:
+                self.log_signal.emit("常駐プロセスに接続できないため、このウィンドウで処理します")
+                self.daemon_failed_signal.emit()
+            if client is not None:
+                # キャッシュは常駐プロセス側のものを使う
+                result = client.transcribe(
+                    self.file_path, _DaemonSignalListener(self), self.cancel_token, language=self.language,
+                    model_size=self.model_size, streaming=self.streaming, vad=self.vad, precision=self.precision,
+                    use_cache=self.result_cache is not None, use_audio_cache=self.audio_cache is not None
+                )
+            else:
+                if self.torch_threads:
+                    # プリフェッチや書き出しのスレッドとコアを取り合わないよう、実行計画のスレッド数に合わせる
+                    set_torch_threads(self.torch_threads)
+                with profile:
+                    result = transcribe_file(
+                        self.file_path, self.language, self.model_size, listener=_SignalListener(self),
+                        streaming=self.streaming, result_cache=self.result_cache, vad=self.vad,
+                        precision=self.precision, cancel_token=self.cancel_token, audio_cache=self.audio_cache,
+                        prefetcher=self.prefetcher
+                    )
+            if self.output_stage is not None:
+                # 保存は書き出しスレッドに任せ、すぐに次のファイルへ進む
+                self.output_stage.submit(self.file_path, result)
+            if not self.cancel_token.cancelled:
+                self.finished_signal.emit(file_name, result)
+        except TranscriptionCancelled:
+            logger.info(f"処理を中断しました: {file_name}")
+        except TranscriptionError as e:
+            self.error_signal.emit(e.title, e.detail)
+        except DaemonError as e:
+            # 処理中に常駐プロセスが終了した場合など
+            logger.error(f"{file_name} - {str(e)}")
+            self.log_signal.emit(str(e))
+            self.error_signal.emit("常駐プロセスエラー", str(e))
+        except Exception as e:
+            error_msg = f"エラー: {file_name} - {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            self.log_signal.emit(error_msg)
+            self.error_signal.emit("一般エラー", traceback.format_exc())
+        finally:
+            if profile.report is not None:
+                self.log_signal.emit(profile.report.format())
+
+
+class ModelPrewarmThread(QThread):
+    """起動直後にtorch/whisperのインポートと選択中のモデルのロードを済ませておくスレッド
+
+    ロードしたモデルはプロセス共有のキャッシュに残り、最初の文字起こしはキャッシュヒットで始まる。
+    use_daemon=True の場合は常駐プロセスを起動 (起動済みなら接続) し、そちらでモデルをロードする。
+    """
+    finished_signal = pyqtSignal(str, float, float)  # モデルサイズ、インポート秒、ロード秒
+    failed_signal = pyqtSignal(str, str)  # モデルサイズ、エラーメッセージ
+
+    def __init__(self, model_cache, model_size, precision="fp32", use_daemon=False):
+        super().__init__()
+        self.model_cache = model_cache
+        self.model_size = model_size
+        self.precision = precision
+        self.use_daemon = use_daemon
+
+    def run(self):
+        try:
+            start = time.perf_counter()
+            client = _connect_daemon() if self.use_daemon else None
+            if client is not None:
+                # 常駐プロセスの起動を待った時間をインポートの時間とする
+                import_seconds = time.perf_counter() - start
+                load_seconds = client.prewarm(self.model_size, self.precision)
+                self.finished_signal.emit(self.model_size, import_seconds, load_seconds)
+                return
+            if self.model_cache.backend == "whisper":
+                import torch  # noqa: F401
+                import whisper  # noqa: F401
+            import_seconds = time.perf_counter() - start
+            load_seconds = self.model_cache.prewarm(self.model_size, precision=self.precision)
+            self.finished_signal.emit(self.model_size, import_seconds, load_seconds)
+        except Exception as e:
+            # 事前ロードに失敗しても、文字起こし開始時に改めてロードしてエラーを表示する
+            logger.warning(f"モデルの事前ロードに失敗しました: {str(e)}")
+            self.failed_signal.emit(self.model_size, str(e))
+
+
+class CalibrationThread(QThread):
+    """合成音声でワーカー数とスレッド数の組み合わせを計測し、実行計画を作るスレッド"""
+    progress_signal = pyqtSignal(int, int, str)  # 計測済みの数、候補の数、説明
+    finished_signal = pyqtSignal(object)  # ExecutionPlan
+    failed_signal = pyqtSignal(str)  # エラーメッセージ
+
+    def __init__(self, model_size, precision="fp32", language="ja"):
+        super().__init__()
+        self.model_size = model_size
+        self.precision = precision
+        self.language = language
+        self.cancel_token = CancellationToken()
+
+    def cancel(self):
+        self.cancel_token.cancel()
+
+    def run(self):
+        try:
+            plan = calibrate(self.model_size, self.precision, self.language, on_progress=self.progress_signal.emit,
+                             cancel_token=self.cancel_token)
+        except TranscriptionCancelled:
+            logger.info("実行計画の計測を中断しました")
+            return
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            self.failed_signal.emit(str(e))
+            return
+        self.finished_signal.emit(plan)
+
+
+class _SignalListener(TranscriptionListener):
+    """文字起こしコアからの通知をスレッドのシグナルに中継する"""
+
+    def __init__(self, thread):
+        self.thread = thread
+        self.file_name = os.path.basename(thread.file_path)
+
+    def log(self, message):
+        self.thread.log_signal.emit(message)
+
+    def progress(self, value):
+        self.thread.progress_signal.emit(value)
+
+    def segment(self, start, end, text):
+        self.thread.segment_signal.emit(self.file_name, start, end, text)
+
+
+class _DaemonSignalListener(_SignalListener):
+    """常駐プロセスから届いた通知をシグナルに中継し、ログメッセージはこのウィンドウのログファイルにも残す"""
+
+    def log(self, message):
+        logger.info(message)
+        super().log(message)
+
+
+class TranscriptionPoolThread(QThread):
+    """ワーカープロセスのプールで複数ファイルを並列に処理し、完了した順に結果を通知するスレッド"""
+    file_progress_signal = pyqtSignal(str, int)  # ファイルパス、進捗
+    log_signal = pyqtSignal(str)
+    file_started_signal = pyqtSignal(str)  # ファイルパス
+    file_finished_signal = pyqtSignal(str, object)  # ファイルパス、TranscriptionResult
+    file_failed_signal = pyqtSignal(str, str)  # ファイルパス、エラーメッセージ
+    error_signal = pyqtSignal(str, str)  # エラーメッセージ、詳細
+    segment_signal = pyqtSignal(str, float, float, str)  # ファイル名、開始秒、終了秒、テキスト
+    batch_finished_signal = pyqtSignal()
+
+    def __init__(self, file_paths, language, model_size, workers, streaming=False, result_cache=None, vad=False,
+                 output_stage=None, precision="fp32", audio_cache=None, split_long=False, threads_per_worker=None,
+                 profiler=None, keep_open=False):
+        super().__init__()
+        self.file_paths = list(file_paths)
+        self.language = language
+        self.model_size = model_size
+        self.workers = workers
+        self.streaming = streaming
+        self.result_cache = result_cache
+        self.vad = vad
+        self.output_stage = output_stage
+        self.precision = precision
+        self.audio_cache = audio_cache
+        self.split_long = split_long
+        self.threads_per_worker = threads_per_worker
+        self.profiler = profiler  # ワーカーの中でプロファイルを取る (分割処理するファイルは対象外)
+        self.cancel_token = CancellationToken()
+        self._started = set()
+        # フォルダの走査中は、見つかったファイルを同じプールに追加できるよう入力を開いておく
+        self._input_lock = threading.Lock()
+        self._new_files = []
+        self._input_closed = not keep_open
+
+    @property
+    def accepting(self):
+        """add_files() でファイルを追加できる (入力が閉じられていない) 場合にTrue"""
+        return not self._input_closed
+
+    def add_files(self, file_paths):
+        """実行中のプールに処理するファイルを追加 (ワーカーとモデルはそのまま使い続ける)"""
+        with self._input_lock:
+            self._new_files.extend(file_paths)
+
+    def close_input(self):
+        """これ以上ファイルを追加しない。追加済みのファイルが終わるとbatch_finished_signalを出す"""
+        self._input_closed = True
+
+    def cancel(self):
+        """未開始のファイルを取り消し、処理中のファイルを中断させて終了する"""
+        self.cancel_token.cancel()
+
+    def _take_new_files(self):
+        with self._input_lock:
+            file_paths, self._new_files = self._new_files, []
+        return file_paths
+
+    def run(self):
+        try:
+            with TranscriptionPool(self.workers, self.threads_per_worker) as pool:
+                self.log_signal.emit(
+                    f"ワーカープール開始: {pool.workers}プロセス × {pool.threads_per_worker}スレッド"
+                )
+                futures = {}
+                pending = set()
+                file_paths = self.file_paths
+                while not self.cancel_token.cancelled:
+                    for file_path in file_paths:
+                        future = self._submit(pool, file_path)
+                        if future is not None:
+                            futures[future] = file_path
+                            pending.add(future)
+                    # 入力を閉じてから取り出した分まで投入し終えていれば、それで最後
+                    closed = self._input_closed
+                    file_paths = self._take_new_files()
+                    if not pending:
+                        if closed and not file_paths:
+                            break
+                        if not file_paths:
+                            # 走査で次のファイルが見つかるのを待つ
+                            time.sleep(0.1)
+                        continue
+                    done, pending = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+                    self._forward_events(pool)
+                    for future in done:
+                        self._emit_result(futures[future], future)
+                if self.cancel_token.cancelled:
+                    # 処理中のワーカーはデコーダの次のステップで中断し、プールの終了を待つ
+                    pool.cancel()
+                    pool.shutdown(cancel_pending=True)
+        except Exception as e:
+            error_msg = f"ワーカープールでエラーが発生しました: {str(e)}"
+            logger.error(error_msg)
+            logger.error(traceback.format_exc())
+            self.log_signal.emit(error_msg)
+            self.error_signal.emit("一般エラー", traceback.format_exc())
+        # エラーで終了した場合も、以降のファイルは新しいプールで処理させる
+        self._input_closed = True
+        if not self.cancel_token.cancelled:
+            self.batch_finished_signal.emit()
+
+    def _submit(self, pool, file_path):
+        """ファイルをワーカーに投入してFutureを返す (キャッシュ済みで投入しなかった場合はNone)"""
+        # 長時間のファイルは分割してチャンクごとにワーカーに振り分ける
+        split = self.split_long and should_split(file_path)
+        cache_key = None
+        if self.result_cache is not None:
+            # キャッシュ済みのファイルはワーカーに送らずにすぐ結果を返す
+            cache_key, cached = self._lookup_cache(file_path, split)
+            if cached is not None:
+                self.log_signal.emit(
+                    f"キャッシュ済みの結果を使用します (推論を省略): {os.path.basename(file_path)}"
+                )
+                self._finish_file(file_path, cached)
+                return None
+        if split:
+            return pool.submit_split(file_path, self.language, self.model_size, self.vad,
+                                     self.precision, self.result_cache, cache_key, self.audio_cache)
+        return pool.submit(file_path, self.language, self.model_size, self.streaming,
+                           self.result_cache, cache_key, self.vad, self.precision,
+                           self.audio_cache, self.profiler)
+
+    def _lookup_cache(self, file_path, split=False):
+        try:
+            # 分割する場合はストリーミング処理を使わない
+            return lookup_cached_transcription(
+                self.result_cache, file_path, self.language, self.model_size, self.streaming and not split,
+                self.vad, precision=self.precision, split=split
+            )
+        except OSError:
+            return None, None
+
+    def _forward_events(self, pool):
+        """ワーカーからのログと進捗をシグナルに中継"""
+        for file_path, kind, value in pool.drain_events():
+            if file_path not in self._started:
+                # ワーカーから最初のイベントが届いた時点で処理中とみなす
+                self._started.add(file_path)
+                self.file_started_signal.emit(file_path)
+            if kind == "log":
+                logger.info(value)
+                self.log_signal.emit(value)
+            elif kind == "progress":
+                # ワーカー側で間引かれているため、そのまま中継する
+                self.file_progress_signal.emit(file_path, value)
+            elif kind == "segment":
+                start, end, text = value
+                self.segment_signal.emit(os.path.basename(file_path), start, end, text)
+
+    def _finish_file(self, file_path, result):
+        """結果を書き出しステージに渡してから完了を通知 (書き出しが追いつかない場合はここで待つ)"""
+        if self.output_stage is not None:
+            self.output_stage.submit(file_path, result)
+        self.file_progress_signal.emit(file_path, 100)
+        self.file_finished_signal.emit(file_path, result)
+
+    def _emit_result(self, file_path, future):
+        file_name = os.path.basename(file_path)
+        try:
+            result = future.result()
+        except TranscriptionCancelled:
+            return
+        except TranscriptionError as e:
+            self.log_signal.emit(f"{e.title}: {file_name} - {e.message}")
+            self.file_failed_signal.emit(file_path, e.message)
+        except Exception as e:
+            error_msg = f"エラー: {file_name} - {str(e)}"
+            logger.error(error_msg)
+            self.log_signal.emit(error_msg)
+            self.file_failed_signal.emit(file_path, str(e))
+        else:
+            self._finish_file(file_path, result)
+
+
+class BatchedTranscriptionThread(QThread):
+    """複数ファイルの30秒ウィンドウをまとめてバッチ推論し、完了したファイルから結果を通知するスレッド"""
+    file_progress_signal = pyqtSignal(str, int)  # ファイルパス、進捗
+    log_signal = pyqtSignal(str)
+    file_started_signal = pyqtSignal(str)  # ファイルパス
+    file_finished_signal = pyqtSignal(str, object)  # ファイルパス、TranscriptionResult
+    file_failed_signal = pyqtSignal(str, str)  # ファイルパス、エラーメッセージ
+    error_signal = pyqtSignal(str, str)  # エラーメッセージ、詳細
+    batch_finished_signal = pyqtSignal()
+
+    def __init__(self, file_paths, language, model_size, batch_size, result_cache=None, output_stage=None,
+                 precision="fp32", audio_cache=None, torch_threads=None, profiler=None):
+        super().__init__()
+        self.file_paths = list(file_paths)
+        self.language = language
+        self.model_size = model_size
+        self.batch_size = batch_size
+        self.result_cache = result_cache
+        self.output_stage = output_stage
+        self.precision = precision
+        self.audio_cache = audio_cache
+        self.torch_threads = torch_threads
+        self.profiler = profiler  # バッチ推論ではファイルごとに分けられないため、バッチ全体を計測する
+        self.cancel_token = CancellationToken()
+
+    def cancel(self):
+        """実行中のバッチをデコーダの次のステップで中断させる (モデルはキャッシュに返却される)"""
+        self.cancel_token.cancel()
+
+    def run(self):
+        try:
+            if self.torch_threads:
+                set_torch_threads(self.torch_threads)
+            transcriber = BatchedTranscriber(self.language, self.model_size, self.batch_size,
+                                             result_cache=self.result_cache, precision=self.precision,
+                                             cancel_token=self.cancel_token, audio_cache=self.audio_cache)
+            cache_keys = {}
+            batch_files = []
+            for file_path in self.file_paths:
+                if self.result_cache is not None:
+                    cache_key, cached = self._lookup_cache(file_path)
+                    if cached is not None:
+                        self.log_signal.emit(
+                            f"キャッシュ済みの結果を使用します (推論を省略): {os.path.basename(file_path)}"
+                        )
+                        self._finish_file(file_path, cached)
+                        continue
+                    cache_keys[file_path] = cache_key
+                self.file_started_signal.emit(file_path)
+                batch_files.append(file_path)
             
+            self.log_signal.emit(f"{len(batch_files)}個のファイルをバッチサイズ{self.batch_size}で推論します")
+            profile = batch_profile_for(self.profiler, batch_files)
             try:
-                # 音声ファイルの存在確認
-                if not os.path.exists(self.file_path):
-                    error_msg = f"ファイルが見つかりません: {self.file_path}"
-                    logger.error(error_msg)
-                    self.log_signal.emit(error_msg)
-                    self.error_signal.emit("ファイルエラー", error_msg)
-                    return
-                
-                # ファイルサイズのログ
-                file_size = os.path.getsize(self.file_path) / (1024 * 1024)  # MB単位
-                logger.debug(f"ファイルサイズ: {file_size:.2f} MB")
-                
-                # 音声認識実行
-                logger.debug(f"Whisperで音声認識を実行中: {self.file_path}")
-                result = self.model.transcribe(self.file_path, **options)
-                logger.debug("音声認識完了")
-                self.progress_signal.emit(90)
-                
-                # 結果の取得
-                logger.debug("音声認識結果を取得中")
-                transcribed_text = result["text"]
-                detected_language = result.get("language", "不明")
-                logger.debug(f"検出された言語: {detected_language}")
-                logger.debug(f"テキスト長: {len(transcribed_text)} 文字")
-                
-                # メタデータを含めた出力テキストの作成
-                output_text = f"# 文字起こし結果: {file_name}\n\n"
-                output_text += f"言語: {detected_language}\n"
-                output_text += f"モデル: {self.model_size}\n\n"
-                output_text += "## テキスト内容\n\n"
-                output_text += transcribed_text
-                
-                logger.info(f"処理完了: {file_name} ({detected_language})")
-                self.log_signal.emit(f"処理完了: {file_name} ({detected_language})")
-                self.progress_signal.emit(100)
-                self.finished_signal.emit(file_name, output_text)
-                
-            except Exception as e:
-                error_msg = f"音声認識処理でエラーが発生しました: {str(e)}"
-                logger.error(error_msg)
-                logger.error(traceback.format_exc())
-                self.log_signal.emit(error_msg)
-                self.error_signal.emit("音声認識エラー", traceback.format_exc())
-            
+                with profile:
+                    for file_path, result, error in transcriber.transcribe(batch_files, cache_keys):
+                        if error is not None:
+                            self.log_signal.emit(f"{error.title}: {os.path.basename(file_path)} - {error.message}")
+                            self.file_failed_signal.emit(file_path, error.message)
+                        else:
+                            self.log_signal.emit(f"処理完了: {os.path.basename(file_path)}")
+                            self._finish_file(file_path, result)
+            finally:
+                if profile.report is not None:
+                    self.log_signal.emit(profile.report.format())
+            self.log_signal.emit(transcriber.format_stats())
+        except TranscriptionCancelled:
+            logger.info("バッチ推論を中断しました")
         except Exception as e:
-            error_msg = f"エラー: {file_name} - {str(e)}"
+            error_msg = f"バッチ推論でエラーが発生しました: {str(e)}"
             logger.error(error_msg)
             logger.error(traceback.format_exc())
             self.log_signal.emit(error_msg)
             self.error_signal.emit("一般エラー", traceback.format_exc())
+        if not self.cancel_token.cancelled:
+            self.batch_finished_signal.emit()
+
+    def _finish_file(self, file_path, result):
+        """結果を書き出しステージに渡してから完了を通知 (書き出しが追いつかない場合はここで待つ)"""
+        if self.output_stage is not None:
+            self.output_stage.submit(file_path, result)
+        self.file_progress_signal.emit(file_path, 100)
+        self.file_finished_signal.emit(file_path, result)
+
+    def _lookup_cache(self, file_path):
+        try:
+            return lookup_cached_transcription(
+                self.result_cache, file_path, self.language, self.model_size, batched=True,
+                precision=self.precision
+            )
+        except OSError:
+            return None, None
 
 
 class MP3TranscriberApp(QMainWindow):
     """MP3文字起こしアプリケーションのメインウィンドウ"""
     
-    def __init__(self):
+    def __init__(self, log_filename=None):
         super().__init__()
+        self.log_filename = log_filename
         self.setWindowTitle("MP3文字起こしアプリ")
         self.setGeometry(100, 100, 800, 600)
-        self.selected_files = []
+        self.batch_files = []  # 今回のバッチで処理するファイル (完了済みを除く)
+        self.journal = None  # 再開用のバッチジャーナル (走査中に開始したバッチの続きでも同じものを使う)
+        self.batch_settings = None  # 最初のバッチの (言語, モデル, ワーカー数, バッチサイズ, バッチ推論の有無)
         self.output_dir = ""
         self.active_threads = []
-        self.transcription_results = {}  # ファイル名:テキスト内容
-        self.whisper_model = None  # Whisperモデルのインスタンス
+        self.pool_thread = None  # 走査中に見つかったファイルも追加するワーカープールのスレッド
+        self.stopping_threads = []  # 中止要求後、終了待ちのスレッド
+        self.output_stage = None  # 結果を保存する書き出しステージ (バッチごとに作成)
+        self.transcription_done = False  # 全ファイルの文字起こしが終わり、保存待ちの状態
+        self.batch_progress = BatchProgress({})  # 音声の長さで重み付けしたバッチ全体の進捗
+        self.transcription_results = {}  # ファイル名:TranscriptionResult
+        self.streaming = False  # ストリーミング処理の有効/無効
+        self.vad = False  # 無音区間スキップの有効/無効
+        self.split_long = False  # 長時間ファイルを分割して並列に処理するか (ワーカー2つ以上の場合のみ)
+        self.precision = "fp32"  # 推論精度 (fp32 / int8)
+        self.model_cache = get_model_cache()  # プロセス共有のWhisperモデルキャッシュ
+        self.result_cache = ResultCache()  # 音声内容をキーとする文字起こし結果キャッシュ
+        self.use_result_cache = True
+        self.audio_cache = AudioCache()  # 音声内容をキーとするデコード済み音声キャッシュ
+        self.use_audio_cache = False
+        self.metrics = MetricsRecorder()  # 段階別の所要時間 (metrics/ にJSON LinesとPrometheus形式で出力)
+        self.profiler = None  # プロファイルを取るファイルの選択 (無効ならNone)
+        self.use_daemon = False  # 常駐プロセスのモデルで処理するか (順次処理の場合のみ)
+        self.prewarm_thread = None  # 選択中のモデルを事前ロードするスレッド
+        self.plan_store = PlanStore()
+        self.execution_plan = None  # 選択中のモデル・精度の計測済みの実行計画
+        self.calibration_thread = None
+        self.scan_thread = None  # フォルダを走査するスレッド
+        self.scan_folder = None  # 走査したフォルダ (ジャーナルのキーに使う。ファイルを選択した場合はNone)
+        self.scanning = False
+        self.scheduled_count = 0  # 選択されたファイルのうちバッチに投入済みの数 (走査中に開始した場合に使う)
+        self.waiting_for_scan = False  # 走査で見つかるファイルを続きのバッチとして待っている状態
+        self.batch_active = False
+        self.prefetcher = None  # 順次処理で次のファイルを先にデコードするプリフェッチ段
         
         logger.info("アプリケーション初期化開始")
         self.init_ui()
+        self.load_execution_plan()
         logger.info("アプリケーション初期化完了")
         
     def init_ui(self):
@@ -204,8 +715,18 @@ class MP3TranscriberApp(QMainWindow):
         self.files_btn.clicked.connect(self.select_files)
         browse_layout.addWidget(self.folder_btn)
         browse_layout.addWidget(self.files_btn)
+        self.scan_label = QLabel("")
+        self.scan_cancel_btn = QPushButton("走査中止")
+        self.scan_cancel_btn.clicked.connect(self.cancel_scan)
+        self.scan_cancel_btn.setEnabled(False)
+        browse_layout.addWidget(self.scan_label)
+        browse_layout.addWidget(self.scan_cancel_btn)
         
-        self.file_list = QListWidget()
+        self.file_model = FileListModel(self)
+        self.file_list = QListView()
+        self.file_list.setModel(self.file_model)
+        self.file_list.setUniformItemSizes(True)  # 行の高さを計算せずに済むため、大量の行でも速い
+        self.file_list.setSelectionMode(QAbstractItemView.ExtendedSelection)  # プロファイルを取るファイルの選択
         
         file_layout.addLayout(browse_layout)
         file_layout.addWidget(QLabel("選択されたファイル:"))
@@ -228,6 +749,45 @@ class MP3TranscriberApp(QMainWindow):
         self.model_combo.setCurrentText("base")  # デフォルトはbaseモデル
         settings_layout.addWidget(self.model_combo, 0, 3)
         
+        settings_layout.addWidget(QLabel("精度:"), 0, 4)
+        self.precision_combo = QComboBox()
+        self.precision_combo.addItems(list(PRECISION_MAP))
+        self.precision_combo.setToolTip(
+            "int8量子化はLinear層の重みをint8に変換してCPUで推論します (初回のみ変換し、cache/modelsに保存)"
+        )
+        settings_layout.addWidget(self.precision_combo, 0, 5)
+        # 選択を変えたらそのモデルを先にロードしておく
+        self.model_combo.currentTextChanged.connect(self.start_prewarm)
+        self.precision_combo.currentTextChanged.connect(self.start_prewarm)
+        # 計測済みの実行計画があればワーカー数に反映する
+        self.model_combo.currentTextChanged.connect(self.load_execution_plan)
+        self.precision_combo.currentTextChanged.connect(self.load_execution_plan)
+        
+        settings_layout.addWidget(QLabel("ワーカー数:"), 0, 6)
+        workers_layout = QHBoxLayout()
+        self.workers_spin = QSpinBox()
+        self.workers_spin.setRange(1, available_cpus())
+        self.workers_spin.setValue(1)  # 1の場合はこのプロセス内で順番に処理
+        self.workers_spin.setToolTip("2以上の場合、ワーカープロセスでCPUコアを分け合って並列に処理します")
+        workers_layout.addWidget(self.workers_spin)
+        self.plan_btn = QPushButton("自動調整")
+        self.plan_btn.setToolTip(
+            "合成音声で計測し、このマシンと選択中のモデルに最も速いワーカー数とスレッド数を選びます "
+            "(結果は cache/plans.json に保存され、次回から使われます)"
+        )
+        self.plan_btn.clicked.connect(self.start_calibration)
+        workers_layout.addWidget(self.plan_btn)
+        settings_layout.addLayout(workers_layout, 0, 7)
+        
+        settings_layout.addWidget(QLabel("バッチサイズ:"), 0, 8)
+        self.batch_size_spin = QSpinBox()
+        self.batch_size_spin.setRange(1, 32)
+        self.batch_size_spin.setValue(1)  # 1の場合はファイルごとに処理
+        self.batch_size_spin.setToolTip(
+            "2以上の場合、複数ファイルの30秒ウィンドウをまとめてバッチ推論します (ワーカー数1のときのみ)"
+        )
+        settings_layout.addWidget(self.batch_size_spin, 0, 9)
+        
         settings_layout.addWidget(QLabel("出力先:"), 1, 0)
         output_layout = QHBoxLayout()
         self.output_path_label = QLabel("デフォルト: カレントディレクトリ")
@@ -235,19 +795,62 @@ class MP3TranscriberApp(QMainWindow):
         self.output_browse_btn.clicked.connect(self.select_output_dir)
         output_layout.addWidget(self.output_path_label)
         output_layout.addWidget(self.output_browse_btn)
-        settings_layout.addLayout(output_layout, 1, 1, 1, 3)
+        settings_layout.addLayout(output_layout, 1, 1, 1, 9)
         
         settings_layout.addWidget(QLabel("出力形式:"), 2, 0)
         self.format_combo = QComboBox()
         self.format_combo.addItems(["テキストファイル (.txt)", "Word文書 (.docx)", "JSONファイル (.json)"])
         settings_layout.addWidget(self.format_combo, 2, 1, 1, 3)
         
+        settings_layout.addWidget(QLabel("処理順:"), 2, 4)
+        self.schedule_combo = QComboBox()
+        self.schedule_combo.addItems(list(SCHEDULE_MAP))
+        self.schedule_combo.setToolTip(
+            "MP3のヘッダーから音声の長さを調べて処理順を決めます。長い順にすると、ワーカー数が2以上の場合に"
+            "最後に長いファイルだけが残らず、全体の処理時間が短くなります (破損しているファイルは処理前に除外します)"
+        )
+        settings_layout.addWidget(self.schedule_combo, 2, 5, 1, 5)
+        
         # デバッグモード
         debug_layout = QHBoxLayout()
         self.debug_checkbox = QCheckBox("デバッグモード")
         self.debug_checkbox.setChecked(True)  # デフォルトでオン
         debug_layout.addWidget(self.debug_checkbox)
-        settings_layout.addLayout(debug_layout, 3, 0, 1, 4)
+        self.streaming_checkbox = QCheckBox("ストリーミング処理 (長時間ファイル向け)")
+        self.streaming_checkbox.setToolTip("音声を30秒ずつデコードして処理し、認識結果を逐次表示します")
+        debug_layout.addWidget(self.streaming_checkbox)
+        self.vad_checkbox = QCheckBox("無音区間をスキップ (VAD)")
+        self.vad_checkbox.setToolTip("音声のエネルギーから発話区間を検出し、無音部分を文字起こしの対象から外します")
+        debug_layout.addWidget(self.vad_checkbox)
+        self.cache_checkbox = QCheckBox("結果キャッシュを使用")
+        self.cache_checkbox.setChecked(True)
+        self.cache_checkbox.setToolTip("内容が変わっていないファイルは前回の結果を使い、文字起こしを省略します")
+        debug_layout.addWidget(self.cache_checkbox)
+        self.audio_cache_checkbox = QCheckBox("デコード済み音声をキャッシュ")
+        self.audio_cache_checkbox.setToolTip(
+            "デコードした音声を cache/audio に保存し、モデルや言語を変えて処理し直す時のデコードを省略します"
+        )
+        debug_layout.addWidget(self.audio_cache_checkbox)
+        self.split_checkbox = QCheckBox("長時間ファイルを分割して並列処理")
+        self.split_checkbox.setToolTip(
+            f"{SPLIT_MIN_SECONDS // 60}分以上のファイルを無音の位置で分割し、複数のワーカーで同時に処理します "
+            "(ワーカー数2以上の場合のみ)"
+        )
+        debug_layout.addWidget(self.split_checkbox)
+        self.profile_checkbox = QCheckBox("プロファイル")
+        self.profile_checkbox.setToolTip(
+            "リストで選択したファイル (未選択ならすべて) をcProfileとtorch.profilerで計測し、"
+            "ログの出力先の profiles フォルダに保存します (処理は遅くなります)"
+        )
+        debug_layout.addWidget(self.profile_checkbox)
+        self.daemon_checkbox = QCheckBox("常駐プロセスで処理")
+        self.daemon_checkbox.setToolTip(
+            "モデルをロードしたまま常駐するプロセスに文字起こしを依頼し、他のウィンドウやスクリプトとモデルを共有します "
+            "(起動していなければ起動します。ワーカー数1・バッチ推論なしの場合のみ)"
+        )
+        self.daemon_checkbox.toggled.connect(self.start_prewarm)
+        debug_layout.addWidget(self.daemon_checkbox)
+        settings_layout.addLayout(debug_layout, 3, 0, 1, 10)
         
         settings_group.setLayout(settings_layout)
         
@@ -269,13 +872,16 @@ class MP3TranscriberApp(QMainWindow):
         
         self.progress_bar = QProgressBar()
         self.progress_bar.setValue(0)
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setValue(0)
         
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
+        self.log_text = LogView()
         
         process_layout.addLayout(button_layout)
-        process_layout.addWidget(QLabel("進捗状況:"))
+        process_layout.addWidget(QLabel("進捗状況 (現在のファイル):"))
         process_layout.addWidget(self.progress_bar)
+        process_layout.addWidget(QLabel("バッチ全体:"))
+        process_layout.addWidget(self.batch_progress_bar)
         process_layout.addWidget(QLabel("ログ:"))
         process_layout.addWidget(self.log_text)
         
@@ -292,39 +898,162 @@ class MP3TranscriberApp(QMainWindow):
         self.setCentralWidget(central_widget)
         
         # 初期ログメッセージ
-        self.log_text.append(f"MP3文字起こしアプリを起動しました。ログファイル: {log_filename}")
+        self.log_text.append(f"MP3文字起こしアプリを起動しました。ログファイル: {self.log_filename}")
         self.log_text.append("フォルダまたはファイルを選択してください。")
         logger.debug("UI初期化完了")
 
+    def load_execution_plan(self):
+        """選択中のモデル・精度の保存済みの実行計画を読み込み、ワーカー数に反映する"""
+        model_size = self.model_combo.currentText()
+        precision = PRECISION_MAP[self.precision_combo.currentText()]
+        self.execution_plan = self.plan_store.load(model_size, precision)
+        if self.execution_plan is not None:
+            self.workers_spin.setValue(self.execution_plan.workers)
+            self.log_text.append(f"保存済みの実行計画を適用しました: {self.execution_plan.describe()}")
+    
+    def planned_threads(self, workers):
+        """実行計画と同じワーカー数なら計画のスレッド数、それ以外はコアを均等に分けたスレッド数"""
+        plan = self.execution_plan
+        if plan is not None and plan.workers == workers:
+            return plan.threads_per_worker
+        return default_threads_per_worker(workers)
+    
+    def start_calibration(self):
+        """選択中のモデル・精度で実行計画の計測を開始 (処理中は何もしない)"""
+        if self.active_threads or (self.calibration_thread is not None and self.calibration_thread.isRunning()):
+            self.log_text.append("文字起こしまたは計測の実行中は自動調整できません。")
+            return
+        model_size = self.model_combo.currentText()
+        precision = PRECISION_MAP[self.precision_combo.currentText()]
+        language = LANGUAGE_MAP[self.language_combo.currentText()]
+        self.log_text.append(f"実行計画を計測しています ({model_size}, {self.precision_combo.currentText()})...")
+        self.plan_btn.setEnabled(False)
+        thread = CalibrationThread(model_size, precision, language)
+        thread.progress_signal.connect(
+            lambda done, total, description: self.log_text.append(f"計測 {done}/{total}: {description}")
+        )
+        thread.finished_signal.connect(self.handle_calibration_finished)
+        thread.failed_signal.connect(
+            lambda message: self.log_text.append(f"実行計画の計測に失敗しました: {message}")
+        )
+        thread.finished.connect(lambda: self.plan_btn.setEnabled(True))
+        self.calibration_thread = thread
+        thread.start()
+    
+    def handle_calibration_finished(self, plan):
+        try:
+            self.plan_store.save(plan)
+        except OSError as e:
+            logger.warning(f"実行計画を保存できませんでした: {str(e)}")
+        self.log_text.append(f"実行計画: {plan.describe()}")
+        # 計測中に選択が変わっていれば、保存だけして今の選択には適用しない
+        if (plan.model_size == self.model_combo.currentText()
+                and plan.precision == PRECISION_MAP[self.precision_combo.currentText()]):
+            self.execution_plan = plan
+            self.workers_spin.setValue(plan.workers)
+    
+    def start_prewarm(self):
+        """選択中のモデルをバックグラウンドで事前ロード (処理中や事前ロード中は何もしない)"""
+        if self.active_threads or (self.prewarm_thread is not None and self.prewarm_thread.isRunning()):
+            return
+        model_size = self.model_combo.currentText()
+        precision = PRECISION_MAP[self.precision_combo.currentText()]
+        thread = ModelPrewarmThread(self.model_cache, model_size, precision, self.daemon_checkbox.isChecked())
+        thread.finished_signal.connect(self.handle_prewarm_finished)
+        thread.failed_signal.connect(
+            lambda model_size, message: self.log_text.append(f"モデル {model_size} の事前ロードに失敗しました: {message}")
+        )
+        self.prewarm_thread = thread
+        thread.start()
+        logger.debug(f"モデルの事前ロードを開始: {model_size} ({precision})")
+    
+    def handle_prewarm_finished(self, model_size, import_seconds, load_seconds):
+        logger.info(f"事前ロード完了: {model_size} (インポート {import_seconds:.2f}秒, ロード {load_seconds:.2f}秒)")
+        if load_seconds:
+            self.log_text.append(f"モデル {model_size} を事前にロードしました ({import_seconds + load_seconds:.1f}秒)")
+        # 事前ロード中に選択が変わっていれば、そのモデルもロードする
+        if (model_size != self.model_combo.currentText()
+                or self.prewarm_thread.precision != PRECISION_MAP[self.precision_combo.currentText()]
+                or self.prewarm_thread.use_daemon != self.daemon_checkbox.isChecked()):
+            self.start_prewarm()
+    
+    @property
+    def selected_files(self):
+        return self.file_model.paths
+    
     def select_folder(self):
-        """フォルダを選択し、MP3ファイルを検索"""
+        """フォルダを選択し、MP3ファイルをバックグラウンドで走査"""
         logger.debug("フォルダ選択ダイアログを開始")
         folder_path = QFileDialog.getExistingDirectory(self, "フォルダ選択", "")
         if folder_path:
             logger.info(f"選択されたフォルダ: {folder_path}")
-            self.file_list.clear()
-            self.selected_files = []
+            self.stop_scan()
+            self.file_model.set_paths([])
+            self.scan_folder = folder_path
+            self.start_btn.setEnabled(False)
             
-            try:
-                for root, _, files in os.walk(folder_path):
-                    for file in files:
-                        if file.lower().endswith('.mp3'):
-                            file_path = os.path.join(root, file)
-                            self.selected_files.append(file_path)
-                            self.file_list.addItem(file)
-                
-                if self.selected_files:
-                    self.start_btn.setEnabled(True)
-                    logger.info(f"{len(self.selected_files)}個のMP3ファイルが見つかりました")
-                    self.log_text.append(f"{len(self.selected_files)}個のMP3ファイルが見つかりました。")
-                else:
-                    self.start_btn.setEnabled(False)
-                    logger.warning(f"選択されたフォルダ内にMP3ファイルが見つかりませんでした: {folder_path}")
-                    self.log_text.append("MP3ファイルが見つかりませんでした。")
-            except Exception as e:
-                logger.error(f"フォルダ走査中にエラーが発生しました: {str(e)}")
-                logger.error(traceback.format_exc())
-                self.log_text.append(f"エラー: フォルダの走査に失敗しました - {str(e)}")
+            # 見つかったファイルから一覧に追加し、走査中でも文字起こしを開始できる
+            scanner = FolderScanThread(folder_path)
+            scanner.files_found_signal.connect(lambda paths: self.handle_files_found(scanner, paths))
+            scanner.scan_finished_signal.connect(
+                lambda count, cancelled, seconds: self.handle_scan_finished(scanner, folder_path, count,
+                                                                            cancelled, seconds)
+            )
+            scanner.error_signal.connect(
+                lambda message: self.log_text.append(f"エラー: フォルダの走査に失敗しました - {message}")
+            )
+            self.scan_thread = scanner
+            self.scanning = True
+            self.scan_label.setText("走査中: 0件")
+            self.scan_cancel_btn.setEnabled(True)
+            scanner.start()
+    
+    def stop_scan(self):
+        """実行中の走査を中止 (以降に届く結果は無視する)"""
+        thread = self.scan_thread
+        if thread is not None and thread.isRunning():
+            thread.cancel()
+            # 終了するまで参照を保持する
+            self.stopping_threads.append(thread)
+            thread.finished.connect(lambda thread=thread: self.stopping_threads.remove(thread))
+        self.scan_thread = None
+        self.scanning = False
+        self.scan_cancel_btn.setEnabled(False)
+    
+    def cancel_scan(self):
+        """走査を中止し、それまでに見つかったファイルだけを対象にする"""
+        if self.scanning:
+            logger.info("フォルダ走査の中止リクエスト")
+            self.scan_thread.cancel()
+            self.scan_cancel_btn.setEnabled(False)
+    
+    def handle_files_found(self, scanner, paths):
+        """走査で見つかったファイルを一覧に追加"""
+        if scanner is not self.scan_thread:
+            return
+        self.file_model.append_paths(paths)
+        self.scan_label.setText(f"走査中: {len(self.selected_files)}件")
+        if not self.batch_active:
+            self.start_btn.setEnabled(True)
+        if self.waiting_for_scan:
+            self.continue_scanned_batch()
+    
+    def handle_scan_finished(self, scanner, folder_path, count, cancelled, seconds):
+        """走査の完了 (または中止) 時の処理"""
+        if scanner is not self.scan_thread:
+            return
+        self.scanning = False
+        self.scan_cancel_btn.setEnabled(False)
+        state = "走査中止" if cancelled else "走査完了"
+        self.scan_label.setText(f"{count}件 ({state}, {seconds:.1f}秒)")
+        if count:
+            logger.info(f"{count}個のMP3ファイルが見つかりました ({state}, {seconds:.1f}秒)")
+            self.log_text.append(f"{count}個のMP3ファイルが見つかりました。")
+        else:
+            logger.warning(f"選択されたフォルダ内にMP3ファイルが見つかりませんでした: {folder_path}")
+            self.log_text.append("MP3ファイルが見つかりませんでした。")
+        if self.waiting_for_scan:
+            self.continue_scanned_batch()
     
     def select_files(self):
         """複数のMP3ファイルを選択"""
@@ -332,12 +1061,12 @@ class MP3TranscriberApp(QMainWindow):
         files, _ = QFileDialog.getOpenFileNames(self, "MP3ファイル選択", "", "MP3 Files (*.mp3)")
         if files:
             logger.info(f"{len(files)}個のファイルが選択されました")
-            self.file_list.clear()
-            self.selected_files = files
-            
+            self.stop_scan()
+            self.scan_folder = None
+            self.scan_label.setText("")
             for file in files:
                 logger.debug(f"選択されたファイル: {file}")
-                self.file_list.addItem(os.path.basename(file))
+            self.file_model.set_paths(files)
             
             self.start_btn.setEnabled(True)
             self.log_text.append(f"{len(files)}個のファイルが選択されました。")
@@ -358,15 +1087,36 @@ class MP3TranscriberApp(QMainWindow):
             logger.warning("ファイルが選択されていません")
             self.log_text.append("ファイルが選択されていません。")
             return
+        if self.calibration_thread is not None and self.calibration_thread.isRunning():
+            # 計測中はコアを使い切っているため、計測結果が狂わないよう待ってもらう
+            self.log_text.append("実行計画の計測中です。終わってから開始してください。")
+            return
+        self.scheduled_count = 0
+        self.journal = None
+        self.pool_thread = None
+        self.start_batch()
+    
+    def start_batch(self):
+        """選択されたファイルのうち未投入の分を1バッチとして処理を開始
+
+        フォルダの走査中に開始した場合はその時点で見つかっているファイルまでを処理し、
+        残りは走査で見つかり次第、続きのバッチとして処理する。
+        """
+        files = self.selected_files[self.scheduled_count:]
+        self.scheduled_count = len(self.selected_files)
+        self.batch_active = True
+        self.waiting_for_scan = False
+        if self.journal is not None:
+            # 続きのバッチは最初のバッチのジャーナル・設定・ワーカープールで処理する
+            self.continue_batch(files)
+            return
         
         # 既存のスレッドをクリア
-        for thread in self.active_threads:
-            if thread.isRunning():
-                thread.terminate()
-        
-        self.active_threads = []
+        self.stop_active_threads()
+        self.stop_prefetch()
         self.transcription_results = {}
         self.progress_bar.setValue(0)
+        self.batch_progress_bar.setValue(0)
         
         # UI状態の更新
         self.start_btn.setEnabled(False)
@@ -375,14 +1125,7 @@ class MP3TranscriberApp(QMainWindow):
         self.files_btn.setEnabled(False)
         
         # 言語設定の取得
-        language_map = {
-            "日本語": "ja", 
-            "英語": "en", 
-            "中国語": "zh", 
-            "韓国語": "ko", 
-            "自動検出": "auto"
-        }
-        selected_language = language_map[self.language_combo.currentText()]
+        selected_language = LANGUAGE_MAP[self.language_combo.currentText()]
         
         # モデルサイズの取得
         model_size = self.model_combo.currentText()
@@ -405,18 +1148,177 @@ class MP3TranscriberApp(QMainWindow):
         self.log_text.append(f"出力形式: {self.format_combo.currentText()}")
         self.log_text.append(f"デバッグモード: {'有効' if debug_mode else '無効'}")
         
-        # 最初のファイルの処理を開始
-        self.start_next_file(0, selected_language, model_size)
+        workers = self.workers_spin.value()
+        self.streaming = self.streaming_checkbox.isChecked()
+        self.vad = self.vad_checkbox.isChecked()
+        self.split_long = self.split_checkbox.isChecked() and workers > 1
+        self.profiler = self.create_profiler()
+        self.use_daemon = self.daemon_checkbox.isChecked()
+        self.precision = PRECISION_MAP[self.precision_combo.currentText()]
+        self.use_result_cache = self.cache_checkbox.isChecked()
+        self.result_cache.reset_stats()
+        self.use_audio_cache = self.audio_cache_checkbox.isChecked()
+        self.audio_cache.reset_stats()
+        batch_size = self.batch_size_spin.value()
+        batched = batch_size > 1 and not (self.streaming or self.vad)
+        if self.use_daemon and (workers > 1 or batched or self.profiler is not None):
+            # 常駐プロセスは1ファイルずつ処理するため、並列処理・バッチ推論・プロファイルはこのウィンドウで行う
+            self.use_daemon = False
+        self.batch_settings = (selected_language, model_size, workers, batch_size, batched)
+        
+        # 同じファイル・設定の中断されたバッチがあれば続きから再開
+        has_files = self.open_batch_journal(selected_language, model_size, files)
+        self.start_output_stage()
+        self.batch_progress = BatchProgress({})
+        if not has_files:
+            self.finish_batch()
+            return
+        durations = self.schedule_batch()
+        if not self.batch_files:
+            self.finish_batch()
+            return
+        self.batch_progress.extend(durations)
+        logger.info(f"ワーカー数: {workers}")
+        self.log_text.append(f"ワーカー数: {workers}")
+        self.log_text.append(f"ストリーミング処理: {'有効' if self.streaming else '無効'}")
+        self.log_text.append(f"無音区間スキップ: {'有効' if self.vad else '無効'}")
+        if self.split_long:
+            self.log_text.append("長時間ファイルの分割処理: 有効")
+        self.log_text.append(f"推論精度: {self.precision_combo.currentText()}")
+        if self.use_daemon:
+            self.log_text.append("常駐プロセスのモデルで処理します")
+        self.dispatch_batch()
+    
+    def continue_batch(self, files):
+        """走査で新たに見つかったファイルを、最初のバッチと同じジャーナル・設定で処理する (再開の確認はしない)"""
+        self.batch_files = self.journal.pending_files(files)
+        done_count = len(files) - len(self.batch_files)
+        if done_count:
+            logger.info(f"前回完了済みの{done_count}ファイルをスキップします (ジャーナル: {self.journal.path})")
+            self.log_text.append(f"前回完了済みの{done_count}ファイルをスキップします。")
+        for file_path in self.batch_files:
+            self.journal.record(file_path, QUEUED)
+        durations = self.schedule_batch()
+        if not self.batch_files:
+            self.finish_batch()
+            return
+        self.batch_progress.extend(durations)
+        self.transcription_done = False
+        self.dispatch_batch()
+    
+    def dispatch_batch(self):
+        """batch_files の処理を最初のバッチで決めた方法で開始"""
+        selected_language, model_size, workers, batch_size, batched = self.batch_settings
+        if workers > 1:
+            # ワーカープールで並列に処理 (走査中はプールを終了せず、見つかったファイルを追加していく)
+            if self.pool_thread is not None and self.pool_thread.accepting:
+                self.log_text.append(f"{len(self.batch_files)}個のファイルをワーカープールに追加します...")
+                self.pool_thread.add_files(self.batch_files)
+            else:
+                self.start_pool_transcription(selected_language, model_size, workers)
+            if self.scanning:
+                self.waiting_for_scan = True
+            else:
+                self.pool_thread.close_input()
+        elif batched:
+            # 複数ファイルのウィンドウをまとめてバッチ推論
+            self.start_batched_transcription(selected_language, model_size, batch_size)
+        else:
+            if not self.streaming and not self.use_daemon and self.model_cache.backend == "whisper":
+                # 推論中に次のファイルをデコードしておく (スタブバックエンドは音声をデコードしないため不要)
+                self.start_prefetch(selected_language, model_size)
+            # 最初のファイルの処理を開始
+            self.start_next_file(0, selected_language, model_size)
+    
+    def open_batch_journal(self, language, model_size, files):
+        """バッチジャーナルを開いて処理対象のファイルを決める (処理するファイルがなければFalse)"""
+        settings = {
+            "language": language,
+            "model_size": model_size,
+            "format": FORMAT_MAP[self.format_combo.currentText()],
+            "output_dir": os.path.abspath(self.output_dir or "."),
+            "streaming": self.streaming,
+            "vad": self.vad,
+            "precision": self.precision,
+        }
+        if self.scan_folder is not None:
+            # 走査中に開始しても続きのファイルを同じジャーナルに記録できるよう、フォルダをキーにする
+            self.journal = BatchJournal.open_for_folder(self.scan_folder, settings)
+        else:
+            self.journal = BatchJournal.open_for(files, settings)
+        self.batch_files = self.journal.pending_files(files)
+        
+        done_count = len(files) - len(self.batch_files)
+        counts = self.journal.summary()
+        if self.scanning:
+            # まだ見つかっていないファイルの完了分も含めて確認する
+            done_count = max(done_count, counts[DONE])
+        if done_count:
+            failed = f"(失敗した{counts[FAILED]}ファイルは処理し直します)\n" if counts[FAILED] else ""
+            answer = QMessageBox.question(
+                self, "処理の再開",
+                f"前回中断したバッチの{done_count}ファイルが完了済みです。\n{failed}続きから再開しますか？\n"
+                "(「いいえ」を選ぶとすべてのファイルを最初から処理します)",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.Yes
+            )
+            if answer == QMessageBox.Yes:
+                logger.info(f"前回完了済みの{done_count}ファイルをスキップします (ジャーナル: {self.journal.path})")
+                self.log_text.append(f"前回完了済みの{done_count}ファイルをスキップして再開します。")
+            else:
+                self.journal.reset()
+                self.batch_files = list(files)
+        
+        if not self.batch_files:
+            self.log_text.append("すべてのファイルが処理済みです。")
+            return False
+        for file_path in self.batch_files:
+            self.journal.record(file_path, QUEUED)
+        return True
+    
+    def schedule_batch(self):
+        """処理順を決めて破損しているファイルを除外し、ファイルごとの長さの目安 (秒) を返す"""
+        policy = SCHEDULE_MAP[self.schedule_combo.currentText()]
+        self.batch_files, durations, rejected = schedule_files(self.batch_files, policy)
+        for file_path, reason in rejected.items():
+            logger.error(f"処理対象から除外しました: {file_path} - {reason}")
+            self.log_text.append(f"処理対象から除外しました: {os.path.basename(file_path)} - {reason}")
+            self.record_file_failed(file_path, reason)
+        if self.batch_files:
+            summary = format_schedule(self.batch_files, durations, policy)
+            logger.info(summary)
+            self.log_text.append(summary)
+        return durations
+    
+    def start_output_stage(self):
+        """今回のバッチの書き出しステージを作成"""
+        if self.output_stage is not None:
+            self.output_stage.shutdown()
+        self.transcription_done = False
+        stage = OutputWriterStage(self.output_dir, FORMAT_MAP[self.format_combo.currentText()], self.metrics)
+        # 中止後に新しいバッチを始めても、前のバッチの保存結果は前のジャーナルに記録する
+        journal = self.journal
+        stage.saved_signal.connect(
+            lambda file_path, saved_path: self.handle_output_saved(stage, journal, file_path, saved_path)
+        )
+        stage.failed_signal.connect(
+            lambda file_path, message: self.handle_output_failed(journal, file_path, message)
+        )
+        self.output_stage = stage
     
     def cancel_transcription(self):
         """処理中の文字起こしをキャンセル"""
         logger.info("処理中止リクエスト")
-        for thread in self.active_threads:
-            if thread.isRunning():
-                thread.terminate()
+        self.stop_active_threads()
+        self.stop_prefetch()
+        self.transcription_done = False
+        self.waiting_for_scan = False
+        self.batch_active = False
+        self.pool_thread = None
         
         logger.info("処理を中止しました")
         self.log_text.append("処理を中止しました。")
+        if self.journal is not None:
+            self.log_text.append("同じファイル・設定で再度開始すると、未完了のファイルから再開できます。")
         
         # UI状態の更新
         self.start_btn.setEnabled(True)
@@ -424,23 +1326,53 @@ class MP3TranscriberApp(QMainWindow):
         self.folder_btn.setEnabled(True)
         self.files_btn.setEnabled(True)
     
+    def stop_active_threads(self):
+        """実行中のスレッドに中断を要求する
+
+        スレッドは推論の区切りで自ら終了し、借りたモデルをキャッシュに返却するため、
+        終了するまで参照を保持する。
+        """
+        for thread in self.active_threads:
+            if not thread.isRunning():
+                continue
+            thread.cancel()
+            self.stopping_threads.append(thread)
+            thread.finished.connect(
+                lambda thread=thread, requested=time.perf_counter(): self.handle_thread_stopped(thread, requested)
+            )
+        self.active_threads = []
+    
+    def handle_thread_stopped(self, thread, requested):
+        """中断を要求したスレッドの終了を記録"""
+        self.stopping_threads.remove(thread)
+        latency = time.perf_counter() - requested
+        logger.info(f"スレッドの中断が完了しました ({latency:.2f}秒)")
+        self.log_text.append(f"処理の中断が完了しました ({latency:.2f}秒)")
+    
     def start_next_file(self, index, language, model_size):
         """次のファイルの処理を開始"""
-        if index < len(self.selected_files):
-            file_path = self.selected_files[index]
+        if index < len(self.batch_files):
+            file_path = self.batch_files[index]
             file_name = os.path.basename(file_path)
             
-            logger.info(f"{index+1}/{len(self.selected_files)}: {file_name} の処理を開始します")
-            self.log_text.append(f"{index+1}/{len(self.selected_files)}: {file_name} の処理を開始します...")
+            logger.info(f"{index+1}/{len(self.batch_files)}: {file_name} の処理を開始します")
+            self.log_text.append(f"{index+1}/{len(self.batch_files)}: {file_name} の処理を開始します...")
+            self.journal.record(file_path, RUNNING)
             
             # WhisperTranscriptionThread を使用
-            thread = WhisperTranscriptionThread(file_path, language, model_size)
-            thread.progress_signal.connect(self.update_progress)
+            thread = WhisperTranscriptionThread(file_path, language, model_size, self.streaming,
+                                                self.active_result_cache(), self.vad, self.output_stage,
+                                                self.precision, self.active_audio_cache(), self.prefetcher,
+                                                self.planned_threads(1), self.profiler, self.use_daemon)
+            thread.daemon_failed_signal.connect(self.handle_daemon_failed)
+            thread.progress_signal.connect(lambda value: self.update_progress(file_path, value))
             thread.log_signal.connect(self.update_log)
             thread.error_signal.connect(self.handle_error)
+            thread.error_signal.connect(lambda title, message: self.record_file_failed(file_path, title))
+            thread.segment_signal.connect(self.handle_segment)
             thread.finished_signal.connect(
-                lambda file_name, text: self.handle_transcription_finished(
-                    file_name, text, index, language, model_size
+                lambda file_name, result: self.handle_transcription_finished(
+                    file_name, result, index, language, model_size
                 )
             )
             
@@ -458,153 +1390,244 @@ class MP3TranscriberApp(QMainWindow):
             self.folder_btn.setEnabled(True)
             self.files_btn.setEnabled(True)
     
-    def update_progress(self, value):
-        """進捗バーを更新"""
+    def handle_daemon_failed(self):
+        """常駐プロセスに接続できなかった場合、このバッチの残りのファイルはこのウィンドウで処理する"""
+        self.use_daemon = False
+    
+    def start_prefetch(self, language, model_size):
+        """順次処理するファイルを先にデコードするプリフェッチ段を開始"""
+        result_cache = self.active_result_cache()
+        audio_cache = self.active_audio_cache()
+        # 結果キャッシュ済みのファイルは推論しないためデコードも不要
+        skip = cached_result_skipper(result_cache, language, model_size, self.streaming, self.vad,
+                                     precision=self.precision)
+        self.prefetcher = AudioPrefetcher(self.batch_files, audio_cache.load if audio_cache else None, skip=skip)
+    
+    def stop_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.close()
+            self.prefetcher = None
+    
+    def active_result_cache(self):
+        """結果キャッシュが有効な場合はキャッシュを返す"""
+        return self.result_cache if self.use_result_cache else None
+    
+    def active_audio_cache(self):
+        """デコード済み音声キャッシュが有効な場合はキャッシュを返す"""
+        return self.audio_cache if self.use_audio_cache else None
+    
+    def create_profiler(self):
+        """プロファイルが有効な場合、リストで選択したファイル (未選択ならすべて) を選ぶ ProfileSelector を返す"""
+        if not self.profile_checkbox.isChecked():
+            return None
+        paths = self.file_model.paths
+        selected = [paths[index.row()] for index in self.file_list.selectionModel().selectedIndexes()]
+        profiler = ProfileSelector(default_profile_dir(os.path.dirname(self.log_filename or "") or "logs"),
+                                   files=selected)
+        target = f"選択した{len(selected)}ファイル" if selected else "すべてのファイル"
+        self.log_text.append(f"プロファイルを取ります: {target} (出力先: {profiler.directory})")
+        return profiler
+    
+    def report_model_cache_stats(self):
+        """モデルキャッシュ・結果キャッシュ・音声キャッシュの統計をログに出力"""
+        summary = self.model_cache.format_stats()
+        if self.use_result_cache:
+            summary += "\n" + self.result_cache.format_stats()
+        if self.use_audio_cache:
+            # ワーカープロセスでの利用分は各ファイルのログにのみ出る
+            summary += "\n" + self.audio_cache.format_stats()
+        logger.info(summary)
+        self.log_text.append(summary)
+    
+    def report_metrics(self):
+        """段階別の所要時間をログに出力し、Prometheus形式のファイルを最新の値で書き直す"""
+        self.metrics.flush()
+        summary = self.metrics.format_summary()
+        logger.info(summary)
+        self.log_text.append(summary)
+    
+    def start_pool_transcription(self, language, model_size, workers):
+        """ワーカープールで全ファイルの処理を開始"""
+        logger.info(f"{len(self.batch_files)}個のファイルを{workers}ワーカーで処理します")
+        self.log_text.append(f"{len(self.batch_files)}個のファイルを{workers}ワーカーで処理します...")
+        
+        thread = TranscriptionPoolThread(self.batch_files, language, model_size, workers, self.streaming,
+                                         self.active_result_cache(), self.vad, self.output_stage,
+                                         self.precision, self.active_audio_cache(), self.split_long,
+                                         self.planned_threads(workers), self.profiler, keep_open=self.scanning)
+        thread.file_progress_signal.connect(self.update_progress)
+        thread.log_signal.connect(self.update_log)
+        thread.error_signal.connect(self.handle_error)
+        thread.segment_signal.connect(self.handle_segment)
+        thread.file_started_signal.connect(lambda file_path: self.journal.record(file_path, RUNNING))
+        thread.file_finished_signal.connect(self.handle_pool_file_finished)
+        thread.file_failed_signal.connect(self.record_file_failed)
+        thread.file_failed_signal.connect(lambda file_path, message: self.update_progress(file_path, 100))
+        thread.batch_finished_signal.connect(self.handle_transcription_done)
+        
+        self.active_threads.append(thread)
+        self.pool_thread = thread
+        thread.start()
+    
+    def start_batched_transcription(self, language, model_size, batch_size):
+        """バッチ推論で全ファイルの処理を開始"""
+        logger.info(f"バッチ推論を使用します (バッチサイズ: {batch_size})")
+        self.log_text.append(f"バッチ推論を使用します (バッチサイズ: {batch_size})")
+        
+        thread = BatchedTranscriptionThread(self.batch_files, language, model_size, batch_size,
+                                            self.active_result_cache(), self.output_stage, self.precision,
+                                            self.active_audio_cache(), self.planned_threads(1), self.profiler)
+        thread.file_progress_signal.connect(self.update_progress)
+        thread.log_signal.connect(self.update_log)
+        thread.error_signal.connect(self.handle_error)
+        thread.file_started_signal.connect(lambda file_path: self.journal.record(file_path, RUNNING))
+        thread.file_finished_signal.connect(self.handle_pool_file_finished)
+        thread.file_failed_signal.connect(self.record_file_failed)
+        thread.file_failed_signal.connect(lambda file_path, message: self.update_progress(file_path, 100))
+        thread.batch_finished_signal.connect(self.handle_transcription_done)
+        
+        self.active_threads.append(thread)
+        thread.start()
+    
+    def record_file_failed(self, file_path, error):
+        """失敗したファイルをジャーナルと計測値に記録"""
+        self.journal.record(file_path, FAILED, error=error)
+        self.metrics.record_failure(file_path, error)
+    
+    def update_progress(self, file_path, value):
+        """ファイルの進捗と、音声の長さで重み付けしたバッチ全体の進捗を更新"""
         self.progress_bar.setValue(value)
+        self.batch_progress_bar.setValue(self.batch_progress.update(file_path, value))
     
     def update_log(self, message):
-        """ログを更新"""
+        """ログを更新 (画面への反映はまとめて行う)"""
         self.log_text.append(message)
-        # 自動スクロール
-        self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
+    
+    def handle_segment(self, file_name, start, end, text):
+        """ストリーミング処理で確定したセグメントを表示"""
+        self.update_log(f"[{file_name} {format_timestamp(start)} - {format_timestamp(end)}] {text.strip()}")
     
     def handle_error(self, title, message):
         """エラーメッセージを表示"""
         logger.error(f"エラー: {title} - {message}")
         QMessageBox.critical(self, f"エラー: {title}", message)
     
-    def handle_transcription_finished(self, file_name, text, current_index, language, model_size):
-        """文字起こし完了時の処理"""
+    def handle_transcription_finished(self, file_name, result, current_index, language, model_size):
+        """文字起こし完了時の処理 (保存は書き出しステージで行われる)"""
         logger.debug(f"文字起こし完了: {file_name}")
-        
-        # 結果を保存
-        self.transcription_results[file_name] = text
-        
-        # 出力形式に基づいたファイル保存
-        format_map = {
-            "テキストファイル (.txt)": ".txt",
-            "Word文書 (.docx)": ".docx",
-            "JSONファイル (.json)": ".json"
-        }
-        
-        selected_format = format_map[self.format_combo.currentText()]
-        base_name = os.path.splitext(file_name)[0]
-        
-        if self.output_dir:
-            output_path = os.path.join(self.output_dir, f"{base_name}{selected_format}")
-        else:
-            output_path = f"{base_name}{selected_format}"
-        
-        logger.debug(f"保存先: {output_path}")
-        
-        try:
-            if selected_format == ".txt":
-                # テキストファイルとして保存
-                logger.debug(f"テキストファイルを保存中: {output_path}")
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(text)
-                logger.debug("テキストファイル保存完了")
-            elif selected_format == ".docx":
-                # Word文書として保存 (python-docxライブラリが必要)
-                try:
-                    logger.debug("Word文書として保存中")
-                    from docx import Document
-                    document = Document()
-                    document.add_heading(f'文字起こし結果: {file_name}', 0)
-                    
-                    # テキストの処理 (メタデータとコンテンツを分離)
-                    lines = text.split('\n')
-                    metadata_end = 0
-                    for i, line in enumerate(lines):
-                        if line.startswith('## テキスト内容'):
-                            metadata_end = i
-                            break
-                    
-                    # メタデータ
-                    for i in range(1, metadata_end):
-                        if lines[i].strip():
-                            key, value = lines[i].split(':', 1)
-                            document.add_paragraph(f"{key}: {value.strip()}")
-                    
-                    # 本文テキスト
-                    document.add_heading('テキスト内容', level=1)
-                    document.add_paragraph(
-                        '\n'.join(lines[metadata_end+1:])
-                    )
-                    
-                    document.save(output_path)
-                    logger.debug("Word文書保存完了")
-                except ImportError as e:
-                    logger.warning(f"python-docxライブラリがインストールされていません: {str(e)}")
-                    self.log_text.append("エラー: python-docxライブラリがインストールされていません。テキスト形式で保存します。")
-                    with open(output_path.replace('.docx', '.txt'), 'w', encoding='utf-8') as f:
-                        f.write(text)
-            elif selected_format == ".json":
-                # JSON形式で保存
-                logger.debug("JSONファイルとして保存中")
-                import json
-                
-                # メタデータとテキスト内容を分離
-                metadata = {}
-                content = ""
-                in_content = False
-                
-                for line in text.split('\n'):
-                    if line.startswith('## テキスト内容'):
-                        in_content = True
-                        continue
-                    
-                    if not in_content and ':' in line:
-                        key, value = line.split(':', 1)
-                        metadata[key.strip()] = value.strip()
-                    elif in_content:
-                        content += line + '\n'
-                
-                json_data = {
-                    "filename": file_name,
-                    "metadata": metadata,
-                    "content": content.strip()
-                }
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_data, f, ensure_ascii=False, indent=2)
-                logger.debug("JSONファイル保存完了")
-                    
-            logger.info(f"保存完了: {output_path}")
-            self.log_text.append(f"保存完了: {output_path}")
-        except Exception as e:
-            error_msg = f"ファイル保存エラー: {str(e)}"
-            logger.error(error_msg)
-            logger.error(traceback.format_exc())
-            self.log_text.append(error_msg)
-            
-            # エラーメッセージを表示
-            QMessageBox.warning(self, "保存エラー", f"ファイル保存中にエラーが発生しました:\n{str(e)}")
+        self.transcription_results[file_name] = result
         
         # 次のファイルを処理
         next_index = current_index + 1
-        if next_index < len(self.selected_files):
+        if next_index < len(self.batch_files):
             self.start_next_file(next_index, language, model_size)
         else:
-            # 処理完了通知
-            self.progress_bar.setValue(100)
-            logger.info("全ファイルの処理が完了しました")
-            self.log_text.append("全ファイルの処理が完了しました。")
-            
-            # UI状態の更新
-            self.start_btn.setEnabled(True)
-            self.cancel_btn.setEnabled(False)
-            self.folder_btn.setEnabled(True)
-            self.files_btn.setEnabled(True)
+            self.handle_transcription_done()
+    
+    def handle_pool_file_finished(self, file_path, result):
+        """ワーカープールで1ファイルの処理が完了した時の処理"""
+        logger.debug(f"文字起こし完了: {os.path.basename(file_path)}")
+        self.transcription_results[os.path.basename(file_path)] = result
+    
+    def handle_transcription_done(self):
+        """全ファイルの文字起こしが終わった時の処理 (保存が残っていれば完了を待つ)"""
+        if self.prefetcher is not None:
+            stats = self.prefetcher.format_stats()
+            logger.info(stats)
+            self.log_text.append(stats)
+            self.stop_prefetch()
+        self.transcription_done = True
+        if not self.output_stage.idle:
+            self.log_text.append("ファイルの保存を待っています...")
+        self.finish_batch_if_written()
+    
+    def handle_output_saved(self, stage, journal, file_path, saved_path):
+        """書き出しステージで保存が完了した時の処理"""
+        if not saved_path.endswith(stage.writer.output_format):
+            self.log_text.append("エラー: python-docxライブラリがインストールされていません。テキスト形式で保存します。")
+        logger.info(f"保存完了: {saved_path}")
+        self.log_text.append(f"保存完了: {saved_path}")
+        journal.record(file_path, DONE, output=saved_path)
+        self.finish_batch_if_written()
+    
+    def handle_output_failed(self, journal, file_path, message):
+        """書き出しステージで保存に失敗した時の処理"""
+        error_msg = f"ファイル保存エラー: {message}"
+        logger.error(f"{error_msg} ({os.path.basename(file_path)})")
+        self.log_text.append(error_msg)
+        journal.record(file_path, FAILED, error="ファイル保存エラー")
+        
+        # エラーメッセージを表示
+        QMessageBox.warning(self, "保存エラー", f"ファイル保存中にエラーが発生しました:\n{message}")
+        self.finish_batch_if_written()
+    
+    def finish_batch_if_written(self):
+        """文字起こしが終わっていて、保存もすべて完了していればバッチを終了"""
+        if self.transcription_done and self.output_stage.idle:
+            self.transcription_done = False
+            self.finish_batch()
+    
+    def continue_scanned_batch(self):
+        """走査中に開始したバッチの続きとして、その後に見つかったファイルを処理する"""
+        if len(self.selected_files) > self.scheduled_count:
+            count = len(self.selected_files) - self.scheduled_count
+            self.log_text.append(f"走査で新たに見つかった{count}個のファイルを処理します...")
+            self.start_batch()
+        elif self.scanning:
+            if not self.waiting_for_scan:
+                self.log_text.append("フォルダの走査の続きを待っています...")
+            self.waiting_for_scan = True
+        else:
+            self.waiting_for_scan = False
+            self.finish_batch()
+    
+    def finish_batch(self):
+        """全ファイルの処理完了時の処理"""
+        if self.scanning or len(self.selected_files) > self.scheduled_count:
+            # 走査中に開始したバッチでは、見つかった残りのファイルを続けて処理する
+            self.continue_scanned_batch()
+            return
+        if self.pool_thread is not None and self.pool_thread.accepting:
+            # 投入済みのファイルが終わると batch_finished_signal から再び呼ばれる
+            self.pool_thread.close_input()
+            return
+        self.batch_active = False
+        # 処理完了通知
+        self.progress_bar.setValue(100)
+        self.batch_progress_bar.setValue(100)
+        logger.info("全ファイルの処理が完了しました")
+        self.log_text.append("全ファイルの処理が完了しました。")
+        self.report_model_cache_stats()
+        self.report_metrics()
+        
+        # UI状態の更新
+        self.start_btn.setEnabled(True)
+        self.cancel_btn.setEnabled(False)
+        self.folder_btn.setEnabled(True)
+        self.files_btn.setEnabled(True)
 
 
 def main():
+    startup = StartupTimer(_STARTUP_BEGIN)
+    startup.mark("モジュールのインポート")
+    log_filename = setup_logging()
+    startup.mark("ログ設定")
     try:
         logger.info("アプリケーション起動")
         app = QApplication(sys.argv)
-        window = MP3TranscriberApp()
+        startup.mark("QApplication作成")
+        window = MP3TranscriberApp(log_filename)
+        startup.mark("ウィンドウ作成")
         window.show()
         logger.info("アプリケーションウィンドウを表示")
+
+        def on_shown():
+            # 最初の描画の後でモデルの事前ロードを始める
+            startup.mark("ウィンドウ表示")
+            startup.report()
+            window.start_prewarm()
+
+        QTimer.singleShot(0, on_shown)
         sys.exit(app.exec_())
     except Exception as e:
         logger.critical(f"アプリケーション実行中に致命的なエラーが発生しました: {str(e)}")
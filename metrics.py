@@ -0,0 +1,472 @@
+"""処理段階ごとの所要時間の計測と、JSON Lines / Prometheusテキスト形式での出力 (PyQt5に依存しない)
+
+ファイルごとにインポート・モデルロード・音声デコード・メル計算・エンコーダ・トークンデコード・書き出しの
+所要時間を StageTimings に記録し、結果 (TranscriptionResult.timings) と一緒に書き出し段まで受け渡す。
+ワーカープロセスで計測した値も結果と一緒に親プロセスに届くため、集計は MetricsRecorder が1か所で行う。
+
+メル計算・エンコーダ・トークンデコードはWhisperの内部で行われるため、whisper.transcribe が参照する
+log_mel_spectrogram を差し替え、エンコーダにforwardフックを、model.decode にラッパーを付けて計測する。
+フックは timing_scope の中のスレッドでだけ記録し、それ以外ではほぼ素通りになる。
+"""
+import os
+import sys
+import json
+import time
+import logging
+import tempfile
+import importlib
+import threading
+import weakref
+from bisect import bisect_left
+from datetime import datetime
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_METRICS_DIR = "metrics"
+JSONL_FILE_NAME = "transcription_metrics.jsonl"
+PROMETHEUS_FILE_NAME = "mp3_transcriber.prom"
+PROMETHEUS_WRITE_INTERVAL = 5.0  # Prometheusのファイルを書き直す最短間隔 (秒)
+METRIC_PREFIX = "mp3_transcriber"
+
+# 段階名と表示名 (記録順)
+STAGE_LABELS = {
+    "import": "インポート",
+    "model_load": "モデルロード",
+    "audio_decode": "音声デコード",
+    "mel": "メル計算",
+    "encoder": "エンコーダ",
+    "token_decode": "トークンデコード",
+    "inference": "推論全体",
+    "write": "書き出し",
+}
+STAGES = tuple(STAGE_LABELS)
+
+# 1回の呼び出し (ファイル内のウィンドウごとなど) の所要時間のバケット (秒)
+CALL_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+# 1ファイルあたりの段階の合計時間のバケット (秒)
+FILE_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+# 実時間比 (処理時間 / 音声の長さ) のバケット
+RTF_BUCKETS = (0.01, 0.02, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.0, 5.0)
+
+
+class Histogram:
+    """上限値ごとの件数を数える累積型のヒストグラム (Prometheusの histogram と同じ le の意味)"""
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # 最後は +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+    def cumulative(self):
+        """(上限値, その値以下の件数) を返す (最後の上限値は inf)"""
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+    def quantile(self, q):
+        """q分位点の目安 (その分位点を含むバケットの上限値。最後のバケットの場合は最大の上限値)"""
+        if not self.count:
+            return 0.0
+        for bound, total in self.cumulative():
+            if total >= q * self.count:
+                return bound if bound != float("inf") else self.bounds[-1]
+        return self.bounds[-1]
+
+    def to_dict(self):
+        return {
+            "sum": self.sum,
+            "count": self.count,
+            "buckets": {_format_bound(bound): total for bound, total in self.cumulative()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict() の辞書から復元する (常駐プロセスからJSONで受け取った場合など)"""
+        buckets = data["buckets"]
+        histogram = cls(float(bound) for bound in buckets if bound != "+Inf")
+        previous = 0
+        for index, total in enumerate(buckets.values()):
+            histogram.counts[index] = total - previous
+            previous = total
+        histogram.sum = data["sum"]
+        histogram.count = data["count"]
+        return histogram
+
+
+def _format_bound(bound):
+    return "+Inf" if bound == float("inf") else repr(float(bound))
+
+
+class StageTimings:
+    """1ファイル分の段階ごとの所要時間。段階ごとに呼び出し1回ずつの時間をヒストグラムに記録する
+
+    ワーカープロセスから結果と一緒に受け渡せるよう、値だけを持つ。
+    """
+    __slots__ = ("stages", "audio_seconds", "wall_seconds")
+
+    def __init__(self):
+        self.stages = {}  # 段階名: Histogram
+        self.audio_seconds = None  # 音声の長さ (秒)
+        self.wall_seconds = None  # 結果が得られるまでの経過時間 (書き出しを含まない)
+
+    def add(self, stage, seconds):
+        """stage の呼び出し1回分の所要時間を記録"""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = Histogram(CALL_BUCKETS)
+        histogram.observe(max(0.0, seconds))
+
+    def total(self, stage):
+        """stage の合計時間 (記録がなければ0)"""
+        histogram = self.stages.get(stage)
+        return histogram.sum if histogram is not None else 0.0
+
+    def measure(self, stage):
+        """with の中の所要時間を stage として記録するコンテキスト"""
+        return _Measure(self, stage)
+
+    def merge(self, other):
+        """other (分割したチャンクなど) の記録を足し合わせる (経過時間と音声の長さは足さない)"""
+        for stage, histogram in other.stages.items():
+            if stage in self.stages:
+                self.stages[stage].merge(histogram)
+            else:
+                merged = self.stages[stage] = Histogram(histogram.bounds)
+                merged.merge(histogram)
+
+    @property
+    def rtf(self):
+        """実時間比 (結果が得られるまでの経過時間 / 音声の長さ)。求められない場合はNone"""
+        if not self.audio_seconds or self.wall_seconds is None:
+            return None
+        return self.wall_seconds / self.audio_seconds
+
+    def to_dict(self):
+        return {
+            "audio_seconds": self.audio_seconds,
+            "wall_seconds": self.wall_seconds,
+            "rtf": self.rtf,
+            "stages": {stage: self.stages[stage].to_dict() for stage in _ordered(self.stages)},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        timings = cls()
+        timings.audio_seconds = data.get("audio_seconds")
+        timings.wall_seconds = data.get("wall_seconds")
+        for stage, histogram in data.get("stages", {}).items():
+            timings.stages[stage] = Histogram.from_dict(histogram)
+        return timings
+
+
+def _ordered(stages):
+    """段階名を STAGES の順に並べる (未知の段階は後ろに名前順)"""
+    return sorted(stages, key=lambda stage: (STAGES.index(stage) if stage in STAGES else len(STAGES), stage))
+
+
+class _Measure:
+    __slots__ = ("timings", "stage", "start")
+
+    def __init__(self, timings, stage):
+        self.timings = timings
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.timings is not None:
+            self.timings.add(self.stage, time.perf_counter() - self.start)
+
+
+# --- モデル内部の計測 ---
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_hooked_models = weakref.WeakSet()
+_original_mel = None
+
+
+def current_timings():
+    """このスレッドで有効な StageTimings (timing_scope の外ではNone)"""
+    return getattr(_local, "timings", None)
+
+
+def stage_timer(stage):
+    """このスレッドの timing_scope の StageTimings に stage の所要時間を記録するコンテキスト
+
+    timing_scope の外では何も記録しない。
+    """
+    return _Measure(current_timings(), stage)
+
+
+def _timed_mel(*args, **kwargs):
+    timings = current_timings()
+    if timings is None:
+        return _original_mel(*args, **kwargs)
+    with timings.measure("mel"):
+        return _original_mel(*args, **kwargs)
+
+
+def _install_mel_hook():
+    """whisper.transcribe と whisper パッケージが参照する log_mel_spectrogram を差し替える (一度だけ)
+
+    呼び出し元で _install_lock を取得しておく。
+    """
+    global _original_mel
+    if _original_mel is None:
+        try:
+            import whisper
+            # whisper.transcribe は関数名でもあるため、モジュールはsys.modulesから取得する
+            module = sys.modules.get("whisper.transcribe") or importlib.import_module("whisper.transcribe")
+        except ImportError:
+            return
+        _original_mel = whisper.log_mel_spectrogram
+        module.log_mel_spectrogram = _timed_mel
+        whisper.log_mel_spectrogram = _timed_mel
+
+
+def _encoder_started(module, inputs):
+    if current_timings() is not None:
+        _local.encoder_start = time.perf_counter()
+
+
+def _encoder_finished(module, inputs, output):
+    timings = current_timings()
+    start = getattr(_local, "encoder_start", None)
+    if timings is not None and start is not None:
+        timings.add("encoder", time.perf_counter() - start)
+    _local.encoder_start = None
+
+
+def _wrap_decode(decode):
+    def timed_decode(*args, **kwargs):
+        timings = current_timings()
+        if timings is None:
+            return decode(*args, **kwargs)
+        # decode の中で実行されたエンコーダの時間を除いたものをトークンデコードの時間とする
+        encoder_before = timings.total("encoder")
+        start = time.perf_counter()
+        try:
+            return decode(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings.add("token_decode", elapsed - (timings.total("encoder") - encoder_before))
+    return timed_decode
+
+
+def _install_model_hooks(model):
+    """エンコーダの前後にフックを付け、model.decode を計測付きのものに置き換える (モデルごとに一度だけ)
+
+    モデルはキャッシュで複数スレッドに共有されるため、フックは呼び出したスレッドの timing_scope だけを見る。
+    エンコーダを持たないモデル (スタブバックエンド) には何もしない。
+    """
+    with _install_lock:
+        if model in _hooked_models:
+            return
+        encoder = getattr(model, "encoder", None)
+        if hasattr(encoder, "register_forward_hook"):
+            _install_mel_hook()
+            encoder.register_forward_pre_hook(_encoder_started)
+            encoder.register_forward_hook(_encoder_finished)
+            if hasattr(model, "decode"):
+                # インスタンス属性はクラスのメソッドより優先されるため、whisper.transcribe の model.decode にも効く
+                model.decode = _wrap_decode(model.decode)
+        _hooked_models.add(model)
+
+
+class timing_scope:
+    """このスレッドで実行する処理の段階ごとの所要時間を timings に記録するコンテキスト
+
+    model を指定すると、メル計算・エンコーダ・トークンデコードも記録する。
+    """
+
+    def __init__(self, timings, model=None):
+        self.timings = timings
+        self.model = model
+        self._previous = None
+
+    def __enter__(self):
+        if self.model is not None:
+            _install_model_hooks(self.model)
+        self._previous = current_timings()
+        _local.timings = self.timings
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.timings = self._previous
+
+
+# --- 集計と出力 ---
+
+class MetricsRecorder:
+    """ファイルごとの計測値を集計し、JSON Lines (1ファイル1行) とPrometheusテキスト形式のファイルに出力する
+
+    Prometheusのファイルは node_exporter の textfile collector などがそのまま読めるよう、
+    一時ファイルに書いてから置き換える。値はこのプロセスを起動してからの累計。
+    """
+
+    def __init__(self, directory=DEFAULT_METRICS_DIR, write_interval=PROMETHEUS_WRITE_INTERVAL):
+        self.directory = directory
+        self.jsonl_path = os.path.join(directory, JSONL_FILE_NAME)
+        self.prometheus_path = os.path.join(directory, PROMETHEUS_FILE_NAME)
+        self.write_interval = write_interval
+        self._lock = threading.Lock()
+        self._stage_histograms = {}  # 段階名: 1ファイルあたりの合計時間のヒストグラム
+        self._rtf = Histogram(RTF_BUCKETS)
+        self._files = {"done": 0, "cached": 0, "failed": 0}
+        self._audio_seconds = 0.0
+        self._last_write = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def record_file(self, file_path, timings, model_size=None, cached=False):
+        """保存まで終わったファイルの計測値を記録する
+
+        cached=True (結果キャッシュを使い推論しなかった) のファイルは件数と書き出し時間だけを集計する。
+        """
+        status = "cached" if cached else "done"
+        record = {
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "file": os.path.abspath(file_path),
+            "status": status,
+            "model": model_size,
+        }
+        record.update(timings.to_dict())
+        with self._lock:
+            self._files[status] += 1
+            for stage in timings.stages:
+                histogram = self._stage_histograms.get(stage)
+                if histogram is None:
+                    histogram = self._stage_histograms[stage] = Histogram(FILE_BUCKETS)
+                histogram.observe(timings.total(stage))
+            if not cached:
+                if timings.audio_seconds:
+                    self._audio_seconds += timings.audio_seconds
+                if timings.rtf is not None:
+                    self._rtf.observe(timings.rtf)
+            self._append(record)
+            self._write_prometheus_if_due()
+
+    def record_failure(self, file_path, error=None):
+        """失敗したファイルを記録する"""
+        record = {
+            "time": datetime.now().isoformat(timespec='milliseconds'),
+            "file": os.path.abspath(file_path),
+            "status": "failed",
+        }
+        if error is not None:
+            record["error"] = str(error)
+        with self._lock:
+            self._files["failed"] += 1
+            self._append(record)
+            self._write_prometheus_if_due()
+
+    def flush(self):
+        """Prometheusのファイルを最新の値で書き直す (バッチの終わりに呼ぶ)"""
+        with self._lock:
+            self._write_prometheus()
+
+    def _append(self, record):
+        try:
+            with open(self.jsonl_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"計測値を書き込めませんでした: {str(e)}")
+
+    def _write_prometheus_if_due(self):
+        if time.monotonic() - self._last_write >= self.write_interval:
+            self._write_prometheus()
+
+    def _write_prometheus(self):
+        self._last_write = time.monotonic()
+        text = self.prometheus_text()
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".mp3_transcriber", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, self.prometheus_path)
+            except Exception:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        except OSError as e:
+            logger.warning(f"Prometheus形式の計測値を書き込めませんでした: {str(e)}")
+
+    def prometheus_text(self):
+        """Prometheusテキスト形式 (exposition format 0.0.4) の文字列"""
+        lines = []
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines.append(f"# HELP {name} Time spent in each processing stage per file.")
+        lines.append(f"# TYPE {name} histogram")
+        for stage in _ordered(self._stage_histograms):
+            _histogram_lines(lines, name, self._stage_histograms[stage], f'stage="{stage}"')
+
+        name = f"{METRIC_PREFIX}_real_time_factor"
+        lines.append(f"# HELP {name} Processing time divided by audio duration per transcribed file.")
+        lines.append(f"# TYPE {name} histogram")
+        _histogram_lines(lines, name, self._rtf)
+
+        name = f"{METRIC_PREFIX}_files_total"
+        lines.append(f"# HELP {name} Files finished, by status.")
+        lines.append(f"# TYPE {name} counter")
+        for status, count in self._files.items():
+            lines.append(f'{name}{{status="{status}"}} {count}')
+
+        name = f"{METRIC_PREFIX}_audio_seconds_total"
+        lines.append(f"# HELP {name} Duration of audio transcribed.")
+        lines.append(f"# TYPE {name} counter")
+        lines.append(f"{name} {_format_value(self._audio_seconds)}")
+
+        name = f"{METRIC_PREFIX}_last_update_timestamp_seconds"
+        lines.append(f"# HELP {name} Unix time this file was written.")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_format_value(time.time())}")
+        return "\n".join(lines) + "\n"
+
+    def format_summary(self):
+        """段階ごとの所要時間と実時間比をログ出力用に整形 (起動してからの累計)"""
+        with self._lock:
+            finished = self._files["done"]
+            lines = [f"段階別の所要時間 (起動後の累計, 推論 {finished}ファイル / キャッシュ {self._files['cached']}"
+                     f"ファイル / 失敗 {self._files['failed']}ファイル):"]
+            for stage in _ordered(self._stage_histograms):
+                histogram = self._stage_histograms[stage]
+                mean = histogram.sum / histogram.count if histogram.count else 0.0
+                lines.append(f"  {STAGE_LABELS.get(stage, stage)}: 合計 {histogram.sum:.1f}秒, "
+                             f"1ファイル平均 {mean:.2f}秒, 95%点 {histogram.quantile(0.95):g}秒以下")
+            if self._rtf.count:
+                lines.append(f"  実時間比: 平均 {self._rtf.sum / self._rtf.count:.3f} "
+                             f"(音声 合計 {self._audio_seconds / 60:.1f}分)")
+            return "\n".join(lines)
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+def _histogram_lines(lines, name, histogram, labels=""):
+    separator = "," if labels else ""
+    for bound, total in histogram.cumulative():
+        lines.append(f'{name}_bucket{{{labels}{separator}le="{_format_bound(bound)}"}} {total}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {_format_value(histogram.sum)}")
+    lines.append(f"{name}_count{suffix} {histogram.count}")
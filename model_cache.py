@@ -0,0 +1,336 @@
+"""Whisperモデルをプロセス内で共有するためのキャッシュ"""
+import os
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger("MP3Transcriber")
+
+# モデルサイズごとの推定メモリ使用量 (MB, fp32)
+MODEL_MEMORY_ESTIMATES_MB = {
+    "tiny": 150,
+    "base": 290,
+    "small": 970,
+    "medium": 3000,
+    "large": 6200,
+}
+
+SUPPORTED_PRECISIONS = ("fp32", "int8")
+
+# int8動的量子化ではLinear層の重みが1/4になるため、全体ではfp32の約4割になる
+INT8_MEMORY_RATIO = 0.4
+
+# 量子化済みモデルの保存先 (変換は初回のみ行う)
+QUANTIZED_MODEL_DIR = os.path.join("cache", "models")
+
+# キャッシュ全体のメモリ上限 (MB)。環境変数で上書き可能
+DEFAULT_MEMORY_BUDGET_MB = int(os.environ.get("MP3_TRANSCRIBER_MODEL_CACHE_MB", "8192"))
+
+# モデルのバックエンド ("whisper" または重みを使わない "stub")。ワーカープロセスにも引き継がれる
+BACKEND_ENV = "MP3_TRANSCRIBER_BACKEND"
+BACKENDS = ("whisper", "stub")
+
+
+def resolve_device(precision="fp32"):
+    """利用可能なデバイスを返す (GPUが利用可能であればcuda、int8量子化は常にcpu)"""
+    if precision == "int8":
+        return "cpu"
+    try:
+        import torch
+    except ImportError:
+        # スタブバックエンドはtorchなしで動く
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def estimate_memory_mb(model_size, precision="fp32"):
+    """ロード前のモデルのメモリ使用量の見積もり (MB)"""
+    estimate = MODEL_MEMORY_ESTIMATES_MB.get(model_size, 0)
+    return estimate * INT8_MEMORY_RATIO if precision == "int8" else estimate
+
+
+def _tensor_bytes(value):
+    # 量子化済みLinear層の重みは (重み, バイアス) のタプルとしてstate_dictに入る
+    if isinstance(value, (tuple, list)):
+        return sum(_tensor_bytes(item) for item in value)
+    if hasattr(value, "element_size"):
+        return value.numel() * value.element_size()
+    return 0
+
+
+def estimate_model_size_mb(model, model_size, precision="fp32"):
+    """ロード済みモデルのメモリ使用量を推定 (MB)"""
+    try:
+        total = sum(_tensor_bytes(value) for value in model.state_dict().values())
+        if total:
+            return total / (1024 * 1024)
+    except AttributeError:
+        pass
+    return estimate_memory_mb(model_size, precision)
+
+
+def _load_whisper_model(model_size, device, precision):
+    """Whisperモデルをロード"""
+    if precision == "int8":
+        return _load_quantized_whisper_model(model_size)
+    import whisper
+    return whisper.load_model(model_size, device=device)
+
+
+def _use_plain_linear(module):
+    """WhisperのLinear (nn.Linearのサブクラス) をnn.Linearに置き換える
+
+    quantize_dynamic は型が完全に一致するモジュールだけを変換するため、置き換えないと量子化されない。
+    """
+    import torch.nn as nn
+
+    for name, child in module.named_children():
+        if isinstance(child, nn.Linear) and type(child) is not nn.Linear:
+            linear = nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            _use_plain_linear(child)
+
+
+def _quantize_int8(model):
+    """Linear層の重みをint8に動的量子化したモデルを返す"""
+    import torch
+
+    _use_plain_linear(model)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_model_path(model_size):
+    """量子化済みモデルの保存先 (量子化の形式が変わりうるためtorchのバージョンを含める)"""
+    import torch
+    import whisper
+
+    version = getattr(whisper, "__version__", "unknown")
+    return os.path.join(QUANTIZED_MODEL_DIR, f"{model_size}-int8-whisper{version}-torch{torch.__version__}.pt")
+
+
+def _load_quantized_whisper_model(model_size):
+    """int8量子化済みのWhisperモデルをロード (保存済みでなければ変換して保存する)"""
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    path = quantized_model_path(model_size)
+    if os.path.exists(path):
+        try:
+            checkpoint = torch.load(path, map_location="cpu")
+            model = _quantize_int8(Whisper(ModelDimensions(**checkpoint["dims"])))
+            model.load_state_dict(checkpoint["model_state_dict"])
+            if model_size in whisper._ALIGNMENT_HEADS:
+                model.set_alignment_heads(whisper._ALIGNMENT_HEADS[model_size])
+            logger.debug(f"量子化済みモデルを読み込みました: {path}")
+            return model
+        except Exception as e:
+            logger.warning(f"量子化済みモデルを読み込めないため作成し直します: {path} ({str(e)})")
+
+    logger.info(f"モデル {model_size} をint8に量子化しています (初回のみ)...")
+    model = _quantize_int8(whisper.load_model(model_size, device="cpu"))
+    os.makedirs(QUANTIZED_MODEL_DIR, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        torch.save({"dims": vars(model.dims), "model_state_dict": model.state_dict()}, tmp_path)
+        os.replace(tmp_path, path)
+        logger.info(f"量子化済みモデルを保存しました: {path}")
+    except OSError as e:
+        logger.warning(f"量子化済みモデルを保存できませんでした: {str(e)}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return model
+
+
+def default_backend():
+    """環境変数で指定されたバックエンド名"""
+    backend = os.environ.get(BACKEND_ENV, "whisper")
+    if backend not in BACKENDS:
+        raise ValueError(f"未対応のバックエンドです: {backend}")
+    return backend
+
+
+def _backend_loader(backend):
+    if backend == "stub":
+        from stub_backend import load_stub_model
+        return load_stub_model
+    return _load_whisper_model
+
+
+class _CacheEntry:
+    """キャッシュ内の1モデル分の情報"""
+    __slots__ = ("model", "size_mb", "refcount", "load_seconds")
+
+    def __init__(self, model, size_mb, load_seconds):
+        self.model = model
+        self.size_mb = size_mb
+        self.refcount = 0
+        self.load_seconds = load_seconds
+
+
+class ModelLease:
+    """キャッシュから借りたモデル。使い終わったらrelease()で返却する"""
+
+    def __init__(self, cache, key, model, cache_hit, load_seconds):
+        self._cache = cache
+        self.key = key
+        self.model = model
+        self.cache_hit = cache_hit
+        self.load_seconds = load_seconds
+        self._released = False
+
+    def release(self):
+        """モデルをキャッシュに返却"""
+        if not self._released:
+            self._released = True
+            self._cache._release(self.key)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.release()
+
+
+class ModelCache:
+    """(model_size, device, precision) をキーとするLRUモデルキャッシュ"""
+
+    def __init__(self, memory_budget_mb=DEFAULT_MEMORY_BUDGET_MB, loader=None, backend=None):
+        self.memory_budget_mb = memory_budget_mb
+        self.backend = backend or default_backend()
+        self._loader = loader or _backend_loader(self.backend)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.load_history = []  # (キー, ロード時間[秒])
+
+    def acquire(self, model_size, device=None, precision="fp32"):
+        """モデルを借りる。未ロードの場合はロードしてキャッシュする"""
+        if precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"未対応の精度です: {precision}")
+        if device is None:
+            device = resolve_device(precision)
+        if precision == "int8" and device != "cpu":
+            raise ValueError("int8量子化はCPUでのみ使用できます")
+        key = (model_size, device, precision)
+
+        lease = self._lease_cached(key)
+        if lease is not None:
+            return lease
+
+        # 同じキーの並行ロードを防ぐ
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            lease = self._lease_cached(key)
+            if lease is not None:
+                return lease
+
+            with self._lock:
+                self.misses += 1
+                self._evict_for(estimate_memory_mb(model_size, precision))
+
+            logger.debug(f"モデルキャッシュミス: {key} をロード中...")
+            start = time.perf_counter()
+            model = self._loader(model_size, device, precision)
+            load_seconds = time.perf_counter() - start
+            size_mb = estimate_model_size_mb(model, model_size, precision)
+
+            with self._lock:
+                entry = _CacheEntry(model, size_mb, load_seconds)
+                entry.refcount += 1
+                self._entries[key] = entry
+                self.load_history.append((key, load_seconds))
+                self._evict_for(0)
+            logger.info(f"モデルロード完了: {key} ({load_seconds:.2f}秒, {size_mb:.0f} MB)")
+            return ModelLease(self, key, model, False, load_seconds)
+
+    def prewarm(self, model_size, device=None, precision="fp32"):
+        """モデルを先にロードしてキャッシュに置く (ロード済みの場合は何もしない)。ロード時間 (秒) を返す"""
+        with self.acquire(model_size, device=device, precision=precision) as lease:
+            return lease.load_seconds
+
+    def _lease_cached(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            entry.refcount += 1
+            self._entries.move_to_end(key)
+            self.hits += 1
+        logger.debug(f"モデルキャッシュヒット: {key}")
+        return ModelLease(self, key, entry.model, True, 0.0)
+
+    def _release(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.refcount > 0:
+                entry.refcount -= 1
+            self._evict_for(0)
+
+    def _evict_for(self, incoming_mb):
+        """メモリ上限を超える場合、未使用のモデルを古い順に破棄 (ロック取得済みで呼ぶこと)"""
+        used_mb = sum(entry.size_mb for entry in self._entries.values())
+        for key in list(self._entries):
+            if used_mb + incoming_mb <= self.memory_budget_mb:
+                break
+            entry = self._entries[key]
+            if entry.refcount > 0:
+                continue
+            del self._entries[key]
+            used_mb -= entry.size_mb
+            self.evictions += 1
+            logger.info(f"モデルをキャッシュから破棄: {key} ({entry.size_mb:.0f} MB)")
+        if used_mb + incoming_mb > self.memory_budget_mb:
+            logger.warning(
+                f"モデルキャッシュがメモリ上限を超えています: "
+                f"{used_mb + incoming_mb:.0f} MB / {self.memory_budget_mb} MB"
+            )
+
+    def clear(self):
+        """未使用のモデルをすべて破棄"""
+        with self._lock:
+            for key in [k for k, e in self._entries.items() if e.refcount == 0]:
+                del self._entries[key]
+
+    def stats(self):
+        """キャッシュ統計を辞書で返す"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "loaded": [
+                    {"key": key, "size_mb": entry.size_mb, "in_use": entry.refcount}
+                    for key, entry in self._entries.items()
+                ],
+                "load_seconds": [(key, seconds) for key, seconds in self.load_history],
+            }
+
+    def format_stats(self):
+        """キャッシュ統計をログ出力用の文字列に整形"""
+        stats = self.stats()
+        lines = [f"モデルキャッシュ: ヒット {stats['hits']}回 / ミス {stats['misses']}回 / 破棄 {stats['evictions']}回"]
+        for (model_size, device, precision), seconds in stats["load_seconds"]:
+            lines.append(f"  ロード: {model_size} ({device}, {precision}) {seconds:.2f}秒")
+        return "\n".join(lines)
+
+
+_model_cache = None
+_model_cache_lock = threading.Lock()
+
+
+def get_model_cache():
+    """プロセス共有のモデルキャッシュを取得"""
+    global _model_cache
+    with _model_cache_lock:
+        if _model_cache is None:
+            _model_cache = ModelCache()
+        return _model_cache
@@ -0,0 +1,250 @@
+"""MP3のフレームヘッダーとXing/Info/VBRIタグから、デコードせずに長さを求める簡易プローブ
+
+ファイルの先頭・中央・末尾の数十KBだけを読むため、ffprobeを起動するよりはるかに速い。
+フレームが見つからないファイルや、途中で切れているファイルはモデルの処理に入る前に除外できるよう
+Mp3ProbeError を送出する。
+"""
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+# ビットレート (kbps)。キーは (MPEG1かどうか, レイヤー)
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# サンプリングレート。キーはヘッダーのバージョンビット (0: MPEG2.5, 2: MPEG2, 3: MPEG1)
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+SYNC_SEARCH_BYTES = 64 * 1024  # タグの後ろで最初のフレームを探す範囲
+TAIL_BYTES = 16 * 1024  # 末尾のフレームの途切れを確認する範囲
+CHAIN_FRAMES = 3  # 偶然の同期パターンと区別するため、連続して並んでいることを確認するフレーム数
+TRUNCATION_TOLERANCE = 0.01  # Xing/VBRIタグのバイト数よりこの割合以上短ければ途中で切れているとみなす
+
+_probe_memo = OrderedDict()  # (絶対パス, サイズ, 更新時刻): Mp3Info
+_probe_memo_lock = threading.Lock()
+_PROBE_MEMO_SIZE = 4096
+
+
+class Mp3ProbeError(Exception):
+    """MP3として読めない、または途中で切れているファイル"""
+
+
+class _FrameHeader:
+    __slots__ = ("version", "layer", "bitrate", "sample_rate", "padding", "mono", "samples", "length")
+
+    def __init__(self, version, layer, bitrate, sample_rate, padding, mono):
+        self.version = version
+        self.layer = layer
+        self.bitrate = bitrate  # kbps
+        self.sample_rate = sample_rate
+        self.padding = padding
+        self.mono = mono
+        mpeg1 = version == 3
+        if layer == 1:
+            self.samples = 384
+            self.length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            self.samples = 1152 if mpeg1 or layer == 2 else 576
+            self.length = self.samples // 8 * bitrate * 1000 // sample_rate + padding
+
+    def compatible(self, other):
+        """同じストリームの続きのフレームとみなせるか"""
+        return (self.version, self.layer, self.sample_rate) == (other.version, other.layer, other.sample_rate)
+
+
+def _parse_header(data, offset):
+    """offset の4バイトをフレームヘッダーとして解釈する (ヘッダーでなければNone)"""
+    if offset + 4 > len(data):
+        return None
+    b1, b2, b3, b4 = data[offset:offset + 4]
+    if b1 != 0xFF or (b2 & 0xE0) != 0xE0:
+        return None
+    version = (b2 >> 3) & 0x03
+    layer = 4 - ((b2 >> 1) & 0x03)
+    bitrate_index = b3 >> 4
+    sample_rate_index = (b3 >> 2) & 0x03
+    # 予約値とフリーフォーマット (ビットレート0) は扱わない
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+    bitrate = _BITRATES[(version == 3, layer)][bitrate_index]
+    sample_rate = _SAMPLE_RATES[version][sample_rate_index]
+    return _FrameHeader(version, layer, bitrate, sample_rate, (b3 >> 1) & 0x01, (b4 >> 6) == 3)
+
+
+def _chain_at(data, offset, frames=CHAIN_FRAMES):
+    """offset から frames 個のフレームが途切れずに並んでいれば最初のヘッダーを返す
+
+    データの終わりに達した場合は、そこまで並んでいれば良しとする。
+    """
+    first = header = _parse_header(data, offset)
+    for _ in range(frames - 1):
+        if header is None:
+            return None
+        offset += header.length
+        if offset + 4 > len(data):
+            return first
+        following = _parse_header(data, offset)
+        if following is None or not following.compatible(first):
+            return None
+        header = following
+    return first
+
+
+def _find_chain(data, start=0):
+    """start 以降で最初にフレームが連続して並ぶ位置を返す (見つからなければ (None, None))"""
+    offset = data.find(b"\xff", start)
+    while offset != -1:
+        header = _chain_at(data, offset)
+        if header is not None:
+            return offset, header
+        offset = data.find(b"\xff", offset + 1)
+    return None, None
+
+
+def _id3v2_size(head):
+    """先頭のID3v2タグの長さ (タグがなければ0)"""
+    if len(head) < 10 or head[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _trailing_tag_size(f, file_size):
+    """末尾のID3v1タグとAPEv2タグの合計の長さ"""
+    size = 0
+    if file_size >= 128:
+        f.seek(file_size - 128)
+        if f.read(3) == b"TAG":
+            size = 128
+    if file_size - size >= 32:
+        f.seek(file_size - size - 32)
+        footer = f.read(32)
+        if footer[:8] == b"APETAGEX":
+            # フッターのサイズにはヘッダーが含まれないため、ヘッダーの有無を見て足す
+            tag_size = struct.unpack("<I", footer[12:16])[0]
+            flags = struct.unpack("<I", footer[20:24])[0]
+            size += tag_size + (32 if flags & 0x80000000 else 0)
+    return size
+
+
+def _vbr_tag(frame, header):
+    """Xing/Info/VBRIタグの (フレーム数, バイト数) を返す (タグがなければ (None, None))"""
+    if header.version == 3:
+        side_info = 17 if header.mono else 32
+    else:
+        side_info = 9 if header.mono else 17
+    xing = 4 + side_info
+    if frame[xing:xing + 4] in (b"Xing", b"Info"):
+        flags = struct.unpack(">I", frame[xing + 4:xing + 8])[0]
+        position = xing + 8
+        frames = byte_count = None
+        if flags & 0x01:
+            frames = struct.unpack(">I", frame[position:position + 4])[0]
+            position += 4
+        if flags & 0x02:
+            byte_count = struct.unpack(">I", frame[position:position + 4])[0]
+        return frames, byte_count
+    if frame[36:40] == b"VBRI":
+        byte_count, frames = struct.unpack(">II", frame[46:54])
+        return frames, byte_count
+    return None, None
+
+
+class Mp3Info:
+    """プローブで得たMP3の情報"""
+    __slots__ = ("duration", "sample_rate", "bitrate", "frames", "vbr", "audio_bytes")
+
+    def __init__(self, duration, sample_rate, bitrate, frames, vbr, audio_bytes):
+        self.duration = duration  # 秒
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate  # 平均ビットレート (kbps)
+        self.frames = frames  # Xing/VBRIタグのフレーム数 (タグがなければNone)
+        self.vbr = vbr
+        self.audio_bytes = audio_bytes
+
+
+def _probe(file_path):
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        head = f.read(10)
+        tag_size = _id3v2_size(head)
+        f.seek(tag_size)
+        data = f.read(SYNC_SEARCH_BYTES)
+        offset, header = _find_chain(data)
+        if header is None:
+            raise Mp3ProbeError("MPEGフレームが見つかりません (MP3ファイルではないか、破損しています)")
+        audio_start = tag_size + offset
+        audio_end = file_size - _trailing_tag_size(f, file_size)
+        audio_bytes = audio_end - audio_start
+        if audio_bytes <= header.length:
+            raise Mp3ProbeError("音声データがありません")
+
+        frames, byte_count = _vbr_tag(data[offset:offset + header.length], header)
+        if byte_count and audio_bytes < byte_count * (1 - TRUNCATION_TOLERANCE):
+            raise Mp3ProbeError(
+                f"ファイルが途中で切れています ({audio_bytes}バイト / タグの記録 {byte_count}バイト)"
+            )
+
+        # 中央のフレームが読めなければデータが壊れている
+        middle = audio_start + audio_bytes // 2
+        f.seek(middle)
+        middle_data = f.read(min(SYNC_SEARCH_BYTES, audio_end - middle))
+        if _find_chain(middle_data)[1] is None:
+            raise Mp3ProbeError("ファイルの途中のフレームが読めません (破損しています)")
+
+        # 末尾のフレームを辿り、最後のフレームがファイルの終わりより先まで続いていれば途中で切れている
+        tail_start = max(audio_start, audio_end - TAIL_BYTES)
+        f.seek(tail_start)
+        tail = f.read(audio_end - tail_start)
+    position, tail_header = _find_chain(tail)
+    while tail_header is not None and position + 4 <= len(tail):
+        following = _parse_header(tail, position)
+        if following is None or not following.compatible(tail_header):
+            # タグなど、フレーム以外のデータが続いている場合は判断しない
+            break
+        position += following.length
+    else:
+        if tail_header is not None and position > len(tail):
+            raise Mp3ProbeError(f"ファイルが途中で切れています (最後のフレームが{position - len(tail)}バイト不足)")
+
+    if frames:
+        duration = frames * header.samples / header.sample_rate
+        bitrate = audio_bytes * 8 / duration / 1000 if duration else header.bitrate
+        return Mp3Info(duration, header.sample_rate, bitrate, frames, True, audio_bytes)
+    # タグがなければ固定ビットレートとみなす
+    return Mp3Info(audio_bytes * 8 / (header.bitrate * 1000), header.sample_rate, header.bitrate, None, False,
+                   audio_bytes)
+
+
+def probe_mp3(file_path):
+    """MP3をデコードせずに調べ、Mp3Info を返す
+
+    フレームが見つからない・途中で切れているファイルは Mp3ProbeError を送出する。
+    サイズと更新時刻が変わっていなければ前回の結果を使う。
+    """
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _probe_memo_lock:
+        if memo_key in _probe_memo:
+            _probe_memo.move_to_end(memo_key)
+            return _probe_memo[memo_key]
+
+    info = _probe(file_path)
+    with _probe_memo_lock:
+        _probe_memo[memo_key] = info
+        if len(_probe_memo) > _PROBE_MEMO_SIZE:
+            _probe_memo.popitem(last=False)
+    return info
@@ -0,0 +1,201 @@
+"""文字起こし結果のファイル出力 (.txt / .docx / .json)"""
+import os
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from metrics import StageTimings
+from transcriber import format_timestamp
+
+logger = logging.getLogger("MP3Transcriber")
+
+# GUIの出力形式表示名と拡張子の対応
+FORMAT_MAP = {
+    "テキストファイル (.txt)": ".txt",
+    "Word文書 (.docx)": ".docx",
+    "JSONファイル (.json)": ".json",
+}
+
+OUTPUT_FORMATS = tuple(FORMAT_MAP.values())
+
+DEFAULT_WRITER_THREADS = 2
+DEFAULT_MAX_PENDING_WRITES = 4  # これを超えると書き出しの投入をブロックする
+
+
+def build_output_path(file_name, output_dir, output_format):
+    """出力ファイルのパスを作成 (出力先が未指定の場合はカレントディレクトリ)"""
+    base_name = os.path.splitext(file_name)[0]
+    if output_dir:
+        return os.path.join(output_dir, f"{base_name}{output_format}")
+    return f"{base_name}{output_format}"
+
+
+def _format_segment_line(segment):
+    """セグメントを "[開始 - 終了] テキスト" の形式に整形"""
+    return f"[{format_timestamp(segment.start)} - {format_timestamp(segment.end)}] {segment.text.strip()}"
+
+
+@contextmanager
+def _atomic_output(output_path):
+    """一時ファイルのパスを渡し、書き込みが完了したら出力先に置き換える (書きかけのファイルを残さない)"""
+    tmp_path = f"{output_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _write_text(output_path, text):
+    with _atomic_output(output_path) as tmp_path:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+
+def save_transcription(output_path, result, output_format):
+    """文字起こし結果 (TranscriptionResult) を指定形式で保存し、実際に保存したパスを返す"""
+    if output_format == ".txt":
+        # テキストファイルとして保存
+        logger.debug(f"テキストファイルを保存中: {output_path}")
+        _write_text(output_path, result.to_text())
+        logger.debug("テキストファイル保存完了")
+    elif output_format == ".docx":
+        # Word文書として保存 (python-docxライブラリが必要)
+        try:
+            logger.debug("Word文書として保存中")
+            from docx import Document
+        except ImportError as e:
+            logger.warning(f"python-docxライブラリがインストールされていません: {str(e)}")
+            output_path = output_path.replace('.docx', '.txt')
+            _write_text(output_path, result.to_text())
+            return output_path
+
+        document = Document()
+        document.add_heading(f'文字起こし結果: {result.file_name}', 0)
+
+        # メタデータ
+        for key, value in result.metadata.items():
+            document.add_paragraph(f"{key}: {value}")
+
+        # 本文テキスト
+        document.add_heading('テキスト内容', level=1)
+        document.add_paragraph(result.text)
+
+        # タイムスタンプ付きのセグメント
+        if len(result):
+            document.add_heading('セグメント', level=1)
+            document.add_paragraph('\n'.join(_format_segment_line(segment) for segment in result.segments()))
+
+        with _atomic_output(output_path) as tmp_path:
+            document.save(tmp_path)
+        logger.debug("Word文書保存完了")
+    elif output_format == ".json":
+        # JSON形式で保存
+        logger.debug("JSONファイルとして保存中")
+        json_data = {
+            "filename": result.file_name,
+            "metadata": result.metadata,
+            "content": result.text.strip(),
+            "segments": [segment.to_dict() for segment in result.segments()],
+        }
+
+        _write_text(output_path, json.dumps(json_data, ensure_ascii=False, indent=2))
+        logger.debug("JSONファイル保存完了")
+    else:
+        raise ValueError(f"未対応の出力形式です: {output_format}")
+
+    return output_path
+
+
+class AsyncOutputWriter:
+    """文字起こし結果の保存を専用スレッドで行う書き出しステージ
+
+    未完了の書き出しが max_pending 件に達すると、submit は空きができるまでブロックする
+    (書き出しが推論に追いつかない場合に、結果がメモリに溜まり続けないようにする)。
+    metrics (MetricsRecorder) を指定すると、保存が終わったファイルの段階ごとの所要時間を記録する。
+    """
+
+    def __init__(self, output_dir, output_format, workers=DEFAULT_WRITER_THREADS,
+                 max_pending=DEFAULT_MAX_PENDING_WRITES, metrics=None):
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.metrics = metrics
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="output-writer")
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.written = 0
+        self.blocked_seconds = 0.0  # 空き待ちでブロックした合計時間
+
+    @property
+    def pending(self):
+        """投入済みで未完了の書き出し数"""
+        with self._lock:
+            return self._pending
+
+    def submit(self, file_path, result, on_saved=None, on_failed=None):
+        """結果の保存を投入し、保存先のパスを返すFutureを返す
+
+        保存が完了すると書き出しスレッドから on_saved(ファイルパス, 保存先)、
+        失敗すると on_failed(ファイルパス, 例外) を呼び出す。
+        """
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            self._slots.acquire()
+            waited = time.perf_counter() - start
+            logger.debug(f"書き出し待ち: {waited:.2f}秒")
+            with self._lock:
+                self.blocked_seconds += waited
+        with self._lock:
+            self._pending += 1
+        output_path = build_output_path(os.path.basename(file_path), self.output_dir, self.output_format)
+        # 推論しなかった結果 (キャッシュ済み) は書き出しの時間だけを記録する
+        cached = result.timings is None
+        timings = StageTimings() if cached else result.timings
+        try:
+            future = self._executor.submit(self._save, output_path, result, timings)
+        except Exception:
+            self._finish()
+            raise
+
+        def done(future):
+            self._finish(written=future.exception() is None)
+            if future.exception() is not None:
+                if self.metrics is not None:
+                    self.metrics.record_failure(file_path, future.exception())
+                if on_failed is not None:
+                    on_failed(file_path, future.exception())
+            else:
+                if self.metrics is not None:
+                    self.metrics.record_file(file_path, timings, result.model_size, cached=cached)
+                if on_saved is not None:
+                    on_saved(file_path, future.result())
+
+        future.add_done_callback(done)
+        return future
+
+    def _save(self, output_path, result, timings):
+        with timings.measure("write"):
+            return save_transcription(output_path, result, self.output_format)
+
+    def _finish(self, written=False):
+        with self._lock:
+            self._pending -= 1
+            if written:
+                self.written += 1
+        self._slots.release()
+
+    def shutdown(self, wait=True):
+        """書き出しスレッドを終了 (wait=Trueの場合は投入済みの書き出しの完了を待つ)"""
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown(wait=True)
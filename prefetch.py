@@ -0,0 +1,148 @@
+"""音声デコードと推論を重ねるためのプリフェッチ段 (PyQt5に依存しない)
+
+推論中のファイルの次のK件をバックグラウンドスレッドでデコードし、上限付きのキューに入れておく。
+ffmpegのデコードは別プロセスで行われるため、推論のCPU時間と重なる。
+どちらの段が待たされたかを記録し、デコードと推論のどちらが律速になっているかを確認できる。
+"""
+import queue
+import time
+import logging
+import threading
+
+from audio_cache import decode_audio
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_PREFETCH_DEPTH = 2  # 先にデコードしておくファイル数 (1時間の音声で約230MB)
+POLL_SECONDS = 0.1  # take() で待つ間に close() とキャンセルを確認する間隔
+
+_END = object()
+
+
+class AudioPrefetcher:
+    """file_paths を順にデコードし、take() で同じ順に受け取る
+
+    decoder を省略するとffmpegでデコードする (デコード済み音声キャッシュを使う場合は AudioCache.load を渡す)。
+    skip(パス) がTrueのファイル (結果キャッシュ済みなど) はデコードせずに None を渡す。
+    """
+
+    def __init__(self, file_paths, decoder=None, depth=DEFAULT_PREFETCH_DEPTH, skip=None):
+        self._paths = list(file_paths)
+        self._remaining = set(self._paths)
+        self._decoder = decoder or decode_audio
+        self._skip = skip
+        self.depth = max(1, depth)
+        self._queue = queue.Queue(maxsize=self.depth)
+        self._closed = threading.Event()
+        self._lock = threading.Lock()
+        self.decoded = 0
+        self.decode_seconds = 0.0
+        self.producer_stall_seconds = 0.0  # キューが満杯でデコード側が待った時間 (推論が律速)
+        self.consumer_stall_seconds = 0.0  # キューが空で推論側が待った時間 (デコードが律速)
+        self._depth_total = 0
+        self._depth_samples = 0
+        self.max_depth = 0
+        self._thread = threading.Thread(target=self._run, name="AudioPrefetcher", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        for path in self._paths:
+            if self._closed.is_set():
+                return
+            audio = error = None
+            if self._skip is None or not self._skip(path):
+                start = time.perf_counter()
+                try:
+                    audio = self._decoder(path)
+                except Exception as e:
+                    # 受け取った側で例外を送出する
+                    error = e
+                with self._lock:
+                    self.decoded += 1
+                    self.decode_seconds += time.perf_counter() - start
+            if not self._put((path, audio, error)):
+                return
+        self._put(_END)
+
+    def _put(self, item):
+        start = time.perf_counter()
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                self.producer_stall_seconds += time.perf_counter() - start
+            return True
+        return False
+
+    def take(self, file_path, cancel_token=None):
+        """file_path のデコード済み音声を返す (対象外・スキップしたファイル、close() 後の場合はNone)
+
+        デコードに失敗していた場合はその例外を送出する。
+        待っている間に cancel_token がキャンセルされると TranscriptionCancelled を送出する。
+        """
+        if file_path not in self._remaining:
+            return None
+        depth = self._queue.qsize()
+        start = time.perf_counter()
+        while True:
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+            if self._closed.is_set():
+                return None
+            try:
+                item = self._queue.get(timeout=POLL_SECONDS)
+            except queue.Empty:
+                continue
+            if item is _END:
+                self._remaining.clear()
+                return None
+            path, audio, error = item
+            self._remaining.discard(path)
+            if path == file_path:
+                break
+            # 処理されなかったファイルの分は捨てる
+            logger.debug(f"プリフェッチした音声を破棄しました: {path}")
+        with self._lock:
+            self.consumer_stall_seconds += time.perf_counter() - start
+            self._depth_total += depth
+            self._depth_samples += 1
+            self.max_depth = max(self.max_depth, depth)
+        if error is not None:
+            raise error
+        return audio
+
+    def close(self):
+        """デコードを打ち切り、キューに残った音声を解放する (take() で待っている側はNoneを受け取る)"""
+        self._closed.set()
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+        # 待っている側をすぐに起こす (ポーリングでも close() に気付く)
+        try:
+            self._queue.put_nowait(_END)
+        except queue.Full:
+            pass
+        # デコード中のファイルは中断できないため、GUIスレッドから呼ばれても長く待たない (スレッドはデーモン)
+        self._thread.join(timeout=POLL_SECONDS * 2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.close()
+
+    def format_stats(self):
+        """段ごとの待ち時間とキューの深さを整形"""
+        with self._lock:
+            mean_depth = self._depth_total / self._depth_samples if self._depth_samples else 0.0
+            if self.consumer_stall_seconds > self.producer_stall_seconds:
+                bottleneck = "デコード"
+            else:
+                bottleneck = "推論"
+            return (f"プリフェッチ (深さ {self.depth}): デコード {self.decoded}件 {self.decode_seconds:.1f}秒, "
+                    f"推論側の待ち {self.consumer_stall_seconds:.1f}秒, デコード側の待ち {self.producer_stall_seconds:.1f}秒, "
+                    f"キュー長 平均 {mean_depth:.1f} / 最大 {self.max_depth} (律速: {bottleneck})")
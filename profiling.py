@@ -0,0 +1,313 @@
+"""ファイル単位のプロファイリング (cProfile と torch.profiler、PyQt5に依存しない)
+
+遅いバッチの原因を調べるため、選んだファイルの文字起こしだけを cProfile と torch.profiler で計測し、
+ログの隣 (既定では logs/profiles/) に次のファイルを書き出す。
+
+- <名前>.speedscope.json: cProfileの呼び出し関係から組み立てたフレームグラフ (https://www.speedscope.app で開く)
+- <名前>.prof: cProfileの生データ (pstats / snakeviz で開く)
+- <名前>.torch.trace.json: torch.profilerのChromeトレース (chrome://tracing や Perfetto、speedscope で開く)
+- <名前>.summary.txt: 累積時間・自己時間の上位の関数と、torchの演算子の上位
+
+cProfileは実行したスレッドだけを計測する (プリフェッチや書き出しのスレッドは含まない)。
+計測のオーバーヘッドで処理は遅くなるため、既定では無効。
+"""
+import os
+import json
+import time
+import pstats
+import fnmatch
+import logging
+import cProfile
+import threading
+from datetime import datetime
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_PROFILE_SUBDIR = "profiles"  # ログの出力先の下に作るフォルダ
+DEFAULT_TOP_FUNCTIONS = 20  # 概要に載せる関数の数
+MIN_FRAME_FRACTION = 0.001  # フレームグラフでこの割合より短い呼び出しは省く
+MAX_FRAME_DEPTH = 200
+
+# Python 3.12以降のcProfileはプロセス全体で1つしか有効にできないため、同時に1ファイルだけ計測する
+_cprofile_lock = threading.Lock()
+
+
+def default_profile_dir(log_directory="logs"):
+    """ログの出力先の隣に置くプロファイルの出力先"""
+    return os.path.join(log_directory, DEFAULT_PROFILE_SUBDIR)
+
+
+class ProfileSelector:
+    """プロファイルを取るファイルを決める
+
+    patterns (ファイル名のglobパターン) とfiles (パス) のどちらかに一致したファイルを選ぶ。
+    どちらも空の場合はすべてのファイルを選ぶ。
+    """
+
+    def __init__(self, directory, patterns=(), files=(), torch_trace=True):
+        self.directory = directory
+        self.patterns = list(patterns)
+        self.files = {os.path.abspath(path) for path in files}
+        self.torch_trace = torch_trace
+
+    def selects(self, file_path):
+        if not self.patterns and not self.files:
+            return True
+        if os.path.abspath(file_path) in self.files:
+            return True
+        name = os.path.basename(file_path)
+        return any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns)
+
+    def scope(self, file_path):
+        """file_path が選ばれていればプロファイルを取るコンテキスト、そうでなければ何もしないコンテキスト"""
+        if not self.selects(file_path):
+            return _NoProfile()
+        return profile_scope(os.path.basename(file_path), self.directory, self.torch_trace)
+
+    def batch_scope(self, file_paths):
+        """複数ファイルをまとめて処理する場合 (バッチ推論) に、選ばれたファイルを含むバッチ全体を計測するコンテキスト"""
+        file_paths = list(file_paths)
+        if not any(self.selects(path) for path in file_paths):
+            return _NoProfile()
+        return profile_scope(f"batch_{len(file_paths)}files", self.directory, self.torch_trace)
+
+
+def profile_for(selector, file_path):
+    """selector (ProfileSelector、Noneなら無効) が file_path を選んでいればプロファイルを取るコンテキスト"""
+    if selector is None:
+        return _NoProfile()
+    return selector.scope(file_path)
+
+
+def batch_profile_for(selector, file_paths):
+    """selector が file_paths のいずれかを選んでいればバッチ全体のプロファイルを取るコンテキスト"""
+    if selector is None:
+        return _NoProfile()
+    return selector.batch_scope(file_paths)
+
+
+class _NoProfile:
+    report = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+class ProfileReport:
+    """1回分のプロファイルの出力先と概要"""
+
+    def __init__(self, label, paths, summary):
+        self.label = label
+        self.paths = paths  # 種類: パス
+        self.summary = summary
+
+    def format(self):
+        """ログ出力用の説明"""
+        files = ", ".join(self.paths[kind] for kind in ("speedscope", "torch_trace", "summary") if kind in self.paths)
+        return f"プロファイルを保存しました: {self.label} ({files})\n{self.summary}"
+
+
+class profile_scope:
+    """with の中の処理を cProfile と torch.profiler で計測し、終了時にファイルに書き出すコンテキスト
+
+    書き出した結果は report 属性 (ProfileReport) に入る。
+    別のスレッドで計測中の場合、cProfileは使わずにtorch.profilerだけで計測する。
+    """
+
+    def __init__(self, label, directory, torch_trace=True, top=DEFAULT_TOP_FUNCTIONS):
+        self.label = label
+        self.directory = directory
+        self.torch_trace = torch_trace
+        self.top = top
+        self.report = None
+        self._profiler = None
+        self._torch_profiler = None
+        self._started = None
+
+    def __enter__(self):
+        if _cprofile_lock.acquire(blocking=False):
+            self._profiler = cProfile.Profile()
+        else:
+            logger.warning(f"別のファイルのプロファイル中のため、cProfileは使いません: {self.label}")
+        if self.torch_trace:
+            self._torch_profiler = _start_torch_profiler()
+        self._started = time.perf_counter()
+        if self._profiler is not None:
+            self._profiler.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._profiler is not None:
+            self._profiler.disable()
+            _cprofile_lock.release()
+        elapsed = time.perf_counter() - self._started
+        if self._torch_profiler is not None:
+            self._torch_profiler.__exit__(None, None, None)
+        try:
+            self.report = self._write(elapsed)
+        except OSError as e:
+            logger.warning(f"プロファイルを保存できませんでした: {self.label} - {str(e)}")
+        return False
+
+    def _write(self, elapsed):
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        base = os.path.join(self.directory, f"{stamp}_{_safe_name(self.label)}")
+        paths = {}
+        sections = [f"# プロファイル: {self.label} ({elapsed:.2f}秒)"]
+        stats = pstats.Stats(self._profiler) if self._profiler is not None else None
+        if stats is not None:
+            paths["prof"] = f"{base}.prof"
+            stats.dump_stats(paths["prof"])
+            paths["speedscope"] = f"{base}.speedscope.json"
+            with open(paths["speedscope"], 'w', encoding='utf-8') as f:
+                json.dump(speedscope_profile(stats, self.label), f)
+            sections.append(format_hotspots(stats, self.top))
+        if self._torch_profiler is not None:
+            paths["torch_trace"] = f"{base}.torch.trace.json"
+            self._torch_profiler.export_chrome_trace(paths["torch_trace"])
+            sections.append(_format_torch_hotspots(self._torch_profiler, self.top))
+        summary = "\n\n".join(sections)
+        paths["summary"] = f"{base}.summary.txt"
+        with open(paths["summary"], 'w', encoding='utf-8') as f:
+            f.write(summary + "\n")
+        return ProfileReport(self.label, paths, _short_summary(stats, elapsed))
+
+
+def _safe_name(label):
+    """ファイル名に使えない文字を置き換える"""
+    return "".join(char if char.isalnum() or char in "-_." else "_" for char in label)
+
+
+def _start_torch_profiler():
+    """torch.profiler を開始して返す (torchがない場合はNone)"""
+    try:
+        import torch
+        from torch.profiler import ProfilerActivity, profile
+    except ImportError:
+        return None
+    activities = [ProfilerActivity.CPU]
+    if torch.cuda.is_available():
+        activities.append(ProfilerActivity.CUDA)
+    profiler = profile(activities=activities, record_shapes=True)
+    profiler.__enter__()
+    return profiler
+
+
+def _function_name(func):
+    file_name, line, name = func
+    if file_name == "~":
+        # 組み込み関数
+        return name
+    return f"{name} ({os.path.basename(file_name)}:{line})"
+
+
+def format_hotspots(stats, top=DEFAULT_TOP_FUNCTIONS):
+    """累積時間と自己時間の上位の関数を整形"""
+    lines = []
+    for title, key in (("累積時間の上位", 3), ("自己時間の上位", 2)):
+        lines.append(f"## {title}")
+        ranked = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:top]
+        for func, (_, calls, self_time, cumulative, _) in ranked:
+            lines.append(f"{cumulative:9.3f}秒 累積 {self_time:9.3f}秒 自己 {calls:9d}回  {_function_name(func)}")
+        lines.append("")
+    return "\n".join(lines).rstrip()
+
+
+def _format_torch_hotspots(profiler, top):
+    try:
+        table = profiler.key_averages().table(sort_by="self_cpu_time_total", row_limit=top)
+    except Exception as e:
+        return f"## torchの演算子\n(集計できませんでした: {str(e)})"
+    return f"## torchの演算子 (自己CPU時間の上位)\n{table}"
+
+
+def _short_summary(stats, elapsed, count=5):
+    """ログに出す、自己時間の上位数件"""
+    if stats is None:
+        return f"  経過 {elapsed:.2f}秒 (cProfileなし)"
+    ranked = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:count]
+    lines = [f"  経過 {elapsed:.2f}秒、自己時間の上位:"]
+    for func, (_, calls, self_time, _, _) in ranked:
+        share = self_time / elapsed * 100 if elapsed else 0.0
+        lines.append(f"    {self_time:.3f}秒 ({share:.0f}%) {_function_name(func)}")
+    return "\n".join(lines)
+
+
+def speedscope_profile(stats, name):
+    """cProfileの結果をspeedscopeのevented形式のフレームグラフに変換する
+
+    cProfileは呼び出し元と呼び出し先の組ごとの時間しか持たないため、ある関数の子の時間は
+    その関数全体の子の時間をこの経路の時間の割合で按分する (gprofと同じ近似)。
+    """
+    entries = stats.stats
+    children = {}  # 呼び出し元: [(呼び出し先, その呼び出し元からの累積時間)]
+    for func, (_, _, _, _, callers) in entries.items():
+        for caller, caller_stats in callers.items():
+            children.setdefault(caller, []).append((func, caller_stats[3]))
+    # 計測の開始時に実行中だった関数は記録されないため、記録された呼び出し元がない関数を根とする
+    roots = [func for func, entry in entries.items() if not any(caller in entries for caller in entry[4])]
+    total = sum(entries[func][3] for func in roots) or stats.total_tt
+
+    frames = []
+    frame_index = {}
+    events = []
+    min_seconds = total * MIN_FRAME_FRACTION
+
+    def frame(func):
+        if func not in frame_index:
+            file_name, line, function = func
+            frame_index[func] = len(frames)
+            entry = {"name": function if file_name == "~" else f"{function} ({os.path.basename(file_name)})"}
+            if file_name != "~":
+                entry["file"] = file_name
+                entry["line"] = line
+            frames.append(entry)
+        return frame_index[func]
+
+    def visit(func, seconds, at, path):
+        index = frame(func)
+        events.append({"type": "O", "frame": index, "at": at})
+        cumulative = entries[func][3]
+        scale = seconds / cumulative if cumulative else 0.0
+        offset = at
+        if len(path) < MAX_FRAME_DEPTH:
+            for child, child_seconds in sorted(children.get(func, ()), key=lambda item: -item[1]):
+                child_seconds *= scale
+                if child in path or child_seconds < min_seconds:
+                    continue
+                # 丸め誤差で親の範囲を超えないようにする
+                child_seconds = min(child_seconds, at + seconds - offset)
+                if child_seconds <= 0:
+                    break
+                path.add(child)
+                visit(child, child_seconds, offset, path)
+                path.discard(child)
+                offset += child_seconds
+        events.append({"type": "C", "frame": index, "at": at + seconds})
+
+    at = 0.0
+    for root in sorted(roots, key=lambda func: -entries[func][3]):
+        seconds = entries[root][3]
+        if seconds < min_seconds:
+            continue
+        visit(root, seconds, at, {root})
+        at += seconds
+
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "mp3-transcriber",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "evented",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0.0,
+            "endValue": at,
+            "events": events,
+        }],
+    }
@@ -0,0 +1,190 @@
+"""文字起こしの進捗の取得・集計・通知の間引き (PyQt5に依存しない)
+
+Whisperのtranscribeは処理済みのメルフレーム数をtqdmのプログレスバーで表示するだけなので、
+whisper.transcribe モジュールが参照する tqdm を差し替え、呼び出し元のスレッドに割合を通知する。
+"""
+import os
+import sys
+import time
+import logging
+import importlib
+import subprocess
+import threading
+from types import SimpleNamespace
+
+from mp3_probe import Mp3ProbeError, probe_mp3
+
+logger = logging.getLogger("MP3Transcriber")
+
+PROGRESS_INTERVAL_SECONDS = 0.1  # 進捗を通知する最短間隔
+ASSUMED_BITRATE_KBPS = 128  # 長さが分からないファイルはこのビットレートとみなしてサイズから見積もる
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_original_tqdm = None
+
+
+def probe_duration(file_path):
+    """音声の長さ (秒) を取得 (取得できない場合はNone)
+
+    MP3はフレームヘッダーから求め、それ以外とヘッダーを読めなかったファイルはffprobeを使う。
+    """
+    if file_path.lower().endswith(".mp3"):
+        try:
+            return probe_mp3(file_path).duration
+        except (Mp3ProbeError, OSError):
+            pass
+    cmd = [
+        "ffprobe", "-v", "error", "-show_entries", "format=duration",
+        "-of", "default=noprint_wrappers=1:nokey=1", file_path,
+    ]
+    try:
+        output = subprocess.run(cmd, capture_output=True, text=True, timeout=30, check=True).stdout
+        return float(output.strip())
+    except (OSError, ValueError, subprocess.SubprocessError):
+        logger.debug(f"音声の長さを取得できませんでした: {file_path}")
+        return None
+
+
+def estimate_duration_from_size(file_path):
+    """ファイルサイズから見積もった音声の長さ (秒)。ファイルを読めなければNone"""
+    try:
+        return os.path.getsize(file_path) * 8 / (ASSUMED_BITRATE_KBPS * 1000)
+    except OSError:
+        return None
+
+
+def estimate_audio_weights(file_paths):
+    """バッチ全体の進捗の重み付けに使う、ファイルごとの音声の長さの目安 (秒)
+
+    MP3はデコードせずにフレームヘッダーから長さを求め、求められない場合はファイルサイズから見積もる。
+    """
+    weights = {}
+    for path in file_paths:
+        duration = None
+        if path.lower().endswith(".mp3"):
+            try:
+                duration = probe_mp3(path).duration
+            except (Mp3ProbeError, OSError):
+                pass
+        weights[path] = duration if duration is not None else estimate_duration_from_size(path)
+    return weights
+
+
+class ThrottledProgress:
+    """整数の進捗値が変わり、かつ前回から min_interval 秒以上経った場合だけ callback を呼ぶ
+
+    0と100は間隔に関係なく必ず通知する。
+    """
+
+    def __init__(self, callback, min_interval=PROGRESS_INTERVAL_SECONDS):
+        self.callback = callback
+        self.min_interval = min_interval
+        self._last_value = None
+        self._last_time = 0.0
+
+    def __call__(self, value):
+        value = max(0, min(100, int(value)))
+        if value == self._last_value:
+            return
+        now = time.monotonic()
+        if value not in (0, 100) and now - self._last_time < self.min_interval:
+            return
+        self._last_value = value
+        self._last_time = now
+        self.callback(value)
+
+
+class BatchProgress:
+    """ファイルごとの進捗を、音声の長さで重み付けしたバッチ全体の進捗 (0〜100) にまとめる"""
+
+    def __init__(self, weights):
+        self._weights = {}
+        self._progress = {}
+        self._total = 1.0
+        self.extend(weights)
+
+    def extend(self, weights):
+        """ファイルを追加する (フォルダの走査中に開始したバッチの続き)"""
+        # 重みが分からないファイルは他のファイルの平均として扱う
+        known = [weight for weight in weights.values() if weight]
+        default = sum(known) / len(known) if known else 1.0
+        for path, weight in weights.items():
+            self._weights[path] = weight or default
+            self._progress.setdefault(path, 0)
+        self._total = sum(self._weights.values()) or 1.0
+
+    def update(self, path, value):
+        """ファイルの進捗を更新し、全体の進捗を返す"""
+        if path in self._progress:
+            self._progress[path] = max(self._progress[path], value)
+        return self.value
+
+    @property
+    def value(self):
+        done = sum(self._weights[path] * value / 100 for path, value in self._progress.items())
+        return int(done * 100 / self._total)
+
+
+class _CallbackBar:
+    """tqdmの代わりにupdate()された量を割合で通知するプログレスバー"""
+
+    def __init__(self, callback, total):
+        self._callback = callback
+        self.total = total
+        self.n = 0
+
+    def update(self, n=1):
+        self.n += n
+        if self.total:
+            self._callback(min(1.0, self.n / self.total))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def _make_bar(*args, **kwargs):
+    callback = getattr(_local, "callback", None)
+    if callback is None:
+        return _original_tqdm(*args, **kwargs)
+    return _CallbackBar(callback, kwargs.get("total"))
+
+
+def _install():
+    """whisper.transcribe が使う tqdm を差し替える (一度だけ)"""
+    global _original_tqdm
+    with _install_lock:
+        if _original_tqdm is not None:
+            return True
+        try:
+            import whisper  # noqa: F401 (whisper.transcribe モジュールを読み込む)
+            # whisper.transcribe は関数名でもあるため、モジュールはsys.modulesから取得する
+            module = sys.modules.get("whisper.transcribe") or importlib.import_module("whisper.transcribe")
+        except ImportError:
+            return False
+        _original_tqdm = module.tqdm.tqdm
+        module.tqdm = SimpleNamespace(tqdm=_make_bar)
+        return True
+
+
+class whisper_progress:
+    """このスレッドで実行するWhisperのtranscribeの進捗を callback(0.0〜1.0) で受け取るコンテキスト"""
+
+    def __init__(self, callback):
+        self.callback = callback
+        self._previous = None
+
+    def __enter__(self):
+        _install()
+        self._previous = getattr(_local, "callback", None)
+        _local.callback = self.callback
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _local.callback = self._previous
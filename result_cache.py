@@ -0,0 +1,168 @@
+"""音声ファイルの内容ハッシュをキーとする文字起こし結果のディスクキャッシュ
+
+キーは音声データのSHA-256、モデルサイズ、言語、デコードオプションから作るため、
+ファイル名や場所が変わっても内容が同じであれば推論を省略できる。
+"""
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_CACHE_DIR = os.path.join("cache", "results")
+DEFAULT_MAX_MB = 512
+CACHE_FORMAT_VERSION = 1
+
+
+# 同じファイルのハッシュを結果キャッシュと音声キャッシュで二度計算しないための記録
+_DIGEST_MEMO_SIZE = 4096
+_digest_memo = OrderedDict()  # (絶対パス, サイズ, 更新時刻): SHA-256
+_digest_memo_lock = threading.Lock()
+
+
+def file_digest(file_path, chunk_size=1024 * 1024):
+    """ファイル内容のSHA-256を返す (サイズと更新時刻が変わっていなければ前回の値を使う)"""
+    stat = os.stat(file_path)
+    memo_key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _digest_memo_lock:
+        if memo_key in _digest_memo:
+            _digest_memo.move_to_end(memo_key)
+            return _digest_memo[memo_key]
+
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    with _digest_memo_lock:
+        _digest_memo[memo_key] = digest.hexdigest()
+        if len(_digest_memo) > _DIGEST_MEMO_SIZE:
+            _digest_memo.popitem(last=False)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    """サイズ上限付きの文字起こし結果キャッシュ (古く使われていないものから破棄)"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def config(self):
+        """ワーカープロセスで同じキャッシュを開くための設定"""
+        return (self.cache_dir, self.max_bytes / (1024 * 1024))
+
+    def make_key(self, file_path, model_size, language, options):
+        """音声内容とモデル・デコード設定からキャッシュキーを作成"""
+        payload = json.dumps({
+            "version": CACHE_FORMAT_VERSION,
+            "audio": file_digest(file_path),
+            "model_size": model_size,
+            "language": language,
+            "options": options,
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def contains(self, key):
+        """キャッシュに結果があるか (統計とLRUの順序は変えない)"""
+        return os.path.exists(self._entry_path(key))
+
+    def get(self, key):
+        """キャッシュされた結果 (辞書) を返す。存在しない場合はNone"""
+        path = self._entry_path(key)
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+            # 最近使われたものとして更新時刻を進める (LRU)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """結果をキャッシュに保存 (一時ファイルに書いてから置き換える)"""
+        path = self._entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = sum(size for _, size, _ in self._scan())
+            else:
+                self._total_bytes += os.path.getsize(path)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan(self):
+        """(パス, サイズ, 更新時刻) の一覧を返す"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _evict(self):
+        """上限の9割に収まるまで古いエントリから削除 (ロック取得済みで呼ぶこと)"""
+        entries = sorted(self._scan(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            self.evictions += 1
+        self._total_bytes = total
+        logger.debug(f"結果キャッシュを整理しました: {total / (1024 * 1024):.1f} MB")
+
+    def reset_stats(self):
+        """バッチごとの統計をリセット"""
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def format_stats(self):
+        """キャッシュ統計をログ出力用の文字列に整形"""
+        with self._lock:
+            total = self.hits + self.misses
+            rate = self.hits / total * 100 if total else 0.0
+            return (f"結果キャッシュ: ヒット {self.hits}件 / ミス {self.misses}件 "
+                    f"(ヒット率 {rate:.0f}%, 破棄 {self.evictions}件)")
@@ -0,0 +1,80 @@
+"""音声の長さに基づくファイルの処理順の決定 (PyQt5に依存しない)
+
+ワーカープールでは、長いファイルが最後に投入されると他のワーカーはその終わりを待つだけになる。
+MP3のヘッダーから長さを求めて長いものから順に投入すると (LPT法)、バッチ全体の処理時間が短くなる。
+ヘッダーの確認で破損・途中で切れているとわかったファイルは、モデルの処理に入る前に除外する。
+"""
+import os
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from mp3_probe import Mp3ProbeError, probe_mp3
+from progress import estimate_duration_from_size
+
+logger = logging.getLogger("MP3Transcriber")
+
+# GUIの処理順の表示名と方針の対応
+SCHEDULE_MAP = {
+    "長い順 (推奨)": "longest",
+    "短い順": "shortest",
+    "選択順": "given",
+    "ファイル名順": "name",
+}
+SCHEDULE_POLICIES = tuple(SCHEDULE_MAP.values())
+DEFAULT_SCHEDULE_POLICY = "longest"
+PROBE_THREADS = 8  # ネットワーク共有上のファイルでも待ち時間が重なるよう、複数のスレッドで調べる
+
+
+def _probe(file_path):
+    """(長さ, 除外理由) を返す (MP3以外は調べずに (None, None))"""
+    if not file_path.lower().endswith(".mp3"):
+        return None, None
+    try:
+        return probe_mp3(file_path).duration, None
+    except Mp3ProbeError as e:
+        return None, str(e)
+    except OSError as e:
+        return None, f"ファイルを読み込めません: {str(e)}"
+
+
+def schedule_files(file_paths, policy=DEFAULT_SCHEDULE_POLICY):
+    """ファイルを policy の順に並べ替え、(処理順のファイル, {パス: 長さの目安 (秒)}, {パス: 除外理由}) を返す
+
+    長さがヘッダーから求められないファイルはファイルサイズから見積もる。
+    """
+    if policy not in SCHEDULE_POLICIES:
+        raise ValueError(f"未対応の処理順です: {policy}")
+    file_paths = list(file_paths)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=PROBE_THREADS) as executor:
+        probed = list(executor.map(_probe, file_paths))
+
+    durations = {}
+    rejected = {}
+    accepted = []
+    for file_path, (duration, reason) in zip(file_paths, probed):
+        if reason is not None:
+            rejected[file_path] = reason
+            continue
+        durations[file_path] = duration if duration is not None else estimate_duration_from_size(file_path)
+        accepted.append(file_path)
+    logger.debug(f"{len(file_paths)}ファイルの長さを調べました ({time.perf_counter() - start:.2f}秒)")
+
+    if policy == "longest":
+        # sorted は安定なので、同じ長さのファイルは元の順のまま
+        accepted.sort(key=lambda path: -(durations[path] or 0.0))
+    elif policy == "shortest":
+        accepted.sort(key=lambda path: durations[path] or 0.0)
+    elif policy == "name":
+        accepted.sort(key=lambda path: os.path.basename(path).lower())
+    return accepted, durations, rejected
+
+
+def format_schedule(file_paths, durations, policy):
+    """処理順の概要をログ出力用に整形"""
+    total = sum(durations.get(path) or 0.0 for path in file_paths)
+    longest = max((durations.get(path) or 0.0 for path in file_paths), default=0.0)
+    label = next(name for name, value in SCHEDULE_MAP.items() if value == policy)
+    return (f"処理順: {label} ({len(file_paths)}ファイル, 音声 合計 {total / 60:.1f}分, "
+            f"最長 {longest / 60:.1f}分)")
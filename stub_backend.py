@@ -0,0 +1,82 @@
+"""モデルの重みを使わないWhisperモデルの代替 (ベンチマーク・オフライン検証用)
+
+環境変数 MP3_TRANSCRIBER_BACKEND=stub を設定すると、ModelCache がWhisperの代わりにこのモデルをロードする
+(ワーカープロセスにも環境変数で引き継がれる)。推論時間は音声の長さに比例した待ち時間で模擬し、
+結果のテキストとタイムスタンプは音声の長さだけから決まるため、何度実行しても同じになる。
+"""
+import time
+import wave
+
+SAMPLE_RATE = 16000
+SEGMENT_SECONDS = 5.0  # 1セグメントの長さ
+
+# 音声1秒あたりの模擬推論時間 (秒)
+STUB_SECONDS_PER_AUDIO_SECOND = {
+    "tiny": 0.002,
+    "base": 0.004,
+    "small": 0.01,
+    "medium": 0.02,
+    "large": 0.04,
+}
+
+# 模擬ロード時間 (秒)
+STUB_LOAD_SECONDS = {
+    "tiny": 0.02,
+    "base": 0.04,
+    "small": 0.1,
+    "medium": 0.2,
+    "large": 0.4,
+}
+
+
+def read_wav_duration(file_path):
+    """WAVファイルを最後まで読み込み、長さ (秒) を返す (デコードの代わり)"""
+    with wave.open(file_path, 'rb') as f:
+        frames = 0
+        while True:
+            chunk = f.readframes(f.getframerate())
+            if not chunk:
+                break
+            frames += len(chunk) // (f.getsampwidth() * f.getnchannels())
+        return frames / f.getframerate()
+
+
+class StubWhisperModel:
+    """Whisperモデルと同じ transcribe を持ち、決定的な結果を返すモデル"""
+
+    def __init__(self, model_size, device="cpu"):
+        self.model_size = model_size
+        self.device = device
+        self.seconds_per_audio_second = STUB_SECONDS_PER_AUDIO_SECOND.get(model_size, 0.004)
+
+    def transcribe(self, audio, language=None, task="transcribe", verbose=False, **kwargs):
+        """音声 (ファイルパスまたは16kHzのサンプル列) を文字起こしした結果を模擬する"""
+        if isinstance(audio, str):
+            duration = read_wav_duration(audio)
+        else:
+            duration = len(audio) / SAMPLE_RATE
+        time.sleep(duration * self.seconds_per_audio_second)
+
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + SEGMENT_SECONDS)
+            segments.append({
+                "id": len(segments),
+                "start": start,
+                "end": end,
+                "text": f" セグメント{len(segments) + 1}。",
+                "avg_logprob": -0.25,
+            })
+            start = end
+        return {
+            "text": "".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "language": language or "ja",
+        }
+
+
+def load_stub_model(model_size, device, precision):
+    """ModelCache のローダーとして使う"""
+    time.sleep(STUB_LOAD_SECONDS.get(model_size, 0.04))
+    return StubWhisperModel(model_size, device)
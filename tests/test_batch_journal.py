@@ -0,0 +1,37 @@
+"""バッチジャーナル (batch_journal.BatchJournal) の再開とキーのテスト"""
+from batch_journal import DONE, QUEUED, BatchJournal
+
+SETTINGS = {"language": "ja", "model_size": "base"}
+
+
+def test_resume_skips_done_files(tmp_path):
+    files = [str(tmp_path / name) for name in ("a.mp3", "b.mp3")]
+    output = tmp_path / "a.txt"
+    output.write_text("a", encoding="utf-8")
+    journal = BatchJournal.open_for(files, SETTINGS, str(tmp_path / "journals"))
+    journal.record(files[0], DONE, output=str(output))
+    journal.record(files[1], QUEUED)
+
+    resumed = BatchJournal.open_for(list(reversed(files)), SETTINGS, str(tmp_path / "journals"))
+    assert resumed.pending_files(files) == [files[1]]
+    # 出力ファイルが消えていれば処理し直す
+    output.unlink()
+    assert resumed.pending_files(files) == files
+
+
+def test_folder_journal_covers_files_found_later(tmp_path):
+    folder = tmp_path / "audio"
+    first, later = str(folder / "a.mp3"), str(folder / "b.mp3")
+    journal_dir = str(tmp_path / "journals")
+    journal = BatchJournal.open_for_folder(str(folder), SETTINGS, journal_dir)
+    journal.record(first, DONE)
+    journal.record(later, DONE)
+
+    # 走査中に見つかった順に開始しても、同じフォルダ・設定であれば同じジャーナルになる
+    resumed = BatchJournal.open_for_folder(str(folder), SETTINGS, journal_dir)
+    assert resumed.path == journal.path
+    assert resumed.pending_files([first]) == []
+    assert resumed.pending_files([later]) == []
+    assert resumed.summary()[DONE] == 2
+    other = BatchJournal.open_for_folder(str(folder), {**SETTINGS, "model_size": "small"}, journal_dir)
+    assert other.path != journal.path
@@ -0,0 +1,29 @@
+"""スタブバックエンドでのベンチマーク (benchmark) のテスト
+
+ffmpegやモデルの重みがない環境でも、CLIと同じ経路 (run_batch) を最後まで通せることを確認する。
+"""
+import json
+
+import pytest
+
+import benchmark
+import model_cache
+from model_cache import BACKEND_ENV
+
+
+@pytest.fixture
+def stub_backend(monkeypatch):
+    # benchmark.main が書き換える環境変数とプロセス共有のモデルキャッシュを、テストの後に元に戻す
+    monkeypatch.setenv(BACKEND_ENV, "stub")
+    monkeypatch.setattr(model_cache, "_model_cache", None)
+
+
+def test_stub_benchmark_end_to_end(stub_backend, tmp_path):
+    output = tmp_path / "report.json"
+    code = benchmark.main([
+        "--backend", "stub", "--models", "tiny", "--workers", "1", "2", "--lengths", "5", "--files", "2",
+        "--audio-dir", str(tmp_path / "audio"), "--output", str(output), "--log-dir", str(tmp_path / "logs"),
+    ])
+    assert code == 0
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert [(scenario["workers"], scenario["files"]) for scenario in report["scenarios"]] == [(1, 2), (2, 2)]
@@ -0,0 +1,85 @@
+"""プリフェッチの待ち中の中止 (transcriber.transcribe_file / batched_inference) のテスト"""
+import threading
+import time
+
+import pytest
+
+from batched_inference import BatchedTranscriber
+from benchmark import generate_synthetic_wav
+from cancellation import CancellationToken, TranscriptionCancelled
+from model_cache import ModelCache
+from prefetch import AudioPrefetcher
+from transcriber import transcribe_file
+
+CANCEL_LATENCY_SECONDS = 1.0  # 中止は1秒以内に完了する
+
+
+@pytest.fixture
+def wav_path(tmp_path):
+    path = str(tmp_path / "a.wav")
+    generate_synthetic_wav(path, 2.0)
+    return path
+
+
+def _run_in_thread(target):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["result"] = target()
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+@pytest.mark.parametrize("close_prefetcher", [False, True])
+def test_cancel_while_waiting_for_prefetch(wav_path, close_prefetcher):
+    """デコード中のファイルを待っている推論スレッドが、中止要求 (と main.py の stop_prefetch) で終わる"""
+    decoded = threading.Event()
+    release = threading.Event()
+
+    def slow_decoder(path):
+        decoded.set()
+        release.wait(timeout=10.0)
+        return None
+
+    model_cache = ModelCache(backend="stub")
+    prefetcher = AudioPrefetcher([wav_path], decoder=slow_decoder)
+    token = CancellationToken()
+    try:
+        thread, outcome = _run_in_thread(lambda: transcribe_file(
+            wav_path, model_cache=model_cache, cancel_token=token, prefetcher=prefetcher
+        ))
+        assert decoded.wait(timeout=5.0)
+        time.sleep(0.2)
+        assert thread.is_alive()
+
+        start = time.perf_counter()
+        token.cancel()
+        if close_prefetcher:
+            prefetcher.close()
+        thread.join(timeout=CANCEL_LATENCY_SECONDS)
+        assert not thread.is_alive()
+        assert time.perf_counter() - start < CANCEL_LATENCY_SECONDS
+        assert isinstance(outcome.get("error"), TranscriptionCancelled)
+        # 借りたモデルはキャッシュに返却されている
+        assert all(entry["in_use"] == 0 for entry in model_cache.stats()["loaded"])
+    finally:
+        prefetcher.close()
+        release.set()
+
+
+def test_batched_cancel_while_waiting_for_prefetch_is_not_a_decode_error(wav_path):
+    """バッチ推論でプリフェッチを待っている間の中止は、デコードの失敗として報告せずに送出する"""
+    token = CancellationToken()
+    transcriber = BatchedTranscriber(model_cache=ModelCache(backend="stub"), cancel_token=token)
+
+    def decoder(path):
+        token.cancel()
+        token.raise_if_cancelled()
+
+    with pytest.raises(TranscriptionCancelled):
+        next(transcriber._transcribe_decoded([wav_path], decoder))
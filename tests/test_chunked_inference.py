@@ -0,0 +1,84 @@
+"""長時間ファイルの分割と繋ぎ合わせ (chunked_inference) のテスト"""
+import numpy as np
+import pytest
+
+from chunked_inference import OVERLAP_SECONDS, SAMPLE_RATE, _drop_seam_overlap, plan_chunks, stitch_chunks
+
+
+def _noise(seconds, silences=()):
+    """発話の代わりの雑音に、silences の (開始秒, 終了秒) の無音を入れた音声"""
+    audio = (np.random.default_rng(0).standard_normal(int(seconds * SAMPLE_RATE)) * 0.3).astype(np.float32)
+    for start, end in silences:
+        audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)] = 0
+    return audio
+
+
+def _result(segments, language="ja"):
+    return {"language": language,
+            "segments": [{"start": start, "end": end, "text": text} for start, end, text in segments]}
+
+
+def test_plan_chunks_cuts_in_the_longest_nearby_silence():
+    audio = _noise(100, silences=[(27, 29), (31, 34), (62, 63), (90, 100)])
+    chunks = plan_chunks(audio, 30, search_seconds=10)
+    # 1つ目の切れ目は目標 (30秒) の前後で最も長い 31〜34秒の無音の中央
+    assert len(chunks) == 3
+    assert chunks[0][0] == 0.0
+    assert chunks[0][1] == pytest.approx(32.5, abs=0.1)
+    assert chunks[1][1] == pytest.approx(62.5, abs=0.1)
+    assert chunks[2][1] == 100.0
+    # 無音で切ったチャンクは重ならない
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert start == end
+
+
+def test_plan_chunks_overlaps_without_silence():
+    chunks = plan_chunks(_noise(100), 30, search_seconds=10)
+    # 次の目標は重ねた分だけ手前から数える
+    half = OVERLAP_SECONDS / 2
+    assert chunks == [(0.0, 30 + half), (30 - half, 60), (60 - 2 * half, 100.0)]
+
+
+def test_plan_chunks_keeps_short_audio_whole():
+    assert plan_chunks(_noise(40), 30) == [(0.0, 40.0)]
+
+
+@pytest.mark.parametrize("previous, text, expected", [
+    # 空白で区切る言語は単語単位で、句読点と大文字小文字を無視して比べる
+    ("and then we went to the station", " went to the station, and bought tickets", " and bought tickets"),
+    # 空白のない言語は文字単位
+    ("今日は駅まで歩きました", "駅まで歩きました。それから", "。それから"),
+    # 短すぎる一致は偶然の繰り返しとみなして残す
+    ("it is", " is it ok", " is it ok"),
+    ("まったく別の話", "次の話題です", "次の話題です"),
+])
+def test_drop_seam_overlap(previous, text, expected):
+    assert _drop_seam_overlap(previous, text) == expected
+
+
+def test_stitch_chunks_shifts_timestamps_without_overlap():
+    chunks = [(0.0, 30.0), (30.0, 60.0)]
+    results = [_result([(0.0, 10.0, "一つ目"), (10.0, 29.0, "二つ目")]),
+               _result([(1.0, 20.0, "三つ目")])]
+    stitched = stitch_chunks(chunks, results)
+    assert [(s["start"], s["end"], s["text"]) for s in stitched["segments"]] == [
+        (0.0, 10.0, "一つ目"), (10.0, 29.0, "二つ目"), (31.0, 50.0, "三つ目")]
+    assert [s["id"] for s in stitched["segments"]] == [0, 1, 2]
+    assert stitched["text"] == "一つ目二つ目三つ目"
+    assert stitched["language"] == "ja"
+
+
+def test_stitch_chunks_drops_duplicates_at_overlapping_seam():
+    # 28〜32秒が重なり、繋ぎ目 (中央) は30秒
+    chunks = [(0.0, 32.0), (28.0, 60.0)]
+    results = [
+        _result([(0.0, 25.0, "最初の文です"), (25.0, 29.5, "駅まで歩きました"), (30.5, 32.0, "それか")]),
+        _result([(0.0, 1.0, "きました"), (1.5, 4.0, "駅まで歩きました。それから"), (4.0, 10.0, "電車に乗りました")]),
+    ]
+    stitched = stitch_chunks(chunks, results)
+    texts = [segment["text"] for segment in stitched["segments"]]
+    # 繋ぎ目より後にある前のチャンクのセグメントと、繋ぎ目より前にある次のチャンクのセグメントを捨て、残った重複を取り除く
+    assert texts == ["最初の文です", "駅まで歩きました", "。それから", "電車に乗りました"]
+    starts = [segment["start"] for segment in stitched["segments"]]
+    assert starts == sorted(starts)
+    assert stitched["segments"][2]["start"] == pytest.approx(29.5)
@@ -0,0 +1,26 @@
+"""実行計画の候補 (execution_planner.candidate_splits) のテスト"""
+import pytest
+
+from execution_planner import candidate_splits
+
+
+@pytest.mark.parametrize("cpus, expected", [
+    (1, [(1, 1)]),
+    (8, [(1, 8), (2, 4), (4, 2), (8, 1)]),
+    # ワーカー数は倍々に増やし、最後はコア数に合わせる
+    (6, [(1, 6), (2, 3), (4, 1), (6, 1)]),
+])
+def test_candidates_cover_cores(cpus, expected):
+    assert candidate_splits("base", cpus=cpus) == expected
+
+
+def test_candidates_fit_in_memory():
+    # base は1ワーカーあたり約690MB (モデル290MB + 400MB)。2000MBの8割に収まるのは2ワーカーまで
+    assert candidate_splits("base", cpus=8, memory_mb=2000) == [(1, 8), (2, 4)]
+    # メモリが足りなくても1ワーカーは計測する
+    assert candidate_splits("base", cpus=8, memory_mb=100) == [(1, 8)]
+
+
+def test_int8_allows_more_workers():
+    assert candidate_splits("large", cpus=8, memory_mb=16000) == [(1, 8)]
+    assert candidate_splits("large", "int8", cpus=8, memory_mb=16000) == [(1, 8), (2, 4), (4, 2)]
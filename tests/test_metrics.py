@@ -0,0 +1,47 @@
+"""段階別の所要時間 (metrics.Histogram / StageTimings) の集計と受け渡しのテスト"""
+import json
+
+import pytest
+
+from metrics import Histogram, StageTimings
+
+
+def test_histogram_cumulative_and_quantile():
+    histogram = Histogram([0.1, 1.0, 10.0])
+    for value in (0.05, 0.5, 0.5, 5.0, 50.0):
+        histogram.observe(value)
+    assert list(histogram.cumulative()) == [(0.1, 1), (1.0, 3), (10.0, 4), (float("inf"), 5)]
+    assert histogram.quantile(0.5) == 1.0
+    # 最後のバケットは最大の上限値を返す
+    assert histogram.quantile(1.0) == 10.0
+    assert histogram.sum == pytest.approx(56.05)
+
+
+def test_histogram_round_trip_through_json():
+    histogram = Histogram([0.1, 1.0, 10.0])
+    for value in (0.05, 0.5, 5.0, 50.0):
+        histogram.observe(value)
+    restored = Histogram.from_dict(json.loads(json.dumps(histogram.to_dict())))
+    assert restored.bounds == histogram.bounds
+    assert restored.counts == histogram.counts
+    assert restored.sum == histogram.sum
+    assert restored.count == histogram.count
+
+
+def test_stage_timings_round_trip_and_merge():
+    timings = StageTimings()
+    timings.add("audio_decode", 0.5)
+    timings.add("inference", 2.0)
+    timings.add("inference", 3.0)
+    timings.audio_seconds = 10.0
+    timings.wall_seconds = 6.0
+    restored = StageTimings.from_dict(json.loads(json.dumps(timings.to_dict())))
+    assert restored.total("inference") == 5.0
+    assert restored.stages["inference"].count == 2
+    assert restored.rtf == pytest.approx(0.6)
+
+    restored.merge(timings)
+    assert restored.total("inference") == 10.0
+    assert restored.total("audio_decode") == 1.0
+    # 経過時間と音声の長さは足さない
+    assert restored.wall_seconds == 6.0
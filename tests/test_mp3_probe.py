@@ -0,0 +1,95 @@
+"""MP3のヘッダーからの長さの取得 (mp3_probe) と長さに基づく処理順 (scheduler) のテスト"""
+import struct
+
+import pytest
+
+from mp3_probe import Mp3ProbeError, probe_mp3
+from scheduler import schedule_files
+
+# MPEG1 レイヤー3, 128kbps, 44.1kHz, ステレオ, パディングなし
+HEADER = b"\xff\xfb\x90\x00"
+FRAME_BYTES = 144 * 128000 // 44100  # 417
+FRAME_SECONDS = 1152 / 44100
+
+
+def _frame(body=b""):
+    return HEADER + body + b"\x00" * (FRAME_BYTES - len(HEADER) - len(body))
+
+
+def _xing_frame(frames, byte_count):
+    # ステレオのMPEG1ではサイド情報 (32バイト) の後にタグが置かれる
+    return _frame(b"\x00" * 32 + b"Xing" + struct.pack(">III", 0x03, frames, byte_count))
+
+
+def _id3v2(size):
+    syncsafe = bytes([(size >> shift) & 0x7F for shift in (21, 14, 7, 0)])
+    return b"ID3\x04\x00\x00" + syncsafe + b"\x00" * size
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_cbr_duration_from_size(tmp_path):
+    path = _write(tmp_path, "cbr.mp3", _frame() * 200)
+    info = probe_mp3(path)
+    assert not info.vbr
+    assert info.sample_rate == 44100
+    assert info.bitrate == 128
+    assert info.duration == pytest.approx(200 * FRAME_SECONDS, rel=0.01)
+
+
+def test_xing_tag_frame_count(tmp_path):
+    frames = 150
+    data = _xing_frame(frames, (frames + 1) * FRAME_BYTES) + _frame() * frames
+    info = probe_mp3(_write(tmp_path, "vbr.mp3", _id3v2(300) + data))
+    assert info.vbr
+    assert info.frames == frames
+    assert info.duration == pytest.approx(frames * FRAME_SECONDS)
+
+
+def test_truncated_against_xing_tag(tmp_path):
+    frames = 150
+    data = _xing_frame(frames, (frames + 1) * FRAME_BYTES) + _frame() * (frames // 2)
+    with pytest.raises(Mp3ProbeError, match="途中で切れています"):
+        probe_mp3(_write(tmp_path, "short.mp3", data))
+
+
+def test_truncated_last_frame(tmp_path):
+    data = _frame() * 100 + _frame()[:200]
+    with pytest.raises(Mp3ProbeError, match="最後のフレーム"):
+        probe_mp3(_write(tmp_path, "cut.mp3", data))
+
+
+def test_not_an_mp3(tmp_path):
+    with pytest.raises(Mp3ProbeError, match="MPEGフレームが見つかりません"):
+        probe_mp3(_write(tmp_path, "text.mp3", b"not an mp3 file\n" * 100))
+
+
+def test_schedule_longest_first_and_rejects_broken(tmp_path):
+    short = _write(tmp_path, "b_short.mp3", _frame() * 50)
+    long = _write(tmp_path, "c_long.mp3", _frame() * 300)
+    middle = _write(tmp_path, "a_middle.mp3", _frame() * 150)
+    broken = _write(tmp_path, "broken.mp3", _frame() * 100 + _frame()[:200])
+    # MP3以外は調べずにファイルサイズから見積もる
+    other = _write(tmp_path, "d_other.wav", b"\x00" * 1000)
+
+    accepted, durations, rejected = schedule_files([short, broken, other, long, middle], "longest")
+    assert accepted == [long, middle, short, other]
+    assert list(rejected) == [broken]
+    assert durations[long] == pytest.approx(300 * FRAME_SECONDS, rel=0.01)
+    assert durations[other] > 0
+
+    accepted, _, _ = schedule_files([short, long, middle], "shortest")
+    assert accepted == [short, middle, long]
+    accepted, _, _ = schedule_files([short, long, middle], "name")
+    assert accepted == [middle, short, long]
+    accepted, _, _ = schedule_files([short, long, middle], "given")
+    assert accepted == [short, long, middle]
+
+
+def test_schedule_unknown_policy():
+    with pytest.raises(ValueError):
+        schedule_files([], "random")
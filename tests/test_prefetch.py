@@ -0,0 +1,106 @@
+"""プリフェッチ段 (prefetch.AudioPrefetcher) のテスト"""
+import threading
+import time
+
+import pytest
+
+from cancellation import CancellationToken, TranscriptionCancelled
+from prefetch import AudioPrefetcher
+
+
+class BlockingDecoder:
+    """release() されるまでデコードが終わらないデコーダ"""
+
+    def __init__(self):
+        self.started = threading.Event()
+        self._release = threading.Event()
+
+    def __call__(self, path):
+        self.started.set()
+        self._release.wait(timeout=10.0)
+        return f"audio:{path}"
+
+    def release(self):
+        self._release.set()
+
+
+def _take_in_thread(prefetcher, path, cancel_token=None):
+    outcome = {}
+
+    def run():
+        try:
+            outcome["audio"] = prefetcher.take(path, cancel_token)
+        except Exception as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def test_take_returns_audio_in_order_and_skips():
+    prefetcher = AudioPrefetcher(["a", "b", "c"], decoder=lambda path: f"audio:{path}",
+                                 skip=lambda path: path == "b")
+    with prefetcher:
+        assert prefetcher.take("a") == "audio:a"
+        assert prefetcher.take("b") is None
+        assert prefetcher.take("c") == "audio:c"
+        # 対象外のファイル
+        assert prefetcher.take("d") is None
+    assert prefetcher.decoded == 2
+
+
+def test_take_discards_files_that_were_not_taken():
+    with AudioPrefetcher(["a", "b", "c"], decoder=lambda path: f"audio:{path}") as prefetcher:
+        assert prefetcher.take("c") == "audio:c"
+        assert prefetcher.take("a") is None
+
+
+def test_decode_error_is_raised_on_take():
+    def decoder(path):
+        raise OSError(f"broken: {path}")
+
+    with AudioPrefetcher(["a"], decoder=decoder) as prefetcher:
+        with pytest.raises(OSError, match="broken: a"):
+            prefetcher.take("a")
+
+
+def test_close_wakes_blocked_consumer():
+    decoder = BlockingDecoder()
+    prefetcher = AudioPrefetcher(["a", "b"], decoder=decoder)
+    try:
+        assert decoder.started.wait(timeout=5.0)
+        thread, outcome = _take_in_thread(prefetcher, "a")
+        time.sleep(0.2)
+        assert thread.is_alive()
+
+        start = time.perf_counter()
+        prefetcher.close()
+        thread.join(timeout=2.0)
+        assert not thread.is_alive()
+        assert time.perf_counter() - start < 2.0
+        assert outcome == {"audio": None}
+        # 閉じた後の take() も待たずに返る
+        assert prefetcher.take("b") is None
+    finally:
+        decoder.release()
+
+
+def test_cancel_token_interrupts_blocked_consumer():
+    decoder = BlockingDecoder()
+    prefetcher = AudioPrefetcher(["a"], decoder=decoder)
+    token = CancellationToken()
+    try:
+        assert decoder.started.wait(timeout=5.0)
+        thread, outcome = _take_in_thread(prefetcher, "a", token)
+        time.sleep(0.2)
+
+        start = time.perf_counter()
+        token.cancel()
+        thread.join(timeout=1.0)
+        assert not thread.is_alive()
+        assert time.perf_counter() - start < 1.0
+        assert isinstance(outcome.get("error"), TranscriptionCancelled)
+    finally:
+        prefetcher.close()
+        decoder.release()
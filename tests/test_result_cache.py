@@ -0,0 +1,66 @@
+"""文字起こし結果キャッシュ (result_cache.ResultCache) のキーと保存のテスト"""
+import os
+
+import pytest
+
+from result_cache import ResultCache
+from transcriber import transcription_cache_key
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResultCache(str(tmp_path / "cache"), max_mb=1)
+
+
+def _write(tmp_path, name, data):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def test_key_depends_on_content_not_path(cache, tmp_path):
+    first = _write(tmp_path, "a.mp3", b"audio-1")
+    copy = _write(tmp_path, "copy.mp3", b"audio-1")
+    other = _write(tmp_path, "b.mp3", b"audio-22")
+    key = cache.make_key(first, "base", "ja", {})
+    assert cache.make_key(copy, "base", "ja", {}) == key
+    assert cache.make_key(other, "base", "ja", {}) != key
+    assert cache.make_key(first, "small", "ja", {}) != key
+    assert cache.make_key(first, "base", "en", {}) != key
+    assert cache.make_key(first, "base", "ja", {"vad": True}) != key
+
+
+def test_transcription_keys_separate_modes(cache, tmp_path):
+    path = _write(tmp_path, "a.mp3", b"audio")
+    key = transcription_cache_key(cache, path, "ja", "base")
+    assert transcription_cache_key(cache, path, "ja", "base", precision="fp32") == key
+    variants = [
+        transcription_cache_key(cache, path, "ja", "base", streaming=True),
+        transcription_cache_key(cache, path, "ja", "base", vad=True),
+        transcription_cache_key(cache, path, "ja", "base", batched=True),
+        transcription_cache_key(cache, path, "ja", "base", split=True),
+        transcription_cache_key(cache, path, "ja", "base", precision="int8"),
+    ]
+    assert len({key, *variants}) == len(variants) + 1
+
+
+def test_put_and_get(cache, tmp_path):
+    key = cache.make_key(_write(tmp_path, "a.mp3", b"audio"), "base", "ja", {})
+    assert cache.get(key) is None
+    assert not cache.contains(key)
+    cache.put(key, {"text": "こんにちは", "segments": []})
+    assert cache.contains(key)
+    assert cache.get(key) == {"text": "こんにちは", "segments": []}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"), max_mb=0.01)  # 約10KB
+    keys = [f"{index:064x}" for index in range(4)]
+    for age, key in enumerate(keys):
+        cache.put(key, {"text": "x" * 3000})
+        # 書き込みの順に古い更新時刻にする
+        os.utime(cache._entry_path(key), (1000 + age, 1000 + age))
+    assert not cache.contains(keys[0])
+    assert cache.contains(keys[-1])
+    assert cache.evictions >= 1
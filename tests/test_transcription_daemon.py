@@ -0,0 +1,80 @@
+"""常駐プロセスの起動の排他 (transcription_daemon.DaemonLock / connect_daemon) のテスト"""
+import threading
+
+import pytest
+
+import transcription_daemon
+from model_cache import ModelCache
+from transcription_daemon import DaemonError, DaemonLock, DaemonServer, TranscriptionDaemon, read_state, write_state
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "daemon" / "daemon.json")
+
+
+@pytest.fixture
+def launches(monkeypatch):
+    """launch_daemon の呼び出しを記録する (実際には起動しない)"""
+    calls = []
+
+    def launch_daemon(state_path, *args, **kwargs):
+        calls.append(state_path)
+        raise AssertionError("常駐プロセスを起動してはいけません")
+
+    monkeypatch.setattr(transcription_daemon, "launch_daemon", launch_daemon)
+    return calls
+
+
+def test_lock_is_exclusive(state_path):
+    first = DaemonLock(state_path)
+    second = DaemonLock(state_path)
+    assert first.acquire()
+    try:
+        assert not second.acquire()
+        assert second.held_elsewhere()
+    finally:
+        first.release()
+    assert not second.held_elsewhere()
+    assert second.acquire()
+    second.release()
+
+
+def test_main_exits_when_another_daemon_holds_the_lock(state_path, tmp_path):
+    lock = DaemonLock(state_path)
+    assert lock.acquire()
+    try:
+        code = transcription_daemon.main(["--state-file", state_path, "--log-dir", str(tmp_path / "logs"),
+                                          "--no-cache", "--audio-cache-dir", str(tmp_path / "audio")])
+    finally:
+        lock.release()
+    assert code == 0
+    # 待ち受けを始めていないため状態ファイルは書かれない
+    assert read_state(state_path) is None
+
+
+def test_connect_reuses_daemon_started_by_another_client(state_path, launches):
+    """起動中の常駐プロセス (ロックを保持している) があれば、起動せずに待ち受けの開始を待って接続する"""
+    lock = DaemonLock(state_path)
+    assert lock.acquire()
+    server = DaemonServer(TranscriptionDaemon(model_cache=ModelCache(backend="stub")))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    # 起動中 (ロックを取得してから状態ファイルを書くまで) の常駐プロセスを模す
+    timer = threading.Timer(0.5, write_state, (state_path, server.url, server.token))
+    timer.start()
+    try:
+        client = transcription_daemon.connect_daemon(state_path, timeout=5.0)
+        assert client.url == server.url
+        assert client.health()["backend"] == "stub"
+    finally:
+        timer.cancel()
+        server.shutdown()
+        server.server_close()
+        lock.release()
+    assert launches == []
+
+
+def test_connect_without_launch_raises(state_path, launches):
+    with pytest.raises(DaemonError):
+        transcription_daemon.connect_daemon(state_path, launch=False)
+    assert launches == []
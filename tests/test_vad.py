@@ -0,0 +1,45 @@
+"""発話区間の検出 (vad) とストリーミング処理でのスキップ量の集計のテスト"""
+import numpy as np
+import pytest
+
+from audio_stream import transcribe_streaming
+from stub_backend import StubWhisperModel
+from vad import SAMPLE_RATE, SpeechTimeline, detect_speech
+
+
+def _speech_with_pauses(seconds):
+    """4秒の発話 (雑音) と1秒の無音を繰り返す音声"""
+    audio = (np.random.default_rng(0).standard_normal(int(seconds * SAMPLE_RATE)) * 0.3).astype(np.float32)
+    for start in range(0, int(seconds), 5):
+        audio[(start + 4) * SAMPLE_RATE:(start + 5) * SAMPLE_RATE] = 0
+    return audio
+
+
+def test_timeline_maps_compact_times_to_original():
+    timeline = SpeechTimeline([(1.0, 3.0), (5.0, 6.0)])
+    assert timeline.speech_seconds == 3.0
+    assert timeline.to_original(0.5) == 1.5
+    assert timeline.to_original(2.5) == 5.5
+    # 区間の境界にある終了時刻は前の区間の終わり
+    assert timeline.to_original(2.0, is_end=True) == pytest.approx(3.0)
+    assert timeline.to_original(2.0) == 5.0
+
+
+def test_timeline_speech_seconds_after():
+    timeline = SpeechTimeline([(1.0, 3.0), (5.0, 6.0)])
+    assert timeline.speech_seconds_after(0.0) == 3.0
+    assert timeline.speech_seconds_after(2.0) == 2.0
+    assert timeline.speech_seconds_after(4.0) == 1.0
+    assert timeline.speech_seconds_after(7.0) == 0.0
+
+
+def test_streaming_vad_counts_carried_audio_once():
+    """次のウィンドウに持ち越した音声の発話を二重に数えない"""
+    audio = _speech_with_pauses(100)
+    result = transcribe_streaming(StubWhisperModel("tiny"), "speech.wav", {"language": "ja"}, vad=True, audio=audio)
+    expected = SpeechTimeline(detect_speech(audio)).speech_seconds
+    stats = result["vad"]
+    assert stats["total_seconds"] == pytest.approx(100.0)
+    # ウィンドウの境界で発話区間の余白が変わる分だけずれる
+    assert stats["speech_seconds"] == pytest.approx(expected, abs=1.0)
+    assert stats["skipped_seconds"] == pytest.approx(stats["total_seconds"] - stats["speech_seconds"])
@@ -0,0 +1,77 @@
+"""長時間ファイルの分割処理 (worker_pool._SplitJob) のチャンクの失敗時の後始末のテスト"""
+import os
+import queue
+import threading
+import types
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import pytest
+
+import worker_pool
+from metrics import StageTimings
+
+CHUNKS = [(0.0, 10.0), (10.0, 20.0), (20.0, 30.0), (30.0, 40.0)]
+
+
+@pytest.fixture
+def audio_path(tmp_path):
+    path = tmp_path / "split.npy"
+    path.write_bytes(b"")
+    return str(path)
+
+
+def _run_split_job(audio_path, workers):
+    """スレッドのプールで _SplitJob を動かす (ワーカープロセスの代わり)"""
+    pool = types.SimpleNamespace(_executor=ThreadPoolExecutor(max_workers=workers), _events=queue.Queue())
+    job = worker_pool._SplitJob(pool, "long.mp3", "ja", "base", False, "fp32", None, None)
+    timings = StageTimings()
+    timings.wall_seconds = 0.0
+    prepare_future = Future()
+    prepare_future.set_result((audio_path, CHUNKS, timings))
+    job.prepared(prepare_future)
+    return pool, job
+
+
+def test_failed_chunk_cancels_pending_chunks(monkeypatch, audio_path):
+    started = []
+
+    def transcribe_chunk_task(file_path, audio_path, start, end, *args):
+        started.append(start)
+        if start == 0.0:
+            raise RuntimeError("チャンクの推論に失敗")
+        return {"segments": [], "timings": StageTimings()}
+
+    monkeypatch.setattr(worker_pool, "_transcribe_chunk_task", transcribe_chunk_task)
+    pool, job = _run_split_job(audio_path, workers=1)
+    with pytest.raises(RuntimeError):
+        job.future.result(timeout=5.0)
+    pool._executor.shutdown(wait=True)
+    # 失敗したチャンクの後に待っていたチャンクは推論しない
+    assert started == [0.0]
+    assert not os.path.exists(audio_path)
+
+
+def test_temp_audio_is_removed_after_the_last_running_chunk(monkeypatch, audio_path):
+    second_started = threading.Event()
+    release = threading.Event()
+    started = []
+
+    def transcribe_chunk_task(file_path, audio_path, start, end, *args):
+        started.append(start)
+        if start == 0.0:
+            second_started.wait(timeout=5.0)
+            raise RuntimeError("チャンクの推論に失敗")
+        second_started.set()
+        release.wait(timeout=5.0)
+        return {"segments": [], "timings": StageTimings()}
+
+    monkeypatch.setattr(worker_pool, "_transcribe_chunk_task", transcribe_chunk_task)
+    pool, job = _run_split_job(audio_path, workers=2)
+    with pytest.raises(RuntimeError):
+        job.future.result(timeout=5.0)
+    # 処理中のチャンクが一時ファイルを読んでいる間は削除しない
+    assert os.path.exists(audio_path)
+    release.set()
+    pool._executor.shutdown(wait=True)
+    assert sorted(started) == [0.0, 10.0]
+    assert not os.path.exists(audio_path)
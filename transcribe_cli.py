@@ -0,0 +1,514 @@
+"""GUIを使わないバッチ文字起こし用のコマンドラインエントリポイント
+
+PyQt5をインポートしないため、ディスプレイのないサーバーやcronから実行できる。
+
+使用例:
+    python -m transcribe_cli recordings/ "archive/**/*.mp3" --language ja --model small --format json --workers 4
+"""
+import os
+import sys
+import glob
+import time
+import logging
+import argparse
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from batched_inference import BatchedTranscriber
+from audio_cache import DEFAULT_AUDIO_CACHE_DIR, DEFAULT_AUDIO_CACHE_MAX_MB, AudioCache
+from batch_journal import DEFAULT_JOURNAL_DIR, DONE, FAILED, QUEUED, RUNNING, BatchJournal
+from chunked_inference import SPLIT_MIN_SECONDS, should_split
+from execution_planner import DEFAULT_PLAN_PATH, PlanStore, calibrate, set_torch_threads
+from file_scanner import iter_audio_files
+from log_config import setup_logging
+from metrics import DEFAULT_METRICS_DIR, MetricsRecorder
+from output_writer import OUTPUT_FORMATS, AsyncOutputWriter
+from prefetch import DEFAULT_PREFETCH_DEPTH, AudioPrefetcher
+from profiling import ProfileSelector, batch_profile_for, default_profile_dir, profile_for
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, ResultCache
+from scheduler import DEFAULT_SCHEDULE_POLICY, SCHEDULE_POLICIES, format_schedule, schedule_files
+from model_cache import SUPPORTED_PRECISIONS, get_model_cache
+from transcriber import (LANGUAGE_MAP, MODEL_SIZES, TranscriptionError, TranscriptionListener,
+                         cached_result_skipper, format_timestamp, lookup_cached_transcription,
+                         transcribe_file)
+from transcription_daemon import DaemonError, connect_daemon
+from worker_pool import TranscriptionPool
+
+logger = logging.getLogger("MP3Transcriber")
+
+LANGUAGE_CHOICES = tuple(LANGUAGE_MAP.values())
+
+
+def collect_input_files(inputs):
+    """ファイル・フォルダ・globパターンからMP3ファイルの一覧を作成 (入力順を維持し重複を除く)"""
+    files = []
+    seen = set()
+
+    def add(path):
+        key = os.path.abspath(path)
+        if key not in seen:
+            seen.add(key)
+            files.append(path)
+
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            # フォルダごとにファイル名順 (上位のフォルダが先)
+            for path in sorted(iter_audio_files(pattern), key=lambda path: os.path.split(path)):
+                add(path)
+        elif os.path.isfile(pattern):
+            add(pattern)
+        else:
+            matches = sorted(glob.glob(pattern, recursive=True))
+            if not matches:
+                logger.warning(f"該当するファイルがありません: {pattern}")
+            for path in matches:
+                if os.path.isfile(path) and path.lower().endswith('.mp3'):
+                    add(path)
+    return files
+
+
+class _SegmentLogger(TranscriptionListener):
+    """ストリーミング処理で確定したセグメントをログに出力"""
+
+    def __init__(self, file_path):
+        self.file_name = os.path.basename(file_path)
+
+    def segment(self, start, end, text):
+        _log_segment(self.file_name, start, end, text)
+
+
+class _DaemonLogger(_SegmentLogger):
+    """常駐プロセスから届いたログメッセージとセグメントを出力"""
+
+    def log(self, message):
+        logger.info(message)
+
+
+def _log_segment(file_name, start, end, text):
+    logger.debug(f"[{file_name} {format_timestamp(start)} - {format_timestamp(end)}] {text.strip()}")
+
+
+def _log_pool_events(pool, journal=None, started=None):
+    """ワーカーから届いたログメッセージとセグメントを出力"""
+    for file_path, kind, value in pool.drain_events():
+        if journal is not None and file_path not in started:
+            # ワーカーから最初のイベントが届いた時点で処理中とみなす
+            started.add(file_path)
+            journal.record(file_path, RUNNING)
+        if kind == "log":
+            logger.info(value)
+        elif kind == "segment":
+            _log_segment(os.path.basename(file_path), *value)
+
+
+def _profiled(profile, run):
+    """profile (プロファイルのコンテキスト) の中で run() を実行し、プロファイルを取った場合は概要をログに出す"""
+    try:
+        with profile:
+            return run()
+    finally:
+        if profile.report is not None:
+            logger.info(profile.report.format())
+
+
+def _raise_or_return(value, error):
+    if error is not None:
+        raise error
+    return value
+
+
+def run_batch(files, language, model_size, output_format, output_dir, workers=1, threads_per_worker=None,
+              streaming=False, result_cache=None, journal=None, vad=False, batch_size=1, precision="fp32",
+              audio_cache=None, prefetch_depth=DEFAULT_PREFETCH_DEPTH, split_min_seconds=None, metrics=None,
+              profiler=None, daemon=None):
+    """ファイル一覧を処理し、(成功したファイル, 失敗したファイル) を返す
+
+    結果の保存は書き出しスレッドで行うため、次のファイルの推論と前のファイルの保存が並行する。
+    audio_cache を指定するとデコード済みの音声を再利用する。
+    prefetch_depth 件先までのファイルを推論中にデコードしておく (0で無効、ワーカープールでは使わない)。
+    split_min_seconds を指定すると、ワーカープールではこの長さ以上のファイルを無音の位置で分割し、
+    チャンクごとに並列に処理する。
+    ワーカー1つの場合、threads_per_worker はこのプロセスのtorchのスレッド数として使う。
+    metrics (MetricsRecorder) を指定すると、ファイルごとの段階別の所要時間を記録する。
+    profiler (ProfileSelector) が選んだファイルはcProfileとtorch.profilerでプロファイルを取る
+    (バッチ推論ではバッチ全体、分割処理するファイルは対象外)。
+    daemon (DaemonClient) を指定すると、常駐プロセスに処理を依頼してそのロード済みのモデルを使う
+    (workers / batch_size / prefetch_depth / profiler は使わず、キャッシュは常駐プロセス側のものを使う)。
+    """
+    succeeded = []
+    failed = []
+
+    def on_saved(file_path, saved_path):
+        logger.info(f"保存完了: {saved_path}")
+        succeeded.append(file_path)
+        if journal is not None:
+            journal.record(file_path, DONE, output=saved_path)
+
+    def on_failed(file_path, error):
+        if isinstance(error, TranscriptionError):
+            logger.error(f"{error.title}: {os.path.basename(file_path)} - {error.message}")
+            message = error.message
+        else:
+            logger.error(f"エラー: {os.path.basename(file_path)} - {str(error)}")
+            message = str(error)
+        failed.append(file_path)
+        if journal is not None:
+            journal.record(file_path, FAILED, error=message)
+
+    if journal is not None:
+        for file_path in files:
+            journal.record(file_path, QUEUED)
+
+    with AsyncOutputWriter(output_dir, output_format, metrics=metrics) as writer:
+        def on_done(file_path, get_result):
+            try:
+                result = get_result()
+            except Exception as e:
+                if metrics is not None:
+                    metrics.record_failure(file_path, getattr(e, "message", e))
+                on_failed(file_path, e)
+                return
+            writer.submit(file_path, result, on_saved=on_saved, on_failed=on_failed)
+
+        if daemon is None and workers <= 1 and threads_per_worker:
+            set_torch_threads(threads_per_worker)
+        if daemon is not None:
+            _run_daemon(files, language, model_size, streaming, result_cache, journal, vad, precision, audio_cache,
+                        daemon, on_done)
+        elif batch_size > 1:
+            _run_batched(files, language, model_size, batch_size, result_cache, journal, precision, audio_cache,
+                         prefetch_depth, on_done, profiler)
+        elif workers <= 1:
+            _run_serial(files, language, model_size, streaming, result_cache, journal, vad, precision, audio_cache,
+                        prefetch_depth, on_done, profiler)
+        else:
+            _run_pool(files, language, model_size, workers, threads_per_worker, streaming, result_cache, journal,
+                      vad, precision, audio_cache, split_min_seconds, on_done, profiler)
+    if writer.blocked_seconds:
+        logger.info(f"書き出し待ちの合計時間: {writer.blocked_seconds:.1f}秒")
+    return succeeded, failed
+
+
+def _run_batched(files, language, model_size, batch_size, result_cache, journal, precision, audio_cache,
+                 prefetch_depth, on_done, profiler=None):
+    """複数ファイルのウィンドウをまとめてエンコーダに通す"""
+    transcriber = BatchedTranscriber(language, model_size, batch_size, result_cache=result_cache,
+                                     precision=precision, audio_cache=audio_cache, prefetch_depth=prefetch_depth)
+    cache_keys = {}
+    batch_files = []
+    for file_path in files:
+        if result_cache is not None:
+            try:
+                cache_key, cached = lookup_cached_transcription(
+                    result_cache, file_path, language, model_size, batched=True, precision=precision
+                )
+            except OSError:
+                cache_key, cached = None, None
+            if cached is not None:
+                logger.info(f"キャッシュ済みの結果を使用します (推論を省略): {os.path.basename(file_path)}")
+                on_done(file_path, lambda: cached)
+                continue
+            cache_keys[file_path] = cache_key
+        if journal is not None:
+            journal.record(file_path, RUNNING)
+        batch_files.append(file_path)
+
+    def run():
+        for file_path, result, error in transcriber.transcribe(batch_files, cache_keys):
+            on_done(file_path, lambda: _raise_or_return(result, error))
+
+    _profiled(batch_profile_for(profiler, batch_files), run)
+    logger.info(transcriber.format_stats())
+
+
+def _run_daemon(files, language, model_size, streaming, result_cache, journal, vad, precision, audio_cache,
+                daemon, on_done):
+    """常駐プロセスにまとめて投入し、投入順に結果を受け取る"""
+    options = {
+        "language": language, "model_size": model_size, "streaming": streaming, "vad": vad, "precision": precision,
+        "use_cache": result_cache is not None, "use_audio_cache": audio_cache is not None,
+    }
+    pending = []
+    try:
+        for file_path in files:
+            pending.append((file_path, daemon.submit(file_path, **options)))
+        logger.info(f"{len(pending)}個のジョブを常駐プロセスに投入しました ({daemon.url})")
+        while pending:
+            file_path, job_id = pending[0]
+            if journal is not None:
+                journal.record(file_path, RUNNING)
+            on_done(file_path, lambda: daemon.wait(job_id, _DaemonLogger(file_path)))
+            pending.pop(0)
+    finally:
+        # 中断された場合、常駐プロセスに残ったジョブを取り消す
+        for file_path, job_id in pending:
+            try:
+                daemon.cancel(job_id)
+            except DaemonError:
+                pass
+
+
+def _run_serial(files, language, model_size, streaming, result_cache, journal, vad, precision, audio_cache,
+                prefetch_depth, on_done, profiler=None):
+    """単一プロセスで順に処理する (モデルキャッシュがファイル間で共有される)"""
+    prefetcher = None
+    if prefetch_depth > 0 and not streaming and get_model_cache().backend == "whisper":
+        # ストリーミング処理は30秒ずつデコードし、スタブバックエンドは音声をデコードしないため先読みしない
+        # 結果キャッシュ済みのファイルは推論しないためデコードも不要
+        skip = cached_result_skipper(result_cache, language, model_size, streaming, vad, precision=precision)
+        prefetcher = AudioPrefetcher(files, audio_cache.load if audio_cache else None, prefetch_depth, skip=skip)
+    try:
+        for file_path in files:
+            if journal is not None:
+                journal.record(file_path, RUNNING)
+            on_done(file_path, lambda: _profiled(profile_for(profiler, file_path), lambda: transcribe_file(
+                file_path, language, model_size, listener=_SegmentLogger(file_path), streaming=streaming,
+                result_cache=result_cache, vad=vad, precision=precision, audio_cache=audio_cache,
+                prefetcher=prefetcher
+            )))
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+            logger.info(prefetcher.format_stats())
+
+
+def _run_pool(files, language, model_size, workers, threads_per_worker, streaming, result_cache, journal, vad,
+              precision, audio_cache, split_min_seconds, on_done, profiler=None):
+    """ワーカープールで並列に処理し、完了した順に結果を受け取る"""
+    started = set()
+    with TranscriptionPool(workers, threads_per_worker) as pool:
+        futures = {}
+        for file_path in files:
+            # 長時間のファイルは分割してチャンクごとにワーカーに振り分ける (ストリーミング処理は使わない)
+            split = split_min_seconds is not None and should_split(file_path, split_min_seconds)
+            cache_key = None
+            if result_cache is not None:
+                # キャッシュ済みのファイルはワーカーに送らずにすぐ保存する
+                try:
+                    cache_key, cached = lookup_cached_transcription(
+                        result_cache, file_path, language, model_size, streaming and not split, vad,
+                        precision=precision, split=split
+                    )
+                except OSError:
+                    cached = None
+                if cached is not None:
+                    logger.info(f"キャッシュ済みの結果を使用します (推論を省略): {os.path.basename(file_path)}")
+                    on_done(file_path, lambda: cached)
+                    continue
+            if split:
+                future = pool.submit_split(file_path, language, model_size, vad, precision, result_cache,
+                                           cache_key, audio_cache)
+            else:
+                future = pool.submit(file_path, language, model_size, streaming, result_cache, cache_key, vad,
+                                     precision, audio_cache, profiler)
+            futures[future] = file_path
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            _log_pool_events(pool, journal, started)
+            for future in done:
+                on_done(futures[future], future.result)
+        _log_pool_events(pool, journal, started)
+
+
+def _workers_arg(value):
+    if value == "auto":
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"整数または auto を指定してください: {value}")
+
+
+def resolve_plan(args):
+    """--workers auto の場合に保存済みの実行計画 (なければ計測した結果) をワーカー数とスレッド数に反映する"""
+    store = PlanStore(args.plan_path)
+    plan = None if args.recalibrate else store.load(args.model, args.precision)
+    if plan is None:
+        logger.info("実行計画を計測しています (合成音声でワーカー数とスレッド数の組み合わせを比較します)...")
+        plan = calibrate(args.model, args.precision, args.language)
+        try:
+            store.save(plan)
+        except OSError as e:
+            logger.warning(f"実行計画を保存できませんでした: {str(e)}")
+    logger.info(f"実行計画: {plan.describe()}")
+    args.workers = plan.workers
+    if args.threads_per_worker is None:
+        args.threads_per_worker = plan.threads_per_worker
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m transcribe_cli",
+        description="MP3ファイルをWhisperで文字起こしします (GUIなし)",
+    )
+    parser.add_argument("inputs", nargs="+", help="MP3ファイル、フォルダ、またはglobパターン")
+    parser.add_argument("-l", "--language", choices=LANGUAGE_CHOICES, default="ja", help="言語コード (既定: ja)")
+    parser.add_argument("-m", "--model", choices=MODEL_SIZES, default="base", help="モデルサイズ (既定: base)")
+    parser.add_argument("-p", "--precision", choices=SUPPORTED_PRECISIONS, default="fp32",
+                        help="推論精度 (int8: Linear層をint8に動的量子化したCPU推論、既定: fp32)")
+    parser.add_argument("-f", "--format", choices=[fmt.lstrip('.') for fmt in OUTPUT_FORMATS], default="txt",
+                        help="出力形式 (既定: txt)")
+    parser.add_argument("-o", "--output-dir", default="", help="出力先フォルダ (既定: カレントディレクトリ)")
+    parser.add_argument("-w", "--workers", type=_workers_arg, default=1,
+                        help="並列ワーカープロセス数。auto を指定すると計測済みの実行計画を使う (既定: 1)")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="--workers auto で保存済みの実行計画を使わずに計測し直す")
+    parser.add_argument("--plan-path", default=DEFAULT_PLAN_PATH,
+                        help=f"実行計画の保存先 (既定: {DEFAULT_PLAN_PATH})")
+    parser.add_argument("--threads-per-worker", type=int, default=None,
+                        help="ワーカーあたりのtorchスレッド数 (既定: CPUコア数 / ワーカー数)")
+    parser.add_argument("--order", choices=SCHEDULE_POLICIES, default=DEFAULT_SCHEDULE_POLICY,
+                        help="処理順 (longest: 長い順、shortest: 短い順、given: 指定順、name: ファイル名順。"
+                             f"既定: {DEFAULT_SCHEDULE_POLICY})")
+    parser.add_argument("--split-long", action="store_true",
+                        help="長時間のファイルを無音の位置で分割し、チャンクごとに並列に処理する (--workers 2以上のとき)")
+    parser.add_argument("--split-min-minutes", type=float, default=SPLIT_MIN_SECONDS / 60,
+                        help=f"--split-long で分割するファイルの最短の長さ (分, 既定: {SPLIT_MIN_SECONDS // 60})")
+    parser.add_argument("--streaming", action="store_true",
+                        help="音声を30秒ずつデコードして処理する (長時間ファイル向け、メモリ使用量が一定)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="2以上の場合、複数ファイルの30秒ウィンドウをまとめてバッチ推論する (--workers 1のときのみ)")
+    parser.add_argument("--vad", action="store_true",
+                        help="音声区間検出で無音部分を飛ばし、発話区間のみを文字起こしする")
+    parser.add_argument("--no-cache", action="store_true", help="結果キャッシュを使用しない")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"結果キャッシュの保存先 (既定: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help=f"結果キャッシュの最大サイズ (MB, 既定: {DEFAULT_MAX_MB})")
+    parser.add_argument("--audio-cache", action="store_true",
+                        help="デコード済みの音声を保存し、次回以降のデコードを省略する")
+    parser.add_argument("--audio-cache-dir", default=DEFAULT_AUDIO_CACHE_DIR,
+                        help=f"デコード済み音声の保存先 (既定: {DEFAULT_AUDIO_CACHE_DIR})")
+    parser.add_argument("--audio-cache-max-mb", type=float, default=DEFAULT_AUDIO_CACHE_MAX_MB,
+                        help=f"デコード済み音声キャッシュの最大サイズ (MB, 既定: {DEFAULT_AUDIO_CACHE_MAX_MB})")
+    parser.add_argument("--prefetch", type=int, default=DEFAULT_PREFETCH_DEPTH,
+                        help=f"推論中に先にデコードしておくファイル数 (0で無効、既定: {DEFAULT_PREFETCH_DEPTH})")
+    parser.add_argument("--journal-dir", default=DEFAULT_JOURNAL_DIR,
+                        help=f"バッチジャーナルの保存先 (既定: {DEFAULT_JOURNAL_DIR})")
+    parser.add_argument("--restart", action="store_true",
+                        help="前回のジャーナルを破棄し、完了済みのファイルも含めて最初から処理する")
+    parser.add_argument("--metrics-dir", default=DEFAULT_METRICS_DIR,
+                        help="段階別の所要時間 (JSON Lines) とPrometheus形式の計測値の出力先 "
+                             f"(既定: {DEFAULT_METRICS_DIR})")
+    parser.add_argument("--no-metrics", action="store_true", help="段階別の所要時間を記録しない")
+    parser.add_argument("--profile", action="store_true",
+                        help="cProfileとtorch.profilerでファイルごとのプロファイルを取る (処理は遅くなる)")
+    parser.add_argument("--profile-files", action="append", default=[], metavar="GLOB",
+                        help="--profile で計測するファイル名のパターン (複数指定可、既定: すべて)")
+    parser.add_argument("--profile-dir", default=None,
+                        help="プロファイルの出力先 (既定: ログの出力先の profiles)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="常駐プロセス (python -m transcription_daemon) のロード済みのモデルで処理する "
+                             "(起動していなければ起動する)")
+    parser.add_argument("--log-dir", default="logs", help="ログファイルの出力先 (既定: logs)")
+    parser.add_argument("--debug", action="store_true", help="デバッグログをコンソールに出力")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    console_level = logging.DEBUG if args.debug else logging.INFO
+    log_filename = setup_logging(args.log_dir, console_level=console_level)
+    logger.info(f"ログファイル: {log_filename}")
+
+    files = collect_input_files(args.inputs)
+    if not files:
+        logger.error("MP3ファイルが見つかりませんでした")
+        return 2
+
+    if args.output_dir and not os.path.exists(args.output_dir):
+        os.makedirs(args.output_dir)
+
+    # 同じファイル一覧・設定の前回のバッチが中断されていれば、完了済みのファイルを飛ばす
+    settings = {
+        "language": args.language, "model_size": args.model, "format": args.format,
+        "output_dir": os.path.abspath(args.output_dir or "."), "streaming": args.streaming,
+        "vad": args.vad, "precision": args.precision,
+    }
+    journal = BatchJournal.open_for(files, settings, args.journal_dir)
+    if args.restart:
+        journal.reset()
+    pending = journal.pending_files(files)
+    if len(pending) < len(files):
+        logger.info(f"前回完了済みの{len(files) - len(pending)}ファイルをスキップします (ジャーナル: {journal.path})")
+        failed = journal.summary()[FAILED]
+        if failed:
+            logger.info(f"前回失敗した{failed}ファイルは処理し直します")
+    files = pending
+    if not files:
+        logger.info("すべてのファイルが処理済みです")
+        return 0
+
+    # 長さを調べて処理順を決め、破損しているファイルはモデルの処理に入る前に除外する
+    files, durations, rejected = schedule_files(files, args.order)
+    for file_path, reason in rejected.items():
+        logger.error(f"処理対象から除外しました: {file_path} - {reason}")
+        journal.record(file_path, FAILED, error=reason)
+    if files:
+        logger.info(format_schedule(files, durations, args.order))
+
+    daemon = None
+    if args.daemon:
+        try:
+            daemon = connect_daemon()
+        except DaemonError as e:
+            logger.error(str(e))
+            return 2
+        if args.workers != 1 or args.batch_size > 1 or args.profile or args.profile_files:
+            logger.warning("--daemon では --workers / --batch-size / --profile は使わず、常駐プロセスで順に処理します")
+        args.workers, args.batch_size, args.split_long = 1, 1, False
+        args.profile, args.profile_files = False, []
+
+    if args.workers == "auto":
+        resolve_plan(args)
+
+    if args.split_long and args.workers <= 1:
+        logger.warning("--split-long はワーカー2つ以上の場合のみ有効です")
+        args.split_long = False
+
+    if args.batch_size > 1 and (args.workers > 1 or args.streaming or args.vad):
+        logger.warning("--batch-size はワーカー1つで、ストリーミング処理・VADを使わない場合のみ有効です")
+        args.batch_size = 1
+
+    logger.info(f"{len(files)}個のMP3ファイルを処理します (言語: {args.language}, モデル: {args.model} "
+                f"({args.precision}), 出力形式: .{args.format}, ワーカー数: {args.workers})")
+    result_cache = None if args.no_cache else ResultCache(args.cache_dir, args.cache_max_mb)
+    audio_cache = AudioCache(args.audio_cache_dir, args.audio_cache_max_mb) if args.audio_cache else None
+    metrics = None if args.no_metrics else MetricsRecorder(args.metrics_dir)
+    profiler = None
+    if args.profile or args.profile_files:
+        profiler = ProfileSelector(args.profile_dir or default_profile_dir(args.log_dir), args.profile_files)
+        logger.info(f"プロファイルを取ります (出力先: {profiler.directory})")
+    if metrics is not None:
+        for file_path, reason in rejected.items():
+            metrics.record_failure(file_path, reason)
+    start = time.perf_counter()
+    succeeded, failed = run_batch(
+        files, args.language, args.model, f".{args.format}", args.output_dir,
+        workers=args.workers, threads_per_worker=args.threads_per_worker, streaming=args.streaming,
+        result_cache=result_cache, journal=journal, vad=args.vad, batch_size=args.batch_size,
+        precision=args.precision, audio_cache=audio_cache, prefetch_depth=args.prefetch,
+        split_min_seconds=args.split_min_minutes * 60 if args.split_long else None, metrics=metrics,
+        profiler=profiler, daemon=daemon,
+    )
+    elapsed = time.perf_counter() - start
+    failed = list(rejected) + failed
+
+    logger.info(f"処理完了: 成功 {len(succeeded)}件 / 失敗 {len(failed)}件 ({elapsed:.1f}秒)")
+    if result_cache is not None and daemon is None:
+        # 常駐プロセスでの利用分は常駐プロセスのログに出る
+        logger.info(result_cache.format_stats())
+    if audio_cache is not None and args.workers <= 1 and daemon is None:
+        # ワーカープロセスでの利用分は各ファイルのログにのみ出る
+        logger.info(audio_cache.format_stats())
+    if metrics is not None:
+        metrics.flush()
+        logger.info(metrics.format_summary())
+        logger.info(f"計測値: {metrics.jsonl_path}, {metrics.prometheus_path}")
+    for file_path in failed:
+        logger.info(f"  失敗: {file_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
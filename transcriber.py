@@ -0,0 +1,334 @@
+"""Whisperによる文字起こしのコア処理 (PyQt5に依存しない)"""
+import os
+import time
+import logging
+import traceback
+
+from cancellation import TranscriptionCancelled, cancellation_scope
+from metrics import StageTimings, timing_scope
+from model_cache import get_model_cache, resolve_device
+from progress import ThrottledProgress, probe_duration, whisper_progress
+from transcription_result import TranscriptionResult
+
+logger = logging.getLogger("MP3Transcriber")
+
+# GUIの言語表示名と言語コードの対応
+LANGUAGE_MAP = {
+    "日本語": "ja",
+    "英語": "en",
+    "中国語": "zh",
+    "韓国語": "ko",
+    "自動検出": "auto",
+}
+
+MODEL_SIZES = ("tiny", "base", "small", "medium", "large")
+
+SAMPLE_RATE = 16000
+
+# 推論中の進捗 (処理済みの音声の割合) をこの範囲に割り当てる
+INFERENCE_PROGRESS_START = 40
+INFERENCE_PROGRESS_END = 90
+
+# GUIの精度表示名と精度の対応 (int8はLinear層を動的量子化したCPU推論)
+PRECISION_MAP = {
+    "標準 (fp32)": "fp32",
+    "int8量子化 (CPU)": "int8",
+}
+
+
+class TranscriptionError(Exception):
+    """文字起こし処理のエラー (titleはエラー種別、detailは詳細)"""
+
+    def __init__(self, title, message, detail=None):
+        super().__init__(message)
+        self.title = title
+        self.message = message
+        self.detail = detail or message
+
+    def __reduce__(self):
+        # ワーカープロセスから受け渡せるようにする
+        return (self.__class__, (self.title, self.message, self.detail))
+
+
+class TranscriptionListener:
+    """文字起こし処理の進捗通知を受け取る。必要なメソッドをオーバーライドして使う"""
+
+    def log(self, message):
+        pass
+
+    def progress(self, value):
+        pass
+
+    def segment(self, start, end, text):
+        pass
+
+
+def _report(listener, message, level=logging.INFO):
+    logger.log(level, message)
+    listener.log(message)
+
+
+def build_transcribe_options(language):
+    """Whisperのtranscribeに渡すオプションを作成"""
+    # 言語設定
+    language_code = language if language != 'auto' else None
+    logger.debug(f"言語設定: {language_code}")
+
+    # 音声認識のオプション
+    return {
+        "language": language_code,  # 言語を指定（Noneの場合は自動検出）
+        "task": "transcribe",       # 文字起こしタスク
+        "verbose": False            # 詳細ログは無効
+    }
+
+
+def format_timestamp(seconds):
+    """秒数を HH:MM:SS 形式に変換"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _format_vad_stats(file_name, stats, inference_seconds):
+    """VADでスキップした音声の長さと、それによる推定短縮時間を整形"""
+    total = stats["total_seconds"]
+    skipped = stats["skipped_seconds"]
+    ratio = skipped / total * 100 if total else 0.0
+    # 発話1秒あたりの推論時間から、スキップした無音を推論した場合の時間を見積もる
+    speech = stats["speech_seconds"]
+    saved = skipped * inference_seconds / speech if speech else 0.0
+    return (f"無音スキップ: {file_name} - {skipped:.1f}秒 / {total:.1f}秒 ({ratio:.0f}%), "
+            f"推定短縮時間 {saved:.1f}秒")
+
+
+def transcription_cache_key(result_cache, file_path, language, model_size, streaming=False, vad=False,
+                            batched=False, precision="fp32", split=False):
+    """文字起こし結果のキャッシュキーを作成"""
+    options = dict(build_transcribe_options(language), streaming=streaming, vad=vad)
+    if batched:
+        # バッチ推論は30秒固定のウィンドウで区切るため、通常の処理とは別の結果として扱う
+        options["batched"] = True
+    if split:
+        # 分割して並列に処理した結果はチャンクの境界で文脈が切れるため別の結果として扱う
+        options["split"] = True
+    if precision != "fp32":
+        # 量子化したモデルは結果がわずかに変わるため別の結果として扱う
+        options["precision"] = precision
+    return result_cache.make_key(file_path, model_size, language, options)
+
+
+def lookup_cached_transcription(result_cache, file_path, language, model_size, streaming=False, vad=False,
+                                batched=False, precision="fp32", split=False):
+    """結果キャッシュを検索し、(キャッシュキー, TranscriptionResult) を返す (ミスの場合結果はNone)"""
+    cache_key = transcription_cache_key(result_cache, file_path, language, model_size, streaming, vad,
+                                        batched, precision, split)
+    entry = result_cache.get(cache_key)
+    if entry is None:
+        return cache_key, None
+    return cache_key, TranscriptionResult.from_cache_entry(os.path.basename(file_path), model_size, entry)
+
+
+def cached_result_skipper(result_cache, language, model_size, streaming=False, vad=False, precision="fp32"):
+    """結果キャッシュ済みのファイルを判定する関数を返す (キャッシュ無効の場合はNone)
+
+    結果キャッシュ済みのファイルは推論しないため、プリフェッチ段でデコードを省くのに使う。
+    """
+    if result_cache is None:
+        return None
+
+    def skip(file_path):
+        try:
+            return result_cache.contains(transcription_cache_key(
+                result_cache, file_path, language, model_size, streaming, vad, precision=precision
+            ))
+        except OSError:
+            return False
+
+    return skip
+
+
+def _load_audio(file_path, listener, audio_cache=None, prefetcher=None, decode=True, cancel_token=None):
+    """プリフェッチ済みまたはデコード済み音声キャッシュの音声を取得 (Noneの場合は推論側でデコードする)
+
+    decode=False (ストリーミング処理) の場合はキャッシュにある場合のみ使う。
+    プリフェッチを待っている間に cancel_token がキャンセルされると TranscriptionCancelled を送出する。
+    """
+    if prefetcher is not None and decode:
+        audio = prefetcher.take(file_path, cancel_token)
+        if cancel_token is not None:
+            # プリフェッチ段が閉じられてNoneが返った場合も、中止ならここでデコードせずに止める
+            cancel_token.raise_if_cancelled()
+        if audio is not None:
+            return audio
+    if audio_cache is None:
+        return None
+    audio = audio_cache.lookup(file_path)
+    if audio is not None:
+        _report(listener, f"デコード済み音声を使用します (デコードを省略): {os.path.basename(file_path)}")
+        return audio
+    return audio_cache.decode(file_path) if decode else None
+
+
+def transcribe_file(file_path, language='ja', model_size='base', listener=None, model_cache=None,
+                    streaming=False, result_cache=None, cache_key=None, vad=False, precision="fp32",
+                    cancel_token=None, audio_cache=None, prefetcher=None):
+    """音声ファイルを文字起こしし、TranscriptionResult を返す
+
+    streaming=Trueの場合は音声を30秒ずつデコードしながら処理し、確定したセグメントを
+    listener.segment() で逐次通知する (長時間ファイルでもメモリ使用量が一定)。
+    result_cacheを指定すると、同じ音声内容・設定の結果があれば推論を省略する
+    (cache_keyが指定されていればハッシュ計算を省略する)。
+    vad=Trueの場合は無音区間を検出して発話区間のみをモデルに渡す。
+    precision="int8"の場合はLinear層をint8に動的量子化したモデルでCPU推論する。
+    cancel_token (CancellationToken) がキャンセルされると、借りたモデルを返却して
+    TranscriptionCancelled を送出する。
+    audio_cache (AudioCache) を指定すると、デコード済みの音声があればffmpegでのデコードを省略し、
+    なければデコード結果を保存する (ストリーミング処理では保存済みの場合のみ使う)。
+    prefetcher (AudioPrefetcher) を指定すると、先にデコードしておいた音声を使う。
+    推論した結果の timings には段階ごとの所要時間 (metrics.StageTimings) を記録する。
+    失敗した場合は TranscriptionError を送出する。
+    """
+    started = time.perf_counter()
+    timings = StageTimings()
+    listener = listener or TranscriptionListener()
+    model_cache = model_cache or get_model_cache()
+    # 進捗は値が変わった時だけ、一定間隔以上空けて通知する
+    progress = ThrottledProgress(listener.progress)
+    file_name = os.path.basename(file_path)
+    _report(listener, f"処理開始: {file_name}")
+
+    if result_cache is not None and os.path.exists(file_path):
+        if cache_key is None:
+            cache_key, cached = lookup_cached_transcription(
+                result_cache, file_path, language, model_size, streaming, vad, precision=precision
+            )
+        else:
+            entry = result_cache.get(cache_key)
+            cached = entry and TranscriptionResult.from_cache_entry(file_name, model_size, entry)
+        if cached is not None:
+            _report(listener, f"キャッシュ済みの結果を使用します (推論を省略): {file_name}")
+            progress(100)
+            return cached
+
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    _report(listener, f"Whisperモデル '{model_size}' を準備中...")
+    progress(10)
+    # Whisperモジュールのインポート (スタブバックエンドでは不要)
+    if model_cache.backend == "whisper":
+        try:
+            logger.debug("Whisperモジュールをインポート中...")
+            with timings.measure("import"):
+                import whisper
+                import torch  # noqa: F401
+            logger.debug("Whisperモジュールのインポート成功")
+        except ImportError as e:
+            error_msg = f"必要なライブラリがインストールされていません: {str(e)}"
+            _report(listener, error_msg, logging.ERROR)
+            listener.log("以下のコマンドを実行してください: uv pip install openai-whisper torch")
+            raise TranscriptionError("ライブラリエラー", error_msg)
+
+    # GPUが利用可能であれば使用
+    device = resolve_device(precision)
+    _report(listener, f"使用デバイス: {device} ({precision})")
+
+    # 共有キャッシュからモデルを借りる (未ロードの場合のみロード)
+    try:
+        logger.debug(f"モデル {model_size} をキャッシュから取得中...")
+        with timings.measure("model_load"):
+            lease = model_cache.acquire(model_size, device=device, precision=precision)
+    except Exception as e:
+        error_msg = f"モデルのロードに失敗しました: {str(e)}"
+        logger.error(traceback.format_exc())
+        _report(listener, error_msg, logging.ERROR)
+        raise TranscriptionError("モデルロードエラー", error_msg, traceback.format_exc())
+
+    with lease:
+        if lease.cache_hit:
+            _report(listener, "モデルキャッシュヒット (ロード省略)")
+        else:
+            _report(listener, f"モデルロード完了 ({lease.load_seconds:.2f}秒)")
+        progress(30)
+
+        options = build_transcribe_options(language)
+
+        _report(listener, f"音声認識処理中: {file_name}...")
+        progress(INFERENCE_PROGRESS_START)
+
+        # 音声ファイルの存在確認
+        if not os.path.exists(file_path):
+            error_msg = f"ファイルが見つかりません: {file_path}"
+            _report(listener, error_msg, logging.ERROR)
+            raise TranscriptionError("ファイルエラー", error_msg)
+
+        try:
+            # ファイルサイズのログ
+            file_size = os.path.getsize(file_path) / (1024 * 1024)  # MB単位
+            logger.debug(f"ファイルサイズ: {file_size:.2f} MB")
+
+            # 音声認識実行
+            logger.debug(f"Whisperで音声認識を実行中: {file_path}")
+            inference_start = time.perf_counter()
+
+            def report_inference(fraction):
+                # 処理済みの音声の割合を推論区間の進捗に変換
+                progress(INFERENCE_PROGRESS_START + (INFERENCE_PROGRESS_END - INFERENCE_PROGRESS_START) * fraction)
+
+            with timings.measure("audio_decode"):
+                audio = _load_audio(file_path, listener, audio_cache, prefetcher, decode=not streaming,
+                                    cancel_token=cancel_token)
+                if audio is None and not streaming and model_cache.backend == "whisper":
+                    # Whisperの内部でデコードさせるとメル計算と区別できないため、ここでデコードする
+                    audio = whisper.load_audio(file_path)
+            with timing_scope(timings, lease.model), timings.measure("inference"), \
+                    cancellation_scope(lease.model, cancel_token):
+                if streaming:
+                    from audio_stream import transcribe_streaming
+                    result = transcribe_streaming(lease.model, file_path, options, on_segment=listener.segment,
+                                                  vad=vad, on_progress=report_inference,
+                                                  cancel_token=cancel_token, audio=audio)
+                elif vad:
+                    from vad import transcribe_speech
+                    if audio is None:
+                        import whisper
+                        audio = whisper.load_audio(file_path)
+                    with whisper_progress(report_inference):
+                        result = transcribe_speech(lease.model, audio, options)
+                else:
+                    with whisper_progress(report_inference):
+                        result = lease.model.transcribe(file_path if audio is None else audio, **options)
+            inference_seconds = time.perf_counter() - inference_start
+            logger.debug("音声認識完了")
+            if "vad" in result:
+                _report(listener, _format_vad_stats(file_name, result["vad"], inference_seconds))
+            progress(INFERENCE_PROGRESS_END)
+        except TranscriptionCancelled:
+            # モデルは with を抜ける時にキャッシュに返却される
+            _report(listener, f"処理を中断しました: {file_name}")
+            raise
+        except Exception as e:
+            error_msg = f"音声認識処理でエラーが発生しました: {str(e)}"
+            logger.error(traceback.format_exc())
+            _report(listener, error_msg, logging.ERROR)
+            raise TranscriptionError("音声認識エラー", error_msg, traceback.format_exc())
+
+    # 結果の取得
+    logger.debug("音声認識結果を取得中")
+    transcription = TranscriptionResult.from_whisper(file_name, model_size, result)
+    if audio is not None:
+        timings.audio_seconds = len(audio) / SAMPLE_RATE
+    else:
+        timings.audio_seconds = probe_duration(file_path) or transcription.duration
+    transcription.timings = timings
+    logger.debug(f"検出された言語: {transcription.language}")
+    logger.debug(f"テキスト長: {len(transcription.text)} 文字, セグメント数: {len(transcription)}")
+
+    if result_cache is not None:
+        try:
+            result_cache.put(cache_key, transcription.to_cache_entry())
+        except OSError as e:
+            logger.warning(f"結果キャッシュへの保存に失敗しました: {str(e)}")
+
+    _report(listener, f"処理完了: {file_name} ({transcription.language})")
+    progress(100)
+    timings.wall_seconds = time.perf_counter() - started
+    return transcription
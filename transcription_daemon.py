@@ -0,0 +1,827 @@
+"""モデルをロードしたまま常駐する文字起こしプロセス (PyQt5に依存しない)
+
+main.py や transcribe_cli.py を起動するたびに、Pythonの起動・torchのインポート・モデルのロードが繰り返される。
+常駐プロセスはモデルをプロセス共有のキャッシュに載せたまま localhost のHTTPでジョブを受け付けるため、
+複数のデスクトップセッションやスクリプトが1組のロード済みモデルを共有できる。
+
+- POST /jobs: ジョブを投入する ({"file_path": ..., "language": ..., ...})。ジョブの状態を返す
+- GET /jobs, GET /jobs/<id>: ジョブの状態と進捗 (完了していれば結果)
+- GET /jobs/<id>/events?after=N&wait=秒: N番目以降のイベント (ログ・進捗・セグメント) を届くまで待って返す
+- GET /jobs/<id>/stream: イベントをJSON Linesで逐次返す (完了まで接続を保つ)
+- POST /jobs/<id>/cancel: ジョブを中断する
+- POST /models: モデルを事前にロードする
+- GET /health, POST /shutdown
+
+接続先とトークンは状態ファイル (既定: ~/.mp3_transcriber/daemon.json、所有者のみ読み書き可) に書き出す。
+リクエストには X-Transcriber-Token ヘッダーでトークンを付ける (同じマシンの他のユーザーからは使えない)。
+結果の保存はクライアント側で行う。
+
+使用例:
+    python -m transcription_daemon --prewarm small
+    python -m transcription_daemon --status
+"""
+import os
+import sys
+import hmac
+import json
+import time
+import queue
+import signal
+import logging
+import secrets
+import argparse
+import tempfile
+import itertools
+import threading
+import traceback
+import subprocess
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+from audio_cache import DEFAULT_AUDIO_CACHE_DIR, DEFAULT_AUDIO_CACHE_MAX_MB, AudioCache
+from cancellation import CancellationToken, TranscriptionCancelled
+from log_config import setup_logging
+from metrics import StageTimings
+from model_cache import SUPPORTED_PRECISIONS, get_model_cache
+from result_cache import DEFAULT_CACHE_DIR, DEFAULT_MAX_MB, ResultCache
+from transcriber import MODEL_SIZES, TranscriptionError, TranscriptionListener, transcribe_file
+from transcription_result import TranscriptionResult
+
+logger = logging.getLogger("MP3Transcriber")
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_STATE_PATH = os.environ.get(
+    "MP3_TRANSCRIBER_DAEMON_STATE", os.path.join(os.path.expanduser("~"), ".mp3_transcriber", "daemon.json")
+)
+TOKEN_HEADER = "X-Transcriber-Token"
+DEFAULT_IDLE_MINUTES = 60  # クライアントから自動で起動した場合、この時間ジョブがなければ終了してメモリを返す
+START_TIMEOUT_SECONDS = 30.0  # 自動で起動した常駐プロセスの応答を待つ時間
+REQUEST_TIMEOUT_SECONDS = 10.0
+PREWARM_TIMEOUT_SECONDS = 600.0  # 大きいモデルは初回のダウンロードとロードに時間がかかる
+EVENTS_WAIT_SECONDS = 0.5  # イベントを待つ時間。クライアントはこの間隔で中止の要求を確認する
+MAX_EVENTS_WAIT_SECONDS = 30.0
+JOB_RETENTION_SECONDS = 600  # 完了したジョブの状態と結果を残しておく時間
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+# ジョブのオプションと既定値 (use_cache / use_audio_cache は常駐プロセス側のキャッシュを使うかどうか)
+JOB_OPTIONS = {
+    "language": "ja",
+    "model_size": "base",
+    "streaming": False,
+    "vad": False,
+    "precision": "fp32",
+    "use_cache": True,
+    "use_audio_cache": False,
+}
+
+
+class DaemonError(Exception):
+    """常駐プロセスとの通信のエラー (status はHTTPのステータスコード、接続できない場合はNone)"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def result_to_dict(result):
+    """TranscriptionResult をJSONで受け渡せる辞書にする"""
+    return {
+        "file_name": result.file_name,
+        "model_size": result.model_size,
+        **result.to_cache_entry(),
+        "timings": result.timings.to_dict() if result.timings is not None else None,
+    }
+
+
+def result_from_dict(data):
+    """result_to_dict() の辞書から TranscriptionResult を復元する"""
+    result = TranscriptionResult.from_whisper(data["file_name"], data["model_size"], data)
+    if data.get("timings") is not None:
+        result.timings = StageTimings.from_dict(data["timings"])
+    return result
+
+
+# --- 常駐プロセス側 ---
+
+class DaemonJob:
+    """常駐プロセスで処理する1ファイル分のジョブ"""
+
+    def __init__(self, job_id, file_path, options):
+        self.id = job_id
+        self.file_path = file_path
+        self.options = options
+        self.state = QUEUED
+        self.progress = 0
+        self.events = []  # {"type": "log" / "progress" / "segment" / "state", ...}
+        self.result = None  # result_to_dict() の辞書
+        self.error = None  # {"title": ..., "message": ..., "detail": ...}
+        self.submitted = time.time()
+        self.finished = None
+        self.cancel_token = CancellationToken()
+        self._condition = threading.Condition()
+
+    def add_event(self, event):
+        with self._condition:
+            self.events.append(event)
+            self._condition.notify_all()
+
+    def set_state(self, state, result=None, error=None):
+        with self._condition:
+            self.state = state
+            self.result = result
+            self.error = error
+            if state in FINISHED_STATES:
+                self.finished = time.time()
+            self.events.append({"type": "state", "state": state})
+            self._condition.notify_all()
+
+    def wait_events(self, after, timeout):
+        """after 番目以降のイベントを、届くか完了するまで最大 timeout 秒待ち、(イベント, 状態) を返す"""
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > after or self.state in FINISHED_STATES, timeout)
+            return self.events[after:], self.state
+
+    def status(self, include_result=True):
+        with self._condition:
+            status = {
+                "id": self.id,
+                "file_path": self.file_path,
+                "state": self.state,
+                "progress": self.progress,
+                "options": self.options,
+                "submitted": self.submitted,
+                "finished": self.finished,
+            }
+            if self.error is not None:
+                status["error"] = self.error
+            if include_result and self.result is not None:
+                status["result"] = self.result
+        return status
+
+
+class _JobListener(TranscriptionListener):
+    """文字起こしコアからの通知をジョブのイベントとして記録する"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def log(self, message):
+        self.job.add_event({"type": "log", "message": message})
+
+    def progress(self, value):
+        self.job.progress = value
+        self.job.add_event({"type": "progress", "value": value})
+
+    def segment(self, start, end, text):
+        self.job.add_event({"type": "segment", "start": start, "end": end, "text": text})
+
+
+class TranscriptionDaemon:
+    """ジョブを受け付けて順に文字起こしする (HTTPサーバーには依存しない)
+
+    Whisperのデコードはモデル自体にKVキャッシュのフックを付けるため、同じモデルで同時に推論できない。
+    ジョブは1つのスレッドで投入順に処理し、モデルはプロセス共有のキャッシュからジョブ間で使い回す。
+    """
+
+    def __init__(self, model_cache=None, result_cache=None, audio_cache=None, idle_seconds=None):
+        self.model_cache = model_cache or get_model_cache()
+        self.result_cache = result_cache
+        self.audio_cache = audio_cache
+        self.idle_seconds = idle_seconds  # ジョブがないまま経過したら終了する時間 (Noneなら終了しない)
+        self.started = time.time()
+        self.jobs = OrderedDict()  # ジョブID: DaemonJob
+        self.last_activity = time.monotonic()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._work, name="TranscriptionDaemonJobs", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        """待機中と処理中のジョブを中断し、ジョブのスレッドを終了させる"""
+        with self._lock:
+            jobs = list(self.jobs.values())
+        for job in jobs:
+            self._cancel(job)
+        self._queue.put(None)
+        self._thread.join(timeout=5.0)
+
+    def submit(self, file_path, **options):
+        """ジョブを投入して DaemonJob を返す (不明なオプションは ValueError)"""
+        unknown = set(options) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"不明なオプションです: {', '.join(sorted(unknown))}")
+        if not isinstance(file_path, str) or not file_path:
+            raise ValueError("file_path を指定してください")
+        options = {**JOB_OPTIONS, **options}
+        if options["model_size"] not in MODEL_SIZES:
+            raise ValueError(f"未対応のモデルサイズです: {options['model_size']}")
+        if options["precision"] not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"未対応の推論精度です: {options['precision']}")
+        with self._lock:
+            job = DaemonJob(f"job-{next(self._ids)}", os.path.abspath(file_path), options)
+            self.jobs[job.id] = job
+            self.last_activity = time.monotonic()
+        logger.info(f"ジョブを受け付けました: {job.id} {os.path.basename(job.file_path)}")
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return [job.status(include_result=False) for job in jobs]
+
+    def cancel(self, job_id):
+        """ジョブを中断する (処理中のジョブはデコーダの次のステップで止まる)。ジョブがなければNone"""
+        job = self.get(job_id)
+        if job is not None:
+            self._cancel(job)
+        return job
+
+    def _cancel(self, job):
+        job.cancel_token.cancel()
+        with self._lock:
+            # 待機中のジョブはスレッドが取り出した時に飛ばす
+            if job.state == QUEUED:
+                job.set_state(CANCELLED)
+
+    def prewarm(self, model_size, precision="fp32"):
+        """モデルを先にロードしてキャッシュに置き、ロード時間 (秒) を返す"""
+        if model_size not in MODEL_SIZES:
+            raise ValueError(f"未対応のモデルサイズです: {model_size}")
+        if precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"未対応の推論精度です: {precision}")
+        self.last_activity = time.monotonic()
+        return self.model_cache.prewarm(model_size, precision=precision)
+
+    def health(self):
+        with self._lock:
+            states = [job.state for job in self.jobs.values()]
+        stats = self.model_cache.stats()
+        models = []
+        for entry in stats["loaded"]:
+            model_size, device, precision = entry["key"]
+            models.append({"model_size": model_size, "device": device, "precision": precision,
+                           "size_mb": entry["size_mb"]})
+        return {
+            "pid": os.getpid(),
+            "started": self.started,
+            "backend": self.model_cache.backend,
+            "queued": states.count(QUEUED),
+            "running": states.count(RUNNING),
+            "models": models,
+            "model_cache": {"hits": stats["hits"], "misses": stats["misses"], "evictions": stats["evictions"]},
+        }
+
+    def idle_expired(self):
+        """待機中・処理中のジョブがないまま idle_seconds を過ぎたか"""
+        if not self.idle_seconds:
+            return False
+        with self._lock:
+            if any(job.state not in FINISHED_STATES for job in self.jobs.values()):
+                return False
+        return time.monotonic() - self.last_activity > self.idle_seconds
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            with self._lock:
+                if job.state != QUEUED:
+                    continue
+                job.set_state(RUNNING)
+            self._run(job)
+            self.last_activity = time.monotonic()
+            self._purge()
+
+    def _run(self, job):
+        options = job.options
+        try:
+            result = transcribe_file(
+                job.file_path, options["language"], options["model_size"], listener=_JobListener(job),
+                model_cache=self.model_cache, streaming=options["streaming"],
+                result_cache=self.result_cache if options["use_cache"] else None, vad=options["vad"],
+                precision=options["precision"], cancel_token=job.cancel_token,
+                audio_cache=self.audio_cache if options["use_audio_cache"] else None,
+            )
+        except TranscriptionCancelled:
+            logger.info(f"ジョブを中断しました: {job.id}")
+            job.set_state(CANCELLED)
+        except TranscriptionError as e:
+            job.set_state(FAILED, error={"title": e.title, "message": e.message, "detail": e.detail})
+        except Exception as e:
+            logger.error(f"ジョブでエラーが発生しました: {job.id} - {str(e)}")
+            logger.error(traceback.format_exc())
+            job.set_state(FAILED, error={"title": "一般エラー", "message": str(e), "detail": traceback.format_exc()})
+        else:
+            logger.info(f"ジョブが完了しました: {job.id} {os.path.basename(job.file_path)}")
+            job.set_state(DONE, result=result_to_dict(result))
+
+    def _purge(self):
+        """保持期間を過ぎた完了済みのジョブを破棄"""
+        expires = time.time() - JOB_RETENTION_SECONDS
+        with self._lock:
+            for job_id in [job_id for job_id, job in self.jobs.items()
+                           if job.finished is not None and job.finished < expires]:
+                del self.jobs[job_id]
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    server_version = "MP3TranscriberDaemon/1.0"
+
+    def log_message(self, format, *args):
+        logger.debug(f"HTTP {self.address_string()} {format % args}")
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def _dispatch(self, method):
+        token = self.headers.get(TOKEN_HEADER, "")
+        if not hmac.compare_digest(token.encode('utf-8'), self.server.token.encode('utf-8')):
+            self._send_json(401, {"error": "トークンが一致しません"})
+            return
+        url = urlsplit(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        query = parse_qs(url.query)
+        try:
+            self._route(method, parts, query)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+        except (BrokenPipeError, ConnectionResetError):
+            logger.debug("クライアントが接続を閉じました")
+        except Exception as e:
+            logger.error(traceback.format_exc())
+            self._send_json(500, {"error": str(e)})
+
+    def _route(self, method, parts, query):
+        daemon = self.server.transcription_daemon
+        if parts == ["health"] and method == "GET":
+            self._send_json(200, daemon.health())
+        elif parts == ["shutdown"] and method == "POST":
+            self._send_json(200, {"stopping": True})
+            # serve_forever を抜けるまで待つため、別のスレッドから止める
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+        elif parts == ["models"] and method == "POST":
+            body = self._read_json()
+            load_seconds = daemon.prewarm(body.get("model_size", JOB_OPTIONS["model_size"]),
+                                          body.get("precision", JOB_OPTIONS["precision"]))
+            self._send_json(200, {"load_seconds": load_seconds})
+        elif parts == ["jobs"] and method == "GET":
+            self._send_json(200, {"jobs": daemon.list_jobs()})
+        elif parts == ["jobs"] and method == "POST":
+            body = self._read_json()
+            file_path = body.pop("file_path", None)
+            self._send_json(202, daemon.submit(file_path, **body).status())
+        elif len(parts) in (2, 3) and parts[0] == "jobs":
+            job = daemon.get(parts[1])
+            if job is None:
+                self._send_json(404, {"error": f"ジョブが見つかりません: {parts[1]}"})
+            elif len(parts) == 2 and method == "GET":
+                self._send_json(200, job.status())
+            elif parts[2] == "events" and method == "GET":
+                after = int(query.get("after", ["0"])[0])
+                wait = min(float(query.get("wait", [str(EVENTS_WAIT_SECONDS)])[0]), MAX_EVENTS_WAIT_SECONDS)
+                events, state = job.wait_events(after, wait)
+                self._send_json(200, {"state": state, "progress": job.progress, "events": events,
+                                      "next": after + len(events)})
+            elif parts[2] == "stream" and method == "GET":
+                self._stream(job)
+            elif parts[2] == "cancel" and method == "POST":
+                daemon.cancel(job.id)
+                self._send_json(200, job.status(include_result=False))
+            else:
+                self._send_json(404, {"error": "不明なリクエストです"})
+        else:
+            self._send_json(404, {"error": "不明なリクエストです"})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        body = json.loads(self.rfile.read(length).decode('utf-8'))
+        if not isinstance(body, dict):
+            raise ValueError("リクエストの本文はJSONのオブジェクトにしてください")
+        return body
+
+    def _send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        """イベントを1行1件のJSONで逐次送り、完了したら最後にジョブの状態 (結果を含む) を送る"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.end_headers()
+        after = 0
+        while True:
+            events, state = job.wait_events(after, MAX_EVENTS_WAIT_SECONDS)
+            for event in events:
+                self.wfile.write(json.dumps(event, ensure_ascii=False).encode('utf-8') + b"\n")
+            after += len(events)
+            self.wfile.flush()
+            if state in FINISHED_STATES:
+                break
+        self.wfile.write(json.dumps({"type": "result", **job.status()}, ensure_ascii=False).encode('utf-8') + b"\n")
+
+
+class DaemonServer(ThreadingHTTPServer):
+    """常駐プロセスのHTTPサーバー (localhostのみで待ち受ける)"""
+    daemon_threads = True
+
+    def __init__(self, transcription_daemon, host=DEFAULT_HOST, port=0, token=None):
+        super().__init__((host, port), _RequestHandler)
+        self.transcription_daemon = transcription_daemon
+        self.token = token or secrets.token_hex(16)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def write_state(path, url, token):
+    """接続先とトークンを状態ファイルに書き出す (一時ファイルに書いてから置き換える。所有者のみ読み書き可)"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"url": url, "token": token, "pid": os.getpid(), "started": time.time()}, f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_state(path=DEFAULT_STATE_PATH):
+    """状態ファイルを読む (ない・壊れている場合はNone)"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or "url" not in state or "token" not in state:
+        return None
+    return state
+
+
+def _remove_state(path, token):
+    """状態ファイルが自分のものであれば削除 (後から起動した別の常駐プロセスのものは残す)"""
+    state = read_state(path)
+    if state is not None and state["token"] == token:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class DaemonLock:
+    """常駐プロセスを1つだけ起動するための排他ロック (状態ファイルの横の .lock ファイル)
+
+    常駐プロセスは待ち受けを始める前に取得し、状態ファイルを消すまで保持する。
+    OSのファイルロックを使うため、常駐プロセスが異常終了してもロックは残らない。
+    """
+
+    def __init__(self, state_path=DEFAULT_STATE_PATH):
+        self.path = state_path + ".lock"
+        self._file = None
+
+    def acquire(self):
+        """ロックを取得できればTrue (別の常駐プロセスが保持している場合はFalse)"""
+        os.makedirs(os.path.dirname(self.path) or ".", mode=0o700, exist_ok=True)
+        f = open(self.path, 'a+b')
+        try:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+    def held_elsewhere(self):
+        """別の常駐プロセスがロックを保持しているか (起動中または待ち受け中)"""
+        if not self.acquire():
+            return True
+        self.release()
+        return False
+
+
+def serve(daemon, host=DEFAULT_HOST, port=0, state_path=DEFAULT_STATE_PATH):
+    """HTTPサーバーを起動し、停止の要求かアイドル時間の経過まで待ち受ける"""
+    server = DaemonServer(daemon, host, port)
+    daemon.start()
+    write_state(state_path, server.url, server.token)
+    logger.info(f"常駐プロセスを開始しました: {server.url} (PID {os.getpid()}, 状態ファイル: {state_path})")
+
+    stopped = threading.Event()
+
+    def watch_idle():
+        while not stopped.wait(30.0):
+            if daemon.idle_expired():
+                logger.info(f"{daemon.idle_seconds / 60:.0f}分間ジョブがなかったため終了します")
+                server.shutdown()
+                return
+
+    if daemon.idle_seconds:
+        threading.Thread(target=watch_idle, name="DaemonIdleWatcher", daemon=True).start()
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stopped.set()
+        _remove_state(state_path, server.token)
+        server.server_close()
+        daemon.stop()
+        logger.info("常駐プロセスを終了しました")
+        logger.info(daemon.model_cache.format_stats())
+
+
+# --- クライアント側 ---
+
+# localhostへの接続に環境変数のプロキシ設定を使わない
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+class DaemonClient:
+    """常駐プロセスのHTTP APIのクライアント"""
+
+    def __init__(self, url, token, timeout=REQUEST_TIMEOUT_SECONDS):
+        self.url = url.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    @classmethod
+    def from_state(cls, state_path=DEFAULT_STATE_PATH):
+        """状態ファイルからクライアントを作成 (状態ファイルがなければNone)"""
+        state = read_state(state_path)
+        if state is None:
+            return None
+        return cls(state["url"], state["token"])
+
+    def _request(self, method, path, body=None, timeout=None):
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(self.url + path, data=data, method=method,
+                                         headers={TOKEN_HEADER: self.token, "Content-Type": "application/json"})
+        try:
+            with _opener.open(request, timeout=timeout or self.timeout) as response:
+                return json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            try:
+                message = json.loads(e.read().decode('utf-8')).get("error", e.reason)
+            except ValueError:
+                message = e.reason
+            raise DaemonError(f"常駐プロセスがエラーを返しました ({e.code}): {message}", e.code) from e
+        except (urllib.error.URLError, OSError) as e:
+            reason = getattr(e, "reason", e)
+            raise DaemonError(f"常駐プロセスに接続できません ({self.url}): {reason}") from e
+
+    def health(self):
+        return self._request("GET", "/health")
+
+    def prewarm(self, model_size, precision="fp32"):
+        """常駐プロセスでモデルを事前にロードし、ロード時間 (秒、ロード済みなら0) を返す"""
+        response = self._request("POST", "/models", {"model_size": model_size, "precision": precision},
+                                 timeout=PREWARM_TIMEOUT_SECONDS)
+        return response["load_seconds"]
+
+    def submit(self, file_path, **options):
+        """ジョブを投入してジョブIDを返す (file_path は常駐プロセスから読めるよう絶対パスにする)"""
+        return self._request("POST", "/jobs", {"file_path": os.path.abspath(file_path), **options})["id"]
+
+    def status(self, job_id):
+        return self._request("GET", f"/jobs/{quote(job_id)}")
+
+    def list_jobs(self):
+        return self._request("GET", "/jobs")["jobs"]
+
+    def events(self, job_id, after=0, wait=EVENTS_WAIT_SECONDS):
+        return self._request("GET", f"/jobs/{quote(job_id)}/events?after={after}&wait={wait}",
+                             timeout=self.timeout + wait)
+
+    def cancel(self, job_id):
+        return self._request("POST", f"/jobs/{quote(job_id)}/cancel")
+
+    def shutdown(self):
+        return self._request("POST", "/shutdown")
+
+    def transcribe(self, file_path, listener=None, cancel_token=None, **options):
+        """ジョブを投入して完了を待ち、TranscriptionResult を返す (transcribe_file と同じ例外を送出する)"""
+        return self.wait(self.submit(file_path, **options), listener, cancel_token)
+
+    def wait(self, job_id, listener=None, cancel_token=None):
+        """ジョブの完了を待ち、ログ・進捗・セグメントを listener に中継して TranscriptionResult を返す
+
+        cancel_token がキャンセルされると常駐プロセスのジョブも中断させ、TranscriptionCancelled を送出する。
+        """
+        listener = listener or TranscriptionListener()
+        after = 0
+        while True:
+            if cancel_token is not None and cancel_token.cancelled:
+                try:
+                    self.cancel(job_id)
+                except DaemonError as e:
+                    logger.warning(f"常駐プロセスのジョブを中断できませんでした: {str(e)}")
+                raise TranscriptionCancelled("処理がキャンセルされました")
+            response = self.events(job_id, after)
+            for event in response["events"]:
+                if event["type"] == "log":
+                    listener.log(event["message"])
+                elif event["type"] == "progress":
+                    listener.progress(event["value"])
+                elif event["type"] == "segment":
+                    listener.segment(event["start"], event["end"], event["text"])
+            after = response["next"]
+            if response["state"] in FINISHED_STATES:
+                break
+        status = self.status(job_id)
+        if status["state"] == DONE:
+            return result_from_dict(status["result"])
+        if status["state"] == CANCELLED:
+            raise TranscriptionCancelled("常駐プロセスでジョブがキャンセルされました")
+        error = status.get("error") or {}
+        raise TranscriptionError(error.get("title", "一般エラー"), error.get("message", ""), error.get("detail"))
+
+
+def _healthy_client(state_path):
+    client = DaemonClient.from_state(state_path)
+    if client is None:
+        return None
+    try:
+        client.health()
+    except DaemonError:
+        return None
+    return client
+
+
+def launch_daemon(state_path=DEFAULT_STATE_PATH, idle_minutes=DEFAULT_IDLE_MINUTES, extra_args=()):
+    """常駐プロセスを切り離したプロセスとして起動する (起動したクライアントが終了しても残る)"""
+    command = [sys.executable, "-m", "transcription_daemon", "--state-file", state_path,
+               "--idle-minutes", str(idle_minutes), *extra_args]
+    kwargs = {}
+    if os.name == "nt":
+        kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+    else:
+        kwargs["start_new_session"] = True
+    # ログやキャッシュの置き場所が起動したクライアントの作業フォルダによって変わらないようにする
+    logger.info("常駐プロセスを起動します")
+    return subprocess.Popen(command, cwd=os.path.dirname(os.path.abspath(__file__)), stdin=subprocess.DEVNULL,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **kwargs)
+
+
+def connect_daemon(state_path=DEFAULT_STATE_PATH, launch=True, timeout=START_TIMEOUT_SECONDS):
+    """常駐プロセスに接続して DaemonClient を返す
+
+    起動していなければ、launch=True の場合は起動して応答するまで待つ。接続できなければ DaemonError を送出する。
+    """
+    client = _healthy_client(state_path)
+    if client is not None:
+        return client
+    if not launch:
+        raise DaemonError("常駐プロセスが起動していません")
+    # 別のクライアントが起動した常駐プロセスが起動中であれば、起動せずにその常駐プロセスの応答を待つ
+    lock = DaemonLock(state_path)
+    process = None if lock.held_elsewhere() else launch_daemon(state_path)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        client = _healthy_client(state_path)
+        if client is not None:
+            return client
+        if process is not None and process.poll() is not None:
+            if lock.held_elsewhere():
+                # 同時に起動された別の常駐プロセスが先にロックを取得したため、そちらの応答を待つ
+                process = None
+                continue
+            raise DaemonError(f"常駐プロセスが起動直後に終了しました (終了コード {process.returncode})")
+        if process is None and not lock.held_elsewhere():
+            # 待っていた常駐プロセスが待ち受けを始めずに終了したため、自分で起動する
+            client = _healthy_client(state_path)
+            if client is not None:
+                return client
+            process = launch_daemon(state_path)
+    raise DaemonError(f"常駐プロセスが{timeout:.0f}秒以内に応答しませんでした")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m transcription_daemon",
+        description="Whisperのモデルをロードしたまま常駐し、localhostのHTTPで文字起こしのジョブを受け付けます",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"待ち受けるアドレス (既定: {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=0, help="待ち受けるポート (既定: 0 = 空いているポート)")
+    parser.add_argument("--state-file", default=DEFAULT_STATE_PATH,
+                        help=f"接続先とトークンを書き出すファイル (既定: {DEFAULT_STATE_PATH})")
+    parser.add_argument("--idle-minutes", type=float, default=0,
+                        help="この時間ジョブがなければ終了する (分、既定: 0 = 終了しない)")
+    parser.add_argument("--prewarm", action="append", default=[], choices=MODEL_SIZES, metavar="MODEL",
+                        help="起動時にロードしておくモデル (複数指定可)")
+    parser.add_argument("-p", "--precision", choices=SUPPORTED_PRECISIONS, default="fp32",
+                        help="--prewarm でロードするモデルの推論精度 (既定: fp32)")
+    parser.add_argument("--no-cache", action="store_true", help="結果キャッシュを使用しない")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR,
+                        help=f"結果キャッシュの保存先 (既定: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-max-mb", type=float, default=DEFAULT_MAX_MB,
+                        help=f"結果キャッシュの最大サイズ (MB, 既定: {DEFAULT_MAX_MB})")
+    parser.add_argument("--audio-cache-dir", default=DEFAULT_AUDIO_CACHE_DIR,
+                        help=f"デコード済み音声の保存先 (既定: {DEFAULT_AUDIO_CACHE_DIR})")
+    parser.add_argument("--audio-cache-max-mb", type=float, default=DEFAULT_AUDIO_CACHE_MAX_MB,
+                        help=f"デコード済み音声キャッシュの最大サイズ (MB, 既定: {DEFAULT_AUDIO_CACHE_MAX_MB})")
+    parser.add_argument("--status", action="store_true", help="起動中の常駐プロセスの状態を表示して終了する")
+    parser.add_argument("--stop", action="store_true", help="起動中の常駐プロセスを終了させる")
+    parser.add_argument("--log-dir", default="logs", help="ログファイルの出力先 (既定: logs)")
+    parser.add_argument("--debug", action="store_true", help="デバッグログをコンソールに出力")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.status or args.stop:
+        client = _healthy_client(args.state_file)
+        if client is None:
+            print("常駐プロセスは起動していません")
+            return 1
+        if args.stop:
+            client.shutdown()
+            print(f"常駐プロセスを終了させました: {client.url}")
+        else:
+            print(json.dumps(client.health(), ensure_ascii=False, indent=2))
+        return 0
+
+    console_level = logging.DEBUG if args.debug else logging.INFO
+    log_filename = setup_logging(args.log_dir, console_level=console_level)
+    logger.info(f"ログファイル: {log_filename}")
+    if _healthy_client(args.state_file) is not None:
+        logger.info(f"常駐プロセスはすでに起動しています (状態ファイル: {args.state_file})")
+        return 0
+    # 同時に起動された場合は先にロックを取得した常駐プロセスだけが待ち受ける
+    lock = DaemonLock(args.state_file)
+    if not lock.acquire():
+        logger.info(f"別の常駐プロセスが起動中です (ロックファイル: {lock.path})")
+        return 0
+
+    try:
+        daemon = TranscriptionDaemon(
+            result_cache=None if args.no_cache else ResultCache(args.cache_dir, args.cache_max_mb),
+            audio_cache=AudioCache(args.audio_cache_dir, args.audio_cache_max_mb),
+            idle_seconds=args.idle_minutes * 60 or None,
+        )
+        for model_size in args.prewarm:
+            load_seconds = daemon.prewarm(model_size, args.precision)
+            logger.info(f"モデル {model_size} ({args.precision}) をロードしました ({load_seconds:.2f}秒)")
+        serve(daemon, args.host, args.port, args.state_file)
+    finally:
+        lock.release()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
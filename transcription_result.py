@@ -0,0 +1,99 @@
+"""文字起こし結果を表す構造化オブジェクト
+
+ワーカーから各出力形式の書き出しまで同じオブジェクトを受け渡すことで、
+整形済み文字列を再度パースする必要をなくし、セグメントのタイムスタンプを保持する。
+セグメントの開始・終了時刻と平均対数確率は array に格納し、長い音声でもメモリを節約する。
+"""
+import math
+from array import array
+
+
+class Segment:
+    """1セグメント分の読み取り用ビュー"""
+    __slots__ = ("start", "end", "text", "avg_logprob")
+
+    def __init__(self, start, end, text, avg_logprob=math.nan):
+        self.start = start
+        self.end = end
+        self.text = text
+        self.avg_logprob = avg_logprob
+
+    def to_dict(self):
+        segment = {"start": self.start, "end": self.end, "text": self.text}
+        if not math.isnan(self.avg_logprob):
+            segment["avg_logprob"] = self.avg_logprob
+        return segment
+
+
+class TranscriptionResult:
+    """1ファイル分の文字起こし結果"""
+    __slots__ = ("file_name", "language", "model_size", "text", "starts", "ends", "texts", "avg_logprobs",
+                 "timings")
+
+    def __init__(self, file_name, language, model_size, text=""):
+        self.file_name = file_name
+        self.language = language
+        self.model_size = model_size
+        self.text = text
+        self.starts = array('d')
+        self.ends = array('d')
+        self.texts = []
+        self.avg_logprobs = array('d')
+        self.timings = None  # 段階ごとの所要時間 (metrics.StageTimings)。推論しなかった結果はNone
+
+    def add_segment(self, start, end, text, avg_logprob=math.nan):
+        """セグメントを追加"""
+        self.starts.append(start)
+        self.ends.append(end)
+        self.texts.append(text)
+        self.avg_logprobs.append(avg_logprob)
+
+    @classmethod
+    def from_whisper(cls, file_name, model_size, result):
+        """Whisperのtranscribe形式の辞書から作成"""
+        instance = cls(file_name, result.get("language") or "不明", model_size, result.get("text", ""))
+        for segment in result.get("segments", []):
+            instance.add_segment(segment["start"], segment["end"], segment["text"],
+                                 segment.get("avg_logprob", math.nan))
+        return instance
+
+    @classmethod
+    def from_cache_entry(cls, file_name, model_size, entry):
+        """結果キャッシュのエントリから作成 (キャッシュにはファイル名を含めない)"""
+        return cls.from_whisper(file_name, model_size, entry)
+
+    def to_cache_entry(self):
+        """結果キャッシュに保存する辞書を返す"""
+        return {
+            "text": self.text,
+            "language": self.language,
+            "segments": [segment.to_dict() for segment in self.segments()],
+        }
+
+    def __len__(self):
+        return len(self.texts)
+
+    def segments(self):
+        """セグメントを順に返す"""
+        for i in range(len(self.texts)):
+            yield Segment(self.starts[i], self.ends[i], self.texts[i], self.avg_logprobs[i])
+
+    @property
+    def duration(self):
+        """最後のセグメントの終了時刻 (秒)"""
+        return self.ends[-1] if self.ends else 0.0
+
+    @property
+    def metadata(self):
+        """出力ファイルに記載するメタデータ"""
+        return {"言語": self.language, "モデル": self.model_size}
+
+    def to_text(self):
+        """メタデータを含めた出力テキストを作成"""
+        return "".join([
+            f"# 文字起こし結果: {self.file_name}\n\n",
+            f"言語: {self.language}\n",
+            f"モデル: {self.model_size}\n\n",
+            "## テキスト内容\n\n",
+            self.text,
+        ])
@@ -0,0 +1,140 @@
+"""短時間エネルギーによる音声区間検出 (VAD)
+
+無音区間をモデルに渡さないための前処理。16kHzモノラルのfloat32音声をフレームに分割し、
+NumPyでフレームごとのエネルギーを一括計算して発話区間を求める。
+"""
+import logging
+
+import numpy as np
+
+logger = logging.getLogger("MP3Transcriber")
+
+SAMPLE_RATE = 16000
+FRAME_SECONDS = 0.03  # フレーム長 (30ms)
+# ノイズフロア (エネルギーの下位パーセンタイル) からこのdB以上大きいフレームを発話とみなす
+THRESHOLD_DB = 12.0
+MIN_THRESHOLD_DB = -50.0  # 無音に近い録音でも閾値がこれ以下にならないようにする
+MIN_SPEECH_SECONDS = 0.25  # これより短い発話区間はノイズとして捨てる
+MIN_SILENCE_SECONDS = 0.8  # これより短い無音は発話区間に含める
+PADDING_SECONDS = 0.2  # 発話区間の前後に付ける余白
+ENERGY_BLOCK_FRAMES = 20000  # エネルギーを一度に計算するフレーム数 (10分)
+
+
+def frame_energies_db(audio, frame_seconds=FRAME_SECONDS, sample_rate=SAMPLE_RATE):
+    """フレームごとのRMSエネルギー (dB) を返す"""
+    frame_length = int(frame_seconds * sample_rate)
+    frame_count = len(audio) // frame_length
+    if frame_count == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = audio[:frame_count * frame_length].reshape(frame_count, frame_length)
+    # 長時間の音声で2乗した配列全体を確保しないよう、一定のフレーム数ずつ計算する
+    power = np.empty(frame_count, dtype=np.float32)
+    for start in range(0, frame_count, ENERGY_BLOCK_FRAMES):
+        block = frames[start:start + ENERGY_BLOCK_FRAMES]
+        power[start:start + len(block)] = np.mean(np.square(block, dtype=np.float32), axis=1)
+    return 10.0 * np.log10(power + 1e-10)
+
+
+def _runs(mask):
+    """真偽値配列の True が連続する区間を (開始, 終了) インデックスの配列で返す"""
+    padded = np.concatenate(([False], mask, [False]))
+    changes = np.flatnonzero(padded[1:] != padded[:-1])
+    return changes.reshape(-1, 2)
+
+
+def detect_speech(audio, sample_rate=SAMPLE_RATE, frame_seconds=FRAME_SECONDS, threshold_db=THRESHOLD_DB,
+                  min_speech=MIN_SPEECH_SECONDS, min_silence=MIN_SILENCE_SECONDS, padding=PADDING_SECONDS):
+    """発話区間を (開始秒, 終了秒) のリストで返す"""
+    energies = frame_energies_db(audio, frame_seconds, sample_rate)
+    if len(energies) == 0:
+        return []
+
+    noise_floor = np.percentile(energies, 10)
+    threshold = max(noise_floor + threshold_db, MIN_THRESHOLD_DB)
+    speech = energies > threshold
+
+    # 短い無音を埋める
+    silence_runs = _runs(~speech)
+    gap_frames = int(min_silence / frame_seconds)
+    for start, end in silence_runs:
+        if 0 < start and end < len(speech) and end - start < gap_frames:
+            speech[start:end] = True
+
+    # 短すぎる発話を捨てる
+    min_frames = int(min_speech / frame_seconds)
+    regions = []
+    duration = len(audio) / sample_rate
+    for start, end in _runs(speech):
+        if end - start < min_frames:
+            continue
+        begin = max(0.0, float(start * frame_seconds - padding))
+        finish = min(duration, float(end * frame_seconds + padding))
+        if regions and begin <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], finish)
+        else:
+            regions.append((begin, finish))
+    return regions
+
+
+class SpeechTimeline:
+    """発話区間だけを連結した音声と、元の時間軸との対応"""
+
+    def __init__(self, regions, sample_rate=SAMPLE_RATE):
+        self.regions = regions
+        self.sample_rate = sample_rate
+        # 連結後の音声における各区間の開始秒
+        lengths = np.array([end - start for start, end in regions], dtype=np.float64)
+        self._compact_starts = np.concatenate(([0.0], np.cumsum(lengths)[:-1])) if regions else np.zeros(0)
+        self._original_starts = np.array([start for start, _ in regions], dtype=np.float64)
+
+    def compact(self, audio):
+        """発話区間のみを連結した音声を返す"""
+        if not self.regions:
+            return np.zeros(0, dtype=audio.dtype)
+        return np.concatenate([
+            audio[int(start * self.sample_rate):int(end * self.sample_rate)] for start, end in self.regions
+        ])
+
+    def to_original(self, seconds, is_end=False):
+        """連結後の音声上の時刻を元の音声上の時刻に変換 (区間の境界にある終了時刻は前の区間に属する)"""
+        if not self.regions:
+            return seconds
+        # 浮動小数点の誤差で境界を越えないよう、終了時刻はわずかに手前で検索する
+        position = seconds - 1e-3 if is_end else seconds
+        index = max(0, int(np.searchsorted(self._compact_starts, position, side='right')) - 1)
+        return float(self._original_starts[index] + (seconds - self._compact_starts[index]))
+
+    @property
+    def speech_seconds(self):
+        return self.speech_seconds_after(0.0)
+
+    def speech_seconds_after(self, seconds):
+        """seconds 秒以降にある発話区間の秒数"""
+        return float(sum(max(0.0, end - max(start, seconds)) for start, end in self.regions))
+
+
+def transcribe_speech(model, audio, options, carried_seconds=0.0):
+    """発話区間のみを文字起こしし、タイムスタンプを元の時間軸に戻した結果を返す
+
+    結果の "vad" に全体・発話・スキップした秒数を格納する。
+    carried_seconds は先頭にある前のウィンドウからの持ち越し音声の秒数で、前のウィンドウで数えたため秒数に含めない。
+    """
+    window_seconds = len(audio) / SAMPLE_RATE
+    timeline = SpeechTimeline(detect_speech(audio))
+    logger.debug(f"VAD: {len(timeline.regions)}区間, 発話 {timeline.speech_seconds:.1f}秒 / 全体 {window_seconds:.1f}秒")
+    total_seconds = window_seconds - carried_seconds
+    speech_seconds = timeline.speech_seconds_after(carried_seconds)
+
+    if timeline.regions:
+        result = model.transcribe(timeline.compact(audio), **options)
+        for segment in result.get("segments", []):
+            segment["start"] = timeline.to_original(segment["start"])
+            segment["end"] = timeline.to_original(segment["end"], is_end=True)
+    else:
+        result = {"text": "", "segments": [], "language": options.get("language")}
+    result["vad"] = {
+        "total_seconds": total_seconds,
+        "speech_seconds": speech_seconds,
+        "skipped_seconds": total_seconds - speech_seconds,
+    }
+    return result
@@ -0,0 +1,330 @@
+"""複数のワーカープロセスで並列に文字起こしを行うプール (PyQt5に依存しない)"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from functools import partial
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+
+from audio_cache import AudioCache
+from cancellation import CancellationToken, TranscriptionCancelled
+from chunked_inference import prepare_split, stitch_chunks, transcribe_chunk
+from metrics import StageTimings
+from profiling import profile_for
+from result_cache import ResultCache
+from transcriber import TranscriptionListener, transcribe_file
+from transcription_result import TranscriptionResult
+
+logger = logging.getLogger("MP3Transcriber")
+
+# ワーカープロセス内の状態 (初期化時に設定)
+_event_queue = None
+_cancel_token = None
+
+
+def available_cpus():
+    """このプロセスが使用できるCPUコア数"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def default_threads_per_worker(workers):
+    """ワーカー数に応じたワーカーあたりのtorchスレッド数 (コアを均等に分ける)"""
+    return max(1, available_cpus() // max(1, workers))
+
+
+class _QueueListener(TranscriptionListener):
+    """ワーカー内の進捗通知を親プロセスへのイベントとして送る"""
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def log(self, message):
+        _event_queue.put((self.file_path, "log", message))
+
+    def progress(self, value):
+        _event_queue.put((self.file_path, "progress", value))
+
+    def segment(self, start, end, text):
+        _event_queue.put((self.file_path, "segment", (start, end, text)))
+
+
+def _init_worker(event_queue, cancel_event, threads_per_worker, cpu_sets, worker_counter):
+    """ワーカープロセスの初期化 (torchのスレッド数とCPUアフィニティを設定)"""
+    global _event_queue, _cancel_token
+    _event_queue = event_queue
+    _cancel_token = CancellationToken(cancel_event)
+
+    # torchのインポート前に設定しないとOpenMP/MKLに反映されない
+    for name in ("OMP_NUM_THREADS", "MKL_NUM_THREADS"):
+        os.environ[name] = str(threads_per_worker)
+
+    if cpu_sets:
+        with worker_counter.get_lock():
+            index = worker_counter.value
+            worker_counter.value += 1
+        try:
+            os.sched_setaffinity(0, cpu_sets[index % len(cpu_sets)])
+        except OSError as e:
+            logger.warning(f"CPUアフィニティの設定に失敗しました: {str(e)}")
+
+    try:
+        import torch
+        torch.set_num_threads(threads_per_worker)
+        torch.set_num_interop_threads(1)
+    except (ImportError, RuntimeError) as e:
+        logger.warning(f"torchのスレッド数を設定できませんでした: {str(e)}")
+
+
+def _transcribe_task(file_path, language, model_size, streaming, result_cache_config, cache_key, vad, precision,
+                     audio_cache_config, profiler=None):
+    """ワーカープロセスで実行する1ファイル分の文字起こし"""
+    result_cache = ResultCache(*result_cache_config) if result_cache_config else None
+    audio_cache = AudioCache(*audio_cache_config) if audio_cache_config else None
+    listener = _QueueListener(file_path)
+    profile = profile_for(profiler, file_path)
+    try:
+        with profile:
+            return transcribe_file(file_path, language, model_size, listener=listener,
+                                   streaming=streaming, result_cache=result_cache, cache_key=cache_key, vad=vad,
+                                   precision=precision, cancel_token=_cancel_token, audio_cache=audio_cache)
+    finally:
+        if profile.report is not None:
+            listener.log(profile.report.format())
+
+
+def _prepare_split_task(file_path, workers, audio_cache_config):
+    """ワーカープロセスで実行する長時間ファイルのデコードと分割 ((一時ファイル, チャンク, 所要時間) を返す)"""
+    audio_cache = AudioCache(*audio_cache_config) if audio_cache_config else None
+    _QueueListener(file_path).log(f"分割処理の準備中 (デコードと無音の検出): {os.path.basename(file_path)}")
+    started = time.perf_counter()
+    timings = StageTimings()
+    audio_path, chunks = prepare_split(file_path, workers, audio_cache=audio_cache, cancel_token=_cancel_token,
+                                       timings=timings)
+    timings.wall_seconds = time.perf_counter() - started
+    return audio_path, chunks, timings
+
+
+def _transcribe_chunk_task(file_path, audio_path, start, end, language, model_size, vad, precision):
+    """ワーカープロセスで実行する1チャンク分の文字起こし"""
+    return transcribe_chunk(audio_path, start, end, language, model_size, vad=vad, precision=precision,
+                            listener=_QueueListener(file_path), cancel_token=_cancel_token)
+
+
+class _SplitJob:
+    """1ファイル分の分割処理。全チャンクが終わると結果を繋ぎ合わせて future を完了させる
+
+    コールバックはプールの管理スレッドで呼ばれる。
+    """
+
+    def __init__(self, pool, file_path, language, model_size, vad, precision, result_cache, cache_key):
+        self.pool = pool
+        self.file_path = file_path
+        self.language = language
+        self.model_size = model_size
+        self.vad = vad
+        self.precision = precision
+        self.result_cache = result_cache
+        self.cache_key = cache_key
+        self.future = Future()
+        self.timings = StageTimings()
+        self._started = None
+        self._lock = threading.Lock()
+        self._audio_path = None
+        self._chunks = []
+        self._chunk_futures = []
+        self._results = []
+        self._pending = 0
+        self._completed = 0
+        self._failed = False
+
+    def _event(self, kind, value):
+        self.pool._events.put((self.file_path, kind, value))
+
+    def _fail(self, error):
+        if isinstance(error, CancelledError):
+            error = TranscriptionCancelled()
+        with self._lock:
+            if self._failed:
+                return
+            self._failed = True
+            chunk_futures = list(self._chunk_futures)
+        if not self.future.done():
+            self.future.set_exception(error)
+        # 未開始のチャンクを取り消す (処理中のチャンクは終わるのを待ち、最後に終わったチャンクが一時ファイルを削除する)
+        for chunk_future in chunk_futures:
+            chunk_future.cancel()
+
+    def prepared(self, prepare_future):
+        try:
+            self._audio_path, self._chunks, timings = prepare_future.result()
+        except BaseException as e:
+            self._fail(e)
+            return
+        # 経過時間は準備の開始から数える (プールの待ち行列にいた時間を含めない)
+        self._started = time.perf_counter() - timings.wall_seconds
+        self.timings.merge(timings)
+        self.timings.audio_seconds = timings.audio_seconds
+        self._results = [None] * len(self._chunks)
+        self._pending = len(self._chunks)
+        for index, (start, end) in enumerate(self._chunks):
+            if self._failed:
+                # 投入中に他のチャンクが失敗したため、残りは投入しない
+                self._skip_chunks(len(self._chunks) - index)
+                return
+            try:
+                chunk_future = self.pool._executor.submit(
+                    _transcribe_chunk_task, self.file_path, self._audio_path, start, end, self.language,
+                    self.model_size, self.vad, self.precision
+                )
+            except RuntimeError:
+                # 投入中にプールが終了した
+                self._fail(TranscriptionCancelled())
+                self._skip_chunks(len(self._chunks) - index)
+                return
+            with self._lock:
+                self._chunk_futures.append(chunk_future)
+                failed = self._failed
+            if failed:
+                # 追加する前に失敗が通知され、_fail で取り消されなかった
+                chunk_future.cancel()
+            chunk_future.add_done_callback(partial(self._chunk_done, index))
+
+    def _skip_chunks(self, count):
+        """投入しなかったチャンクを終わったものとして数える (すべて終わっていれば一時ファイルを削除)"""
+        with self._lock:
+            self._pending -= count
+            finished = self._pending == 0
+        if finished:
+            self._remove_audio()
+
+    def _chunk_done(self, index, chunk_future):
+        try:
+            self._results[index] = chunk_future.result()
+        except BaseException as e:
+            # 他のチャンクの完了を待たずに失敗を通知する
+            self._fail(e)
+        with self._lock:
+            self._pending -= 1
+            self._completed += 1
+            finished = self._pending == 0
+            completed = self._completed
+        if not self.future.done():
+            self._event("log", f"チャンク {completed}/{len(self._chunks)} 完了: {os.path.basename(self.file_path)}")
+            self._event("progress", int(90 * completed / len(self._chunks)))
+        if finished:
+            self._remove_audio()
+            if not self.future.done():
+                self._finish()
+
+    def _finish(self):
+        file_name = os.path.basename(self.file_path)
+        try:
+            result = TranscriptionResult.from_whisper(file_name, self.model_size,
+                                                      stitch_chunks(self._chunks, self._results))
+        except Exception as e:
+            self._fail(e)
+            return
+        for chunk_result in self._results:
+            self.timings.merge(chunk_result["timings"])
+        self.timings.wall_seconds = time.perf_counter() - self._started
+        result.timings = self.timings
+        if self.result_cache is not None and self.cache_key is not None:
+            try:
+                self.result_cache.put(self.cache_key, result.to_cache_entry())
+            except OSError as e:
+                logger.warning(f"結果キャッシュへの保存に失敗しました: {str(e)}")
+        self._event("log", f"処理完了: {file_name} ({result.language}, {len(self._chunks)}チャンクを結合)")
+        self.future.set_result(result)
+
+    def _remove_audio(self):
+        try:
+            os.remove(self._audio_path)
+        except OSError as e:
+            logger.warning(f"分割処理の一時ファイルを削除できませんでした: {str(e)}")
+
+
+def _split_cpus(workers, threads_per_worker):
+    """ワーカーごとに重ならないCPUコアの組を作成 (アフィニティ非対応の環境では空)"""
+    if not hasattr(os, "sched_getaffinity"):
+        return []
+    cpus = sorted(os.sched_getaffinity(0))
+    if len(cpus) < workers * threads_per_worker:
+        return []
+    return [set(cpus[i * threads_per_worker:(i + 1) * threads_per_worker]) for i in range(workers)]
+
+
+class TranscriptionPool:
+    """ワーカープロセスのプール。各ワーカーはコアの一部だけを使い、モデルを保持し続ける"""
+
+    def __init__(self, workers, threads_per_worker=None, pin_cpus=True):
+        self.workers = max(1, workers)
+        self.threads_per_worker = threads_per_worker or default_threads_per_worker(self.workers)
+        # fork後のtorch/Qtを避けるためspawnを使う
+        context = multiprocessing.get_context("spawn")
+        self._events = context.Queue()
+        # 全ワーカーで共有するキャンセル要求
+        self._cancel_event = context.Event()
+        cpu_sets = _split_cpus(self.workers, self.threads_per_worker) if pin_cpus else []
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(self._events, self._cancel_event, self.threads_per_worker, cpu_sets, context.Value('i', 0)),
+        )
+        logger.info(f"ワーカープール開始: {self.workers}プロセス × {self.threads_per_worker}スレッド")
+
+    def submit(self, file_path, language, model_size, streaming=False, result_cache=None, cache_key=None,
+               vad=False, precision="fp32", audio_cache=None, profiler=None):
+        """文字起こしを投入し、TranscriptionResult を返すFutureを返す
+
+        result_cache / audio_cache を指定すると、ワーカーが同じキャッシュディレクトリを使う。
+        profiler (ProfileSelector) がこのファイルを選んでいれば、ワーカーでプロファイルを取る。
+        """
+        result_cache_config = result_cache.config if result_cache is not None else None
+        audio_cache_config = audio_cache.config if audio_cache is not None else None
+        if profiler is not None and not profiler.selects(file_path):
+            profiler = None
+        return self._executor.submit(_transcribe_task, file_path, language, model_size, streaming,
+                                     result_cache_config, cache_key, vad, precision, audio_cache_config, profiler)
+
+    def submit_split(self, file_path, language, model_size, vad=False, precision="fp32", result_cache=None,
+                     cache_key=None, audio_cache=None):
+        """長時間のファイルを無音の位置で分割してチャンクごとにワーカーに投入し、
+        繋ぎ合わせた TranscriptionResult を返すFutureを返す
+
+        デコードと分割はワーカーの1つで行い、終わった時点で各チャンクを投入する。
+        result_cache と cache_key を指定すると、繋ぎ合わせた結果を保存する。
+        """
+        job = _SplitJob(self, file_path, language, model_size, vad, precision, result_cache, cache_key)
+        audio_cache_config = audio_cache.config if audio_cache is not None else None
+        prepare_future = self._executor.submit(_prepare_split_task, file_path, self.workers, audio_cache_config)
+        prepare_future.add_done_callback(job.prepared)
+        return job.future
+
+    def drain_events(self):
+        """ワーカーから届いた (ファイルパス, 種別, 値) のイベントをすべて取り出す"""
+        events = []
+        while True:
+            try:
+                events.append(self._events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def cancel(self):
+        """処理中のワーカーに中断を要求する (中断したファイルは TranscriptionCancelled で終わる)"""
+        self._cancel_event.set()
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """プールを終了 (cancel_pending=Trueの場合は未開始の処理を取り消す)"""
+        self._executor.shutdown(wait=wait, cancel_futures=cancel_pending)
+        logger.debug("ワーカープール終了")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self.shutdown(cancel_pending=exc_type is not None)